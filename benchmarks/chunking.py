@@ -0,0 +1,194 @@
+"""
+Chunking profile benchmark.
+
+Chunks the corpus under each profile in scripts/chunking.py the way the
+skillset would, then reports chunk count and total tokens (what embedding and
+indexing cost) next to the retrieval hit rate on the golden question set:
+
+    python -m benchmarks.chunking
+    python -m benchmarks.chunking --profiles legacy,pages-2000,headings --k 3,5,10
+    python -m benchmarks.chunking --retrievers keyword,vector --live
+
+A question is a hit at k when one of its top-k chunks contains one of its
+answer phrases in full, so a phrase cut in two by a chunk boundary is a miss;
+that is what overlap pays for. Keyword retrieval is BM25 over the chunks,
+vector retrieval the local LSA model from vector_recall (or Azure OpenAI with
+--live).
+
+The corpus is every .txt/.md/.pdf file in data/ (what upload_documents sends
+to blob storage; PDFs need pypdf). Without data/ it is the guideline text
+reassembled from scripts/all_chunks.pkl, whose extraction lost most section
+headings, so the headings profile splits it far more coarsely here than the
+layout skill would.
+"""
+import argparse
+import json
+import math
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from benchmarks.fakes import load_chunks
+from benchmarks.report import write_report
+from benchmarks.vector_recall import TOKEN, live_embeddings, lsa_embeddings
+from scripts.chunking import PROFILES, chunk_text, count_tokens, get_encoding
+
+ROOT = Path(__file__).parent.parent
+GOLDEN_PATH = Path(__file__).parent / "golden_questions.jsonl"
+
+
+# ---------- Corpus & golden set ----------
+
+
+def load_corpus(data_dir: Path) -> List[Tuple[str, str]]:
+    """(name, text) for every document in `data_dir`, or the pickled guideline when there's no such directory."""
+    if not data_dir.is_dir():
+        return [("all_chunks.pkl", "\n\n".join(text for _, text in load_chunks()))]
+    documents = []
+    for path in sorted(data_dir.iterdir()):
+        if path.suffix.lower() in (".txt", ".md"):
+            documents.append((path.name, path.read_text(encoding="utf-8", errors="replace")))
+        elif path.suffix.lower() == ".pdf":
+            from pypdf import PdfReader  # only needed for PDFs
+            pages = PdfReader(path).pages
+            documents.append((path.name, "\n\n".join(page.extract_text() or "" for page in pages)))
+    return documents
+
+
+def load_golden(path: Path = GOLDEN_PATH) -> List[dict]:
+    """Questions with the answer phrases a relevant chunk must contain."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def first_hit(ranking: List[int], chunks: List[str], answers: List[str]) -> int:
+    """1-based rank of the first chunk containing an answer phrase, 0 if none does."""
+    for rank, index in enumerate(ranking, 1):
+        if any(answer in chunks[index] for answer in answers):
+            return rank
+    return 0
+
+
+# ---------- Retrieval ----------
+
+
+class BM25:
+    def __init__(self, texts: List[str], k1: float = 1.2, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.documents = [Counter(TOKEN.findall(text.lower())) for text in texts]
+        self.lengths = np.array([sum(doc.values()) for doc in self.documents], dtype=np.float32)
+        self.average = float(self.lengths.mean()) if len(self.documents) else 0.0
+        frequency = Counter(term for doc in self.documents for term in doc)
+        n = len(self.documents)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in frequency.items()}
+
+    def rank(self, query: str, count: int) -> List[int]:
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.average, 1e-9))
+        for term in set(TOKEN.findall(query.lower())):
+            if term not in self.idf:
+                continue
+            tf = np.array([doc.get(term, 0) for doc in self.documents], dtype=np.float32)
+            scores += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return [int(i) for i in np.argsort(-scores, kind="stable")[:count]]
+
+
+def rankings(retriever: str, chunks: List[str], questions: List[str], count: int, live: bool) -> List[List[int]]:
+    if retriever == "keyword":
+        index = BM25(chunks)
+        return [index.rank(question, count) for question in questions]
+    corpus, queries = (live_embeddings if live else lsa_embeddings)(chunks, questions)
+    scores = queries @ corpus.T
+    return [[int(i) for i in np.argsort(-row, kind="stable")[:count]] for row in scores]
+
+
+# ---------- Benchmark ----------
+
+
+def evaluate(profile_name: str, documents: List[Tuple[str, str]], golden: List[dict], ks: List[int],
+             retrievers: List[str], live: bool) -> Dict:
+    profile = PROFILES[profile_name]
+    started = time.perf_counter()
+    chunks = [chunk for _, text in documents for chunk in chunk_text(text, profile)]
+    chunk_seconds = time.perf_counter() - started
+    tokens = [count_tokens(chunk) for chunk in chunks]
+    normalized = [normalize_text(chunk) for chunk in chunks]
+    answers = [[normalize_text(answer) for answer in item["answers"]] for item in golden]
+    # Questions whose answer survives in no chunk at all can't be found by any retriever
+    answerable = sum(any(a in chunk for chunk in normalized for a in item_answers) for item_answers in answers)
+
+    row = {
+        "profile": profile_name,
+        "description": profile.describe(),
+        "chunks": len(chunks),
+        "total_tokens": sum(tokens),
+        "mean_chunk_tokens": sum(tokens) / max(len(chunks), 1),
+        "max_chunk_tokens": max(tokens, default=0),
+        "chunking_seconds": chunk_seconds,
+        "answerable": answerable / len(golden),
+        "retrievers": {},
+    }
+    for retriever in retrievers:
+        ranked = rankings(retriever, chunks, [item["question"] for item in golden], max(ks), live)
+        hits = [first_hit(ranking, normalized, item_answers) for ranking, item_answers in zip(ranked, answers)]
+        row["retrievers"][retriever] = {
+            **{f"hit@{k}": sum(0 < hit <= k for hit in hits) / len(golden) for k in ks},
+            "mrr": sum(1 / hit for hit in hits if hit) / len(golden),
+            # What the top-k results add to the model's prompt, per question
+            "context_tokens": sum(sum(tokens[i] for i in ranking[:ks[-1]]) for ranking in ranked) / len(golden),
+            "misses": [item["id"] for item, hit in zip(golden, hits) if not 0 < hit <= ks[-1]],
+        }
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--k", default="1,3,5", help="hit-rate cut-offs; the last is also used for context tokens")
+    parser.add_argument("--retrievers", default="keyword,vector")
+    parser.add_argument("--data", default=str(ROOT / "data"), help="documents to chunk (default: data/)")
+    parser.add_argument("--golden", default=str(GOLDEN_PATH))
+    parser.add_argument("--live", action="store_true", help="embed with Azure OpenAI instead of local LSA")
+    parser.add_argument("--output", help="report path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    profiles = args.profiles.split(",")
+    unknown = [name for name in profiles if name not in PROFILES]
+    if unknown:
+        parser.error(f"unknown profiles {', '.join(unknown)}; choose from {', '.join(PROFILES)}")
+    ks = sorted(int(k) for k in args.k.split(","))
+    retrievers = args.retrievers.split(",")
+    documents = load_corpus(Path(args.data))
+    golden = load_golden(Path(args.golden))
+    tokenizer = "cl100k_base" if get_encoding() is not None else "estimated (4 chars/token)"
+    print(f"{len(documents)} documents, {sum(len(text) for _, text in documents)} chars, "
+          f"{len(golden)} golden questions, tokens: {tokenizer}")
+
+    rows = []
+    for name in profiles:
+        row = evaluate(name, documents, golden, ks, retrievers, args.live)
+        rows.append(row)
+        scores = "  ".join(
+            f"{retriever} " + " ".join(f"{stats[f'hit@{k}']:.2f}" for k in ks) + f" mrr {stats['mrr']:.2f}"
+            for retriever, stats in row["retrievers"].items()
+        )
+        print(f"  {name:<22} {row['chunks']:>5} chunks {row['total_tokens']:>8} tokens  "
+              f"answerable {row['answerable']:.2f}  hit@{','.join(map(str, ks))}: {scores}")
+
+    write_report("chunking", {
+        "config": {**{k: v for k, v in vars(args).items() if k != "output"}, "documents": [n for n, _ in documents],
+                   "tokenizer": tokenizer},
+        "profiles": rows,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
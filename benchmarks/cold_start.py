@@ -0,0 +1,86 @@
+"""
+Cold start benchmark.
+
+Imports a module in a fresh interpreter with STARTUP_PROFILE=1, several times,
+and reports total import time plus the per-import and per-step breakdown.
+
+    python -m benchmarks.cold_start                   # scripts.tools only, no Azure needed
+    python -m benchmarks.cold_start --module main     # full app start, needs the app's env
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from scripts.latency import summarize
+from benchmarks.report import write_report
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_once(module: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        profile_path = os.path.join(tmp, "profile.json")
+        env = {
+            **os.environ,
+            "STARTUP_PROFILE": "1",
+            "STARTUP_PROFILE_OUTPUT": profile_path,
+        }
+        # Constructing a SecretClient doesn't touch the network, so tools imports fine without a vault
+        env.setdefault("KEYVAULT_URL", "https://example.vault.azure.net/")
+
+        code = f"import scripts.startup as s; import {module}; s.profiler.report()"
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wall = time.perf_counter() - start
+
+        with open(profile_path) as f:
+            profile = json.load(f)
+    profile["wall_s"] = wall
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="scripts.tools")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="report path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    runs = [run_once(args.module) for _ in range(args.runs)]
+
+    imports = defaultdict(list)
+    steps = defaultdict(list)
+    for run in runs:
+        for item in run["imports"]:
+            imports[item["name"]].append(item["seconds"])
+        for item in run["steps"]:
+            steps[item["name"]].append(item["seconds"])
+
+    results = {
+        "module": args.module,
+        "runs": args.runs,
+        "wall_s": summarize(r["wall_s"] for r in runs),
+        "in_process_s": summarize(r["total_s"] for r in runs),
+        "imports": {name: summarize(v) for name, v in imports.items()},
+        "steps": {name: summarize(v) for name, v in steps.items()},
+    }
+
+    print(f"{args.module}: wall p50 {results['wall_s']['p50'] * 1000:.0f} ms, "
+          f"in-process p50 {results['in_process_s']['p50'] * 1000:.0f} ms")
+    for name, stats in sorted(results["imports"].items(), key=lambda i: -i[1]["p50"])[:10]:
+        print(f"  import {name:<40} {stats['p50'] * 1000:8.1f} ms")
+    for name, stats in results["steps"].items():
+        print(f"  step   {name:<40} {stats['p50'] * 1000:8.1f} ms")
+
+    write_report("cold_start", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
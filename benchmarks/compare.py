@@ -0,0 +1,51 @@
+"""
+Compare two benchmark reports written by benchmarks/report.py.
+
+    python -m benchmarks.compare benchmarks/results/offline-abc123.json benchmarks/results/offline-def456.json
+
+Every numeric leaf present in both reports is listed with its relative change;
+--threshold limits the output to changes larger than that many percent.
+"""
+import argparse
+import json
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from flatten(child, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(old: dict, new: dict, threshold: float = 0.0):
+    old_values = dict(flatten(old["results"]))
+    new_values = dict(flatten(new["results"]))
+    rows = []
+    for key in old_values.keys() & new_values.keys():
+        before, after = old_values[key], new_values[key]
+        change = (after - before) / before * 100 if before else 0.0
+        if abs(change) >= threshold:
+            rows.append((key, before, after, change))
+    return sorted(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.0, help="only show changes above this percentage")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"{old['benchmark']}: {old['commit']} -> {new['commit']}")
+    for key, before, after, change in compare(old, new, args.threshold):
+        print(f"  {key:<70} {before:>14.6g} {after:>14.6g} {change:+8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Near-duplicate detection benchmark.
+
+Builds a corpus of revised copies of the documents load_corpus finds (see
+benchmarks/chunking.py), each with a share of its words replaced, plus
+unrelated documents, and runs scripts/dedupe.py's plan over it at each
+threshold:
+
+    python -m benchmarks.dedupe
+    python -m benchmarks.dedupe --thresholds 0.8,0.85,0.9 --edit-rates 0.002,0.01,0.05
+
+A revision counts as caught when it is marked a duplicate of its original;
+an unrelated document marked a duplicate of anything is a false positive.
+Embeddings and bytes saved are what skip mode would not upload. Scattered
+single-word edits change up to shingle-size shingles each, so this is harsher
+than real revisions, which tend to rewrite a few contiguous passages.
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.chunking import ROOT, load_corpus
+from benchmarks.report import write_report
+from scripts.chunking import get_profile
+from scripts.dedupe import SKIP, DedupeSettings, plan
+
+
+def revise(text: str, rate: float, rng: random.Random) -> str:
+    """`text` with `rate` of its words replaced, keeping paragraph breaks."""
+    paragraphs = []
+    for paragraph in text.split("\n\n"):
+        words = paragraph.split()
+        for i in range(len(words)):
+            if rng.random() < rate:
+                words[i] = rng.choice(("revised", "updated", "amended", "see", "note"))
+        paragraphs.append(" ".join(words))
+    return "\n\n".join(paragraphs)
+
+
+def unrelated(text: str, rng: random.Random) -> str:
+    """Same vocabulary, different document: the words of `text` shuffled within each paragraph."""
+    paragraphs = []
+    for paragraph in text.split("\n\n"):
+        words = paragraph.split()
+        rng.shuffle(words)
+        paragraphs.append(" ".join(words))
+    return "\n\n".join(paragraphs)
+
+
+def build_corpus(directory: Path, documents, edit_rates, seed: int):
+    """Originals, one revision per edit rate and one unrelated document each; returns (revisions, unrelated) names."""
+    rng = random.Random(seed)
+    revisions, others = {}, []
+    for index, (name, text) in enumerate(documents):
+        original = f"{index:02d}-original.txt"
+        (directory / original).write_text(text, encoding="utf-8")
+        for rate in edit_rates:
+            revision = f"{index:02d}-revised-{rate}.txt"
+            (directory / revision).write_text(revise(text, rate, rng), encoding="utf-8")
+            revisions[revision] = (original, rate)
+        other = f"{index:02d}-unrelated.txt"
+        (directory / other).write_text(unrelated(text, rng), encoding="utf-8")
+        others.append(other)
+    return revisions, others
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--thresholds", default="0.8,0.85,0.9,0.95")
+    parser.add_argument("--edit-rates", default="0.002,0.01,0.03,0.1", help="share of words replaced per revision")
+    parser.add_argument("--data", default=str(ROOT / "data"), help="documents to revise (default: data/)")
+    parser.add_argument("--profile", help="chunking profile (default: AZURE_SEARCH_CHUNKING_PROFILE's)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="report path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    edit_rates = [float(rate) for rate in args.edit_rates.split(",")]
+    profile = get_profile(args.profile)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        revisions, others = build_corpus(directory, load_corpus(Path(args.data)), edit_rates, args.seed)
+        paths = [str(path) for path in sorted(directory.iterdir())]
+        for threshold in (float(t) for t in args.thresholds.split(",")):
+            started = time.perf_counter()
+            report = plan(paths, settings=DedupeSettings(mode=SKIP, threshold=threshold), profile=profile)
+            elapsed = time.perf_counter() - started
+            decisions = report.decisions
+            caught = {rate: 0 for rate in edit_rates}
+            for name, (original, rate) in revisions.items():
+                caught[rate] += decisions[name].duplicate_of == original
+            per_rate = len(revisions) // len(edit_rates)
+            false_positives = sum(decisions[name].duplicate_of is not None for name in others)
+            total_bytes = sum(decision.size for decision in decisions.values())
+            total_chunks = sum(decision.chunks for decision in decisions.values())
+            results[str(threshold)] = {
+                "seconds": elapsed,
+                "caught_by_edit_rate": {str(rate): caught[rate] / per_rate for rate in edit_rates},
+                "false_positives": false_positives,
+                "embeddings_saved": report.embeddings_saved,
+                "embeddings_total": total_chunks,
+                "bytes_saved": report.bytes_saved,
+                "bytes_total": total_bytes,
+                "duplicate_chunks_in_kept": report.duplicate_chunks,
+            }
+            rates = "  ".join(f"{rate:g}: {caught[rate] / per_rate:4.0%}" for rate in edit_rates)
+            print(f"threshold {threshold:.2f}  caught by edit rate {rates}  false positives {false_positives}  "
+                  f"embeddings saved {report.embeddings_saved}/{total_chunks}  "
+                  f"bytes saved {report.bytes_saved}/{total_bytes}  {elapsed:.2f} s")
+
+    write_report("dedupe", {
+        "config": {**{k: v for k, v in vars(args).items() if k != "output"}, "profile": profile.describe()},
+        "thresholds": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,563 @@
+"""
+In-memory stand-ins for every external dependency of the app, so its own
+overhead can be measured without Azure, SQL Server or SerpAPI.
+
+    from benchmarks import fakes
+    backend = fakes.install()        # before importing scripts.tools / main
+    import main
+
+install() swaps the SDK entry points the app uses (DefaultAzureCredential,
+SecretClient, AIProjectClient, AzureOpenAI, SearchClient) for the fakes below,
+points scripts.tools at a seeded SQLite database and starts a local SerpAPI
+server. Each fake can sleep for a configurable latency to mimic a remote call.
+"""
+import hashlib
+import itertools
+import json
+import math
+import os
+import pickle
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import ResourceNotFoundError
+
+from scripts.patient_schema import INDEXES, MEDICAL_CONDITIONS, MEDICATIONS as SCHEMA_MEDICATIONS
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CHUNKS_PATH = REPO_ROOT / "scripts" / "all_chunks.pkl"
+
+
+@dataclass
+class FakeLatency:
+    """Seconds each fake waits before answering; all zero measures pure app overhead."""
+    secret: float = 0.0
+    token: float = 0.0
+    embedding: float = 0.0
+    search: float = 0.0
+    semantic: float = 0.0  # added to a search by the semantic ranker
+    agent_call: float = 0.0
+    model_step: float = 0.0
+
+
+LATENCY = FakeLatency()
+
+
+def _wait(seconds: float):
+    if seconds:
+        time.sleep(seconds)
+
+
+# ---------- Identity & Key Vault ----------
+
+
+class FakeCredential:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_token(self, *scopes, **kwargs):
+        _wait(LATENCY.token)
+        return AccessToken("fake-token", int(time.time()) + 3600)
+
+    def close(self):
+        pass
+
+
+SECRETS = {
+    "ai-project-conn-string": "fake.services.ai.azure.com;sub;rg;project",
+    "agent-id": "asst_fake",
+    "agent-id-fast": "asst_fake_fast",
+    "azureai-search-index-name": "acc-guidelines-index",
+    "azure-openai-endpoint": "https://fake.openai.azure.com/",
+    "azure-openai-embedding-deployment": "text-embedding-ada-002",
+    "model-deployment-name": "gpt-4o",
+    "azure-sql-server": "fake.database.windows.net",
+    "azure-sql-database": "patients",
+    "azure-sql-username": "fake",
+    "azure-sql-password": "fake",
+    "serp-api-key": "fake-serp-key",
+}
+
+
+class FakeSecretClient:
+    def __init__(self, vault_url=None, credential=None, **kwargs):
+        self.vault_url = vault_url
+
+    def get_secret(self, name, **kwargs):
+        _wait(LATENCY.secret)
+        if name not in SECRETS:
+            raise ResourceNotFoundError(f"A secret with (name/id) {name} was not found in this key vault.")
+        return SimpleNamespace(name=name, value=SECRETS[name])
+
+    def set_secret(self, name, value, **kwargs):
+        SECRETS[name] = value
+        return SimpleNamespace(name=name, value=value)
+
+
+# ---------- Embeddings & Search ----------
+
+
+def fake_embedding(text: str, dimensions: int = 1536) -> List[float]:
+    """Deterministic unit vector derived from the text's hash."""
+    rng = random.Random(hashlib.sha256(text.encode()).digest())
+    vec = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(v * v for v in vec))
+    return [v / norm for v in vec]
+
+
+class FakeAzureOpenAI:
+    def __init__(self, *args, **kwargs):
+        self.embeddings = self
+
+    def create(self, model=None, input=None, **kwargs):
+        _wait(LATENCY.embedding)
+        inputs = input if isinstance(input, list) else [input]
+        return SimpleNamespace(data=[SimpleNamespace(embedding=fake_embedding(t)) for t in inputs])
+
+    def close(self):
+        pass
+
+
+def load_chunks() -> List[Tuple[str, str]]:
+    with open(CHUNKS_PATH, "rb") as f:
+        return pickle.load(f)
+
+
+class FakeSearchClient:
+    """
+    Keyword-overlap search over the pickled guideline chunks. Vector queries return
+    arbitrary (but repeatable) neighbours, since fake embeddings carry no meaning;
+    hybrid queries fuse the two rankings the way the service does (RRF).
+    """
+
+    _index: Dict[str, List[int]] = {}
+    _chunks: List[Tuple[str, str]] = []
+    _lock = threading.Lock()
+
+    def __init__(self, endpoint=None, index_name=None, credential=None, **kwargs):
+        with FakeSearchClient._lock:
+            if not FakeSearchClient._chunks:
+                FakeSearchClient._chunks = load_chunks()
+                index = {}
+                for i, (_, text) in enumerate(FakeSearchClient._chunks):
+                    for term in set(text.lower().split()):
+                        index.setdefault(term, []).append(i)
+                FakeSearchClient._index = index
+
+    def search(self, search_text=None, top=50, vector_queries=None, query_type=None, **kwargs):
+        _wait(LATENCY.search)
+        if query_type == "semantic":
+            _wait(LATENCY.semantic)
+        rankings = []
+        if search_text:
+            matches = {}
+            for term in search_text.lower().split():
+                for i in self._index.get(term, ()):
+                    matches[i] = matches.get(i, 0) + 1
+            rankings.append(sorted(matches, key=lambda i: -matches[i])[:50])
+        for vector_query in vector_queries or ():
+            rng = random.Random(hashlib.sha256(str(vector_query.vector[:8]).encode()).digest())
+            rankings.append(rng.sample(range(len(self._chunks)), vector_query.k_nearest_neighbors))
+        scores = {}
+        for ranking in rankings:
+            for rank, i in enumerate(ranking, 1):
+                scores[i] = scores.get(i, 0.0) + 1 / (60 + rank)
+        best = sorted(scores, key=lambda i: -scores[i])[:top]
+        return [
+            {"chunk_id": self._chunks[i][0], "content": self._chunks[i][1], "chunk": self._chunks[i][1],
+             "@search.score": scores[i]}
+            for i in best
+        ]
+
+    def close(self):
+        pass
+
+
+# ---------- SQL ----------
+
+
+CONDITIONS = [*MEDICAL_CONDITIONS, "None", None]
+MEDICATIONS = [*SCHEMA_MEDICATIONS, "None", None]
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Gloria"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Paul", "Wilson"]
+
+
+def create_patient_database(path: str, rows: int = 10000, seed: int = 7) -> str:
+    """Create and seed a SQLite copy of PatientMedicalData (same columns as scripts/adding_data.py)."""
+    rng = random.Random(seed)
+    cnxn = sqlite3.connect(path)
+    cnxn.executescript("""
+        DROP TABLE IF EXISTS PatientMedicalData;
+        CREATE TABLE PatientMedicalData (
+            PatientID INTEGER PRIMARY KEY AUTOINCREMENT,
+            FirstName VARCHAR(100), LastName VARCHAR(100), DateOfBirth DATE, Gender VARCHAR(20),
+            ContactNumber VARCHAR(100), EmailAddress VARCHAR(100), Address VARCHAR(255), City VARCHAR(100),
+            PostalCode VARCHAR(20), Country VARCHAR(100), MedicalCondition VARCHAR(255),
+            Medications VARCHAR(255), Allergies VARCHAR(255), BloodType VARCHAR(10), LastVisitDate DATE,
+            SmokingStatus VARCHAR(50), AlcoholConsumption VARCHAR(50), ExerciseFrequency VARCHAR(50),
+            Occupation VARCHAR(100), Height_cm DECIMAL(5, 2), Weight_kg DECIMAL(5, 2),
+            BloodPressure VARCHAR(20), HeartRate_bpm INT, Temperature_C DECIMAL(3, 1), Notes TEXT
+        );
+    """)
+
+    def row(first, last, year, condition, medication):
+        return (
+            first, last, f"{year}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}", rng.choice(["Male", "Female", "Other"]),
+            "555-0100", f"{first.lower()}.{last.lower()}@example.com", "1 Main St", "Springfield", "12345", "USA",
+            condition, medication, rng.choice(["Penicillin", "Pollen", "None", None]), rng.choice(["A+", "O-", "B+"]),
+            "2024-11-02", "Never Smoker", "Light drinker", "Daily", "Teacher",
+            round(rng.uniform(150, 200), 1), round(rng.uniform(50, 150), 1),
+            f"{rng.randint(90, 160)}/{rng.randint(60, 100)} mmHg", rng.randint(55, 95),
+            round(rng.uniform(36.0, 37.6), 1), "Routine follow-up.",
+        )
+
+    records = [
+        row(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng.randint(1940, 2006),
+            rng.choice(CONDITIONS), rng.choice(MEDICATIONS))
+        for _ in range(rows - 1)
+    ]
+    records.append(row("Gloria", "Paul", 1946, "Hyperlipidemia", "Atorvastatin"))
+    placeholders = ", ".join("?" * 25)
+    cnxn.executemany(
+        f"""INSERT INTO PatientMedicalData (FirstName, LastName, DateOfBirth, Gender, ContactNumber, EmailAddress,
+            Address, City, PostalCode, Country, MedicalCondition, Medications, Allergies, BloodType, LastVisitDate,
+            SmokingStatus, AlcoholConsumption, ExerciseFrequency, Occupation, Height_cm, Weight_kg, BloodPressure,
+            HeartRate_bpm, Temperature_C, Notes) VALUES ({placeholders})""",
+        records,
+    )
+    for name, key_columns, _ in INDEXES:  # SQLite has no INCLUDE columns
+        cnxn.execute(f"CREATE INDEX {name} ON PatientMedicalData ({', '.join(key_columns)})")
+    cnxn.commit()
+    cnxn.close()
+    return path
+
+
+# T-SQL's SELECT TOP n, which SQLite spells as a trailing LIMIT n
+TOP_PATTERN = re.compile(r"^\s*SELECT\s+TOP\s*\(?\s*(\d+)\s*\)?\s", re.IGNORECASE)
+
+
+class FakeSQLCursor:
+    """sqlite3 cursor with pyodbc's cancel(), which interrupts the statement running on the connection."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+        self._cursor = connection.cursor()
+
+    def execute(self, sql, params=()):
+        match = TOP_PATTERN.match(sql)
+        if match:
+            sql = f"SELECT {sql[match.end():].rstrip().rstrip(';')} LIMIT {match.group(1)}"
+        self._cursor.execute(sql, params)
+        return self
+
+    def cancel(self):
+        self._connection.interrupt()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class FakeSQLConnection:
+    """The slice of a pyodbc connection the app uses, over SQLite: cursor(), close() and a query `timeout`."""
+
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self.timeout = 0
+
+    def cursor(self) -> FakeSQLCursor:
+        return FakeSQLCursor(self._connection)
+
+    def close(self):
+        self._connection.close()
+
+
+# ---------- SerpAPI ----------
+
+
+class _SerpApiHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({
+            "organic_results": [
+                {
+                    "title": f"FDA update {i}",
+                    "snippet": "The FDA approved a new anticoagulant therapy in 2025.",
+                    "link": f"https://www.fda.gov/news/{i}",
+                }
+                for i in range(1, 6)
+            ]
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_serpapi_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SerpApiHandler)
+    threading.Thread(target=server.serve_forever, name="fake-serpapi", daemon=True).start()
+    return server
+
+
+# ---------- Agents ----------
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def default_script(content: str) -> List[Tuple[str, dict]]:
+    """Tool calls the fake model makes for a user message, mirroring the set_starters prompts."""
+    text = content.lower()
+    calls = []
+    if "gloria paul" in text:
+        calls.append(("get_patient_by_name", {"first_name": "Gloria", "last_name": "Paul"}))
+    elif "how many patients" in text:
+        calls.append(("lookup_patient_data", {
+            "query": "SELECT COUNT(*) AS PatientCount FROM PatientMedicalData "
+                     "WHERE MedicalCondition = 'Hypertension' AND Medications = 'Lisinopril'"}))
+    if "acc" in text:
+        calls.append(("search_acc_guidelines", {"query": content[:200]}))
+    if "fda" in text:
+        calls.append(("search_serpapi_web", {"query": content[:200]}))
+    if "discharge summary" in text:
+        calls.append(("generate_discharge_summary", {
+            "patient_name": "Gloria Paul", "diagnosis": "Hyperlipidemia", "treatment": "Atorvastatin"}))
+    return calls
+
+
+class FakeAgentsClient:
+    """
+    Enough of AIProjectClient.agents for the app: threads, messages and runs.
+
+    A run asks `script(user message)` which tools to call, stops in requires_action
+    until their outputs are submitted, and answers with a canned summary. Each
+    get_run() moves the run one step, like polling the service would.
+    """
+
+    def __init__(self, script: Callable[[str], List[Tuple[str, dict]]] = default_script):
+        self.script = script
+        self._ids = itertools.count(1)
+        self._messages: Dict[str, List[SimpleNamespace]] = {}
+        self._runs: Dict[str, SimpleNamespace] = {}
+        self._steps: Dict[str, List[SimpleNamespace]] = {}
+        self._lock = threading.Lock()
+
+    def _id(self, prefix):
+        with self._lock:
+            return f"{prefix}_{next(self._ids)}"
+
+    def create_thread(self, **kwargs):
+        _wait(LATENCY.agent_call)
+        thread_id = self._id("thread")
+        self._messages[thread_id] = []
+        return SimpleNamespace(id=thread_id)
+
+    def delete_thread(self, thread_id, **kwargs):
+        self._messages.pop(thread_id, None)
+
+    def create_message(self, thread_id, role, content, **kwargs):
+        _wait(LATENCY.agent_call)
+        message = SimpleNamespace(id=self._id("msg"), role=role, content=content, run_id=None)
+        self._messages.setdefault(thread_id, []).append(message)
+        return message
+
+    def create_run(self, thread_id, assistant_id, tools=None, **kwargs):
+        _wait(LATENCY.agent_call)
+        created_at = _now()
+        user_messages = [m for m in self._messages.get(thread_id, []) if m.role == "user"]
+        content = user_messages[-1].content if user_messages else ""
+        run = SimpleNamespace(
+            id=self._id("run"), thread_id=thread_id, assistant_id=assistant_id, status="queued",
+            required_action=None, last_error=None, created_at=created_at, started_at=created_at,
+            completed_at=None, usage=None,
+            # Fake-only bookkeeping
+            content=content, calls=self.script(content) if tools else [], outputs=[], step_started=None,
+        )
+        self._runs[run.id] = run
+        self._steps[run.id] = []
+        return run
+
+    def get_run(self, thread_id, run_id, **kwargs):
+        """Advance the run one step: queued -> requires_action (if the script calls tools) -> completed."""
+        from azure.ai.agents.models import RequiredFunctionToolCall, RequiredFunctionToolCallDetails
+
+        _wait(LATENCY.agent_call)
+        run = self._runs[run_id]
+        if run.status == "queued" and run.calls:
+            _wait(LATENCY.model_step)
+            run.status = "requires_action"
+            run.step_started = _now()
+            run.required_action = SimpleNamespace(type="submit_tool_outputs", submit_tool_outputs=SimpleNamespace(
+                tool_calls=[
+                    RequiredFunctionToolCall(
+                        id=self._id("call"),
+                        function=RequiredFunctionToolCallDetails(name=name, arguments=json.dumps(args)),
+                    )
+                    for name, args in run.calls
+                ]
+            ))
+        elif run.status in ("queued", "in_progress"):
+            self._complete(run)
+        return run
+
+    def submit_tool_outputs_to_run(self, thread_id, run_id, tool_outputs, **kwargs):
+        _wait(LATENCY.agent_call)
+        run = self._runs[run_id]
+        if run.status != "requires_action":
+            raise ValueError(f"run {run_id} is {run.status}, not waiting for tool outputs")
+        run.outputs = list(tool_outputs)
+        run.required_action = None
+        run.status = "in_progress"
+        self._steps[run_id].append(SimpleNamespace(
+            type="tool_calls", status="completed", created_at=run.step_started, completed_at=_now(),
+            step_details=SimpleNamespace(tool_calls=[
+                SimpleNamespace(type="function", function=SimpleNamespace(name=name)) for name, _ in run.calls
+            ]),
+        ))
+        return run
+
+    def cancel_run(self, thread_id, run_id, **kwargs):
+        _wait(LATENCY.agent_call)
+        run = self._runs[run_id]
+        if run.status in ("queued", "in_progress", "requires_action"):
+            run.status = "cancelled"
+            run.required_action = None
+            run.completed_at = _now()
+        return run
+
+    def _complete(self, run):
+        step_started = _now()
+        _wait(LATENCY.model_step)
+        self._steps[run.id].append(SimpleNamespace(type="message_creation", status="completed",
+                                                   created_at=step_started, completed_at=_now(), step_details=None))
+
+        if run.assistant_id == SECRETS["agent-id-fast"] and len(run.calls) > 1:
+            reply = "[[ESCALATE]]"  # tier_router.ESCALATE_MARKER: the fast agent hands off multi-tool messages
+        else:
+            reply = "Summary based on " + (", ".join(name for name, _ in run.calls) or "general knowledge") + "."
+            reply += "".join(f"\n\n{o['output'][:500]}" for o in run.outputs)
+        self._messages[run.thread_id].append(SimpleNamespace(id=self._id("msg"), role="assistant", content=reply,
+                                                             run_id=run.id))
+
+        prompt_tokens = len(run.content) // 4 + sum(len(o["output"]) // 4 for o in run.outputs)
+        run.status = "completed"
+        run.completed_at = _now()
+        run.usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(reply) // 4,
+                                    total_tokens=prompt_tokens + len(reply) // 4)
+
+    def create_and_process_run(self, thread_id, assistant_id, toolset=None, **kwargs):
+        """The SDK's polling loop over the calls above, without its sleep between polls."""
+        run = self.create_run(thread_id, assistant_id, tools=toolset.definitions if toolset else None)
+        while run.status in ("queued", "in_progress", "requires_action"):
+            run = self.get_run(thread_id, run.id)
+            if run.status == "requires_action":
+                outputs = toolset.execute_tool_calls(run.required_action.submit_tool_outputs.tool_calls)
+                self.submit_tool_outputs_to_run(thread_id, run.id, tool_outputs=outputs)
+        return run
+
+    def list_run_steps(self, thread_id, run_id, **kwargs):
+        _wait(LATENCY.agent_call)
+        return SimpleNamespace(data=self._steps.get(run_id, []))
+
+    def list_messages(self, thread_id, run_id=None, **kwargs):
+        _wait(LATENCY.agent_call)
+        messages = [m for m in self._messages.get(thread_id, []) if run_id is None or m.run_id == run_id]
+
+        def get_last_text_message_by_role(role):
+            for m in reversed(messages):
+                if m.role == role:
+                    return SimpleNamespace(text=SimpleNamespace(value=m.content))
+            return None
+
+        return SimpleNamespace(data=messages, get_last_text_message_by_role=get_last_text_message_by_role)
+
+
+class FakeProjectClient:
+    def __init__(self, agents=None):
+        self.agents = agents or FakeAgentsClient()
+        self.scope = {"subscription_id": "sub", "resource_group_name": "rg", "project_name": "project"}
+        self.telemetry = SimpleNamespace(get_connection_string=lambda: None)
+
+    @classmethod
+    def from_connection_string(cls, conn_str=None, credential=None, **kwargs):
+        return cls()
+
+
+# ---------- Wiring ----------
+
+
+@dataclass
+class OfflineBackend:
+    workdir: str
+    database_path: str
+    serpapi_server: ThreadingHTTPServer
+    patches: List[Tuple[object, str, object]] = field(default_factory=list)
+
+    def close(self):
+        for target, name, original in reversed(self.patches):
+            setattr(target, name, original)
+        self.serpapi_server.shutdown()
+
+
+def _patch(backend: OfflineBackend, target, name, value):
+    backend.patches.append((target, name, getattr(target, name)))
+    setattr(target, name, value)
+
+
+def install(rows: int = 10000, latency: FakeLatency = None) -> OfflineBackend:
+    """Point the app at the fakes. Call before importing scripts.tools or main."""
+    import azure.identity
+    import azure.keyvault.secrets
+    import azure.ai.projects
+    import azure.search.documents
+    import openai
+
+    if "main" in sys.modules:
+        raise RuntimeError("install() must run before main is imported")
+    if latency is not None:
+        for name, value in vars(latency).items():
+            setattr(LATENCY, name, value)
+
+    workdir = tempfile.mkdtemp(prefix="offline-bench-")
+    database_path = create_patient_database(os.path.join(workdir, "patients.db"), rows=rows)
+    serpapi_server = start_serpapi_server()
+
+    os.environ.setdefault("AZURE_CLIENT_ID", "00000000-0000-0000-0000-000000000000")
+    os.environ.setdefault("KEYVAULT_URL", "https://fake.vault.azure.net/")
+    os.environ.setdefault("AZURE_SEARCH_ENDPOINT", "https://fake.search.windows.net")
+    os.environ["SERPAPI_BACKEND"] = f"http://127.0.0.1:{serpapi_server.server_address[1]}"
+    os.environ.setdefault("AGENT_RUN_POLL_SECONDS", "0")  # fake runs move on every poll
+    os.environ.setdefault("TELEMETRY_ENABLED", "0")  # benchmarks.telemetry_overhead turns it on
+
+    backend = OfflineBackend(workdir, database_path, serpapi_server)
+    _patch(backend, azure.identity, "DefaultAzureCredential", FakeCredential)
+    _patch(backend, azure.keyvault.secrets, "SecretClient", FakeSecretClient)
+    _patch(backend, azure.ai.projects, "AIProjectClient", FakeProjectClient)
+    _patch(backend, azure.search.documents, "SearchClient", FakeSearchClient)
+    _patch(backend, openai, "AzureOpenAI", FakeAzureOpenAI)
+
+    import scripts.token_broker as token_broker
+    _patch(backend, token_broker, "_broker", token_broker.TokenBroker(FakeCredential()))
+
+    import scripts.tools as tools
+    _patch(backend, tools, "key_vault", FakeSecretClient())
+    _patch(backend, tools, "SERPAPI_BACKEND", os.environ["SERPAPI_BACKEND"])
+    _patch(backend, tools, "connect_sql", lambda: FakeSQLConnection(database_path))
+    tools._secret_cache.clear()
+    return backend
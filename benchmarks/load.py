@@ -0,0 +1,306 @@
+"""
+Concurrent-user load generator for the Chainlit app.
+
+Each simulated user opens a Chainlit session, sends one of the set_starters
+prompts followed by a few follow-ups, and waits a random think time between
+messages. Targets:
+
+    offline   main.py in-process, every backend replaced by benchmarks/fakes.py
+    live      main.py in-process against the real Azure services from the environment
+    url       a running deployment, over Chainlit's socket.io endpoint (--url)
+
+Examples:
+
+    python -m benchmarks.load --users 20                       # 20 users at once
+    python -m benchmarks.load --arrival-rate 2 --duration 60   # Poisson arrivals, 2 sessions/s
+    python -m benchmarks.load --ramp 1,2,4,8,16 --duration 30  # find the saturation point
+    python -m benchmarks.load --target url --url https://myapp.azurecontainerapps.io --users 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List
+
+from benchmarks.offline import STARTERS
+from benchmarks.report import write_report
+from scripts.latency import summarize
+
+FOLLOW_UPS = [
+    "Thanks. Can you summarize that in two sentences?",
+    "Can you show that as a table?",
+    "What should I discuss with the patient at the next visit?",
+]
+
+
+@dataclass
+class Sample:
+    started: float
+    latency: float
+    ok: bool
+    error: str = ""
+
+
+@dataclass
+class PhaseResult:
+    samples: List[Sample] = field(default_factory=list)
+    sessions: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> dict:
+        ok = [s.latency for s in self.samples if s.ok]
+        errors = [s for s in self.samples if not s.ok]
+        return {
+            "sessions": self.sessions,
+            "messages": len(self.samples),
+            "errors": len(errors),
+            "error_rate": len(errors) / len(self.samples) if self.samples else 0.0,
+            "throughput_msg_s": len(ok) / self.elapsed if self.elapsed else 0.0,
+            "elapsed_s": self.elapsed,
+            "latency_s": summarize(ok),
+            "error_samples": sorted({e.error for e in errors})[:5],
+        }
+
+
+# ---------- Targets ----------
+
+
+class InProcessTarget:
+    """Drives main.main(message) directly, one Chainlit HTTP context per simulated user."""
+
+    def __init__(self, offline: bool, latency_ms: float = 0.0):
+        self.backend = None
+        if offline:
+            from benchmarks import fakes
+            delay = latency_ms / 1000
+            self.backend = fakes.install(latency=fakes.FakeLatency(
+                secret=delay, token=delay, embedding=delay, search=delay, agent_call=delay, model_step=delay))
+            os.chdir(self.backend.workdir)
+        import main
+        self.app = main
+
+    async def open(self):
+        from chainlit.context import init_http_context
+        import chainlit as cl
+
+        init_http_context()  # contextvars are per asyncio task, so each user gets its own session
+        app = self.app
+
+        async def send(text: str):
+            await app.main(cl.Message(content=text, author="User"))
+
+        async def close():
+            pass
+
+        return send, close
+
+    def shutdown(self):
+        self.app.thread_pool.stop()
+        if self.backend:
+            self.backend.close()
+
+
+class ChainlitUrlTarget:
+    """Talks to a deployed app the way the browser does: socket.io client_message, wait for task_end."""
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    async def open(self):
+        import socketio
+
+        client = socketio.AsyncClient(reconnection=False)
+        thread_id = str(uuid.uuid4())
+        started, done = asyncio.Event(), asyncio.Event()
+        errors = []
+
+        @client.on("task_start")
+        async def on_task_start(*_):
+            started.set()
+
+        @client.on("task_end")
+        async def on_task_end(*_):
+            # The connect handshake sends a task_end of its own; only count the one after our task_start
+            if started.is_set():
+                done.set()
+
+        @client.on("new_message")
+        async def on_new_message(step):
+            if step.get("isError"):
+                errors.append(step.get("output", "error"))
+
+        await client.connect(
+            self.url,
+            socketio_path="/ws/socket.io",
+            transports=["websocket"],  # what serve.py tells the browser to use with several workers
+            auth={"sessionId": str(uuid.uuid4()), "clientType": "webapp", "userEnv": "{}", "threadId": thread_id},
+        )
+        await client.emit("connection_successful")
+
+        async def send(text: str):
+            started.clear()
+            done.clear()
+            errors.clear()
+            await client.emit("client_message", {
+                "message": {
+                    "id": str(uuid.uuid4()),
+                    "threadId": thread_id,
+                    "name": "User",
+                    "type": "user_message",
+                    "output": text,
+                    "createdAt": datetime.now(timezone.utc).isoformat(),
+                },
+                "fileReferences": None,
+            })
+            await asyncio.wait_for(done.wait(), self.timeout)
+            if errors:
+                raise RuntimeError(errors[0])
+
+        async def close():
+            await client.disconnect()
+
+        return send, close
+
+    def shutdown(self):
+        pass
+
+
+# ---------- Load phases ----------
+
+
+async def simulate_user(target, result: PhaseResult, rng: random.Random, follow_ups: int, think_time: float):
+    result.sessions += 1
+    try:
+        send, close = await target.open()
+    except Exception as e:
+        result.samples.append(Sample(time.perf_counter(), 0.0, False, f"connect: {e}"))
+        return
+    try:
+        conversation = [rng.choice(STARTERS)] + rng.sample(FOLLOW_UPS, min(follow_ups, len(FOLLOW_UPS)))
+        for index, text in enumerate(conversation):
+            if index:
+                await asyncio.sleep(rng.expovariate(1 / think_time) if think_time else 0)
+            start = time.perf_counter()
+            try:
+                await send(text)
+                result.samples.append(Sample(start, time.perf_counter() - start, True))
+            except Exception as e:
+                result.samples.append(Sample(start, time.perf_counter() - start, False, type(e).__name__ + f": {e}"))
+    finally:
+        await close()
+
+
+async def run_phase(target, users: int, arrival_rate: float, duration: float, follow_ups: int,
+                    think_time: float, seed: int) -> PhaseResult:
+    """Closed model (`users` at once) when arrival_rate is 0, otherwise Poisson arrivals for `duration`."""
+    rng = random.Random(seed)
+    result = PhaseResult()
+    tasks = []
+    start = time.perf_counter()
+
+    if arrival_rate:
+        while time.perf_counter() - start < duration:
+            tasks.append(asyncio.create_task(simulate_user(target, result, random.Random(rng.random()),
+                                                           follow_ups, think_time)))
+            await asyncio.sleep(rng.expovariate(arrival_rate))
+    else:
+        tasks = [
+            asyncio.create_task(simulate_user(target, result, random.Random(rng.random()), follow_ups, think_time))
+            for _ in range(users)
+        ]
+
+    await asyncio.gather(*tasks)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def find_saturation(steps: List[dict], max_error_rate: float, latency_factor: float):
+    """
+    The first arrival rate at which the app stops keeping up: fewer than 90% of the offered sessions
+    could even be started (the app is blocking the event loop), throughput grows by less than 10% over the
+    previous step, errors exceed `max_error_rate`, or p95 exceeds `latency_factor` x the first step's.
+    """
+    if not steps:
+        return None
+    baseline_p95 = steps[0]["latency_s"]["p95"]
+    for previous, step in zip([None] + steps[:-1], steps):
+        if step["sessions"] < 0.9 * step["offered_sessions"]:
+            return step["arrival_rate"]
+        if step["error_rate"] > max_error_rate:
+            return step["arrival_rate"]
+        if baseline_p95 and step["latency_s"]["p95"] > latency_factor * baseline_p95:
+            return step["arrival_rate"]
+        if previous and step["throughput_msg_s"] < previous["throughput_msg_s"] * 1.1:
+            return step["arrival_rate"]
+    return None
+
+
+def print_summary(label: str, summary: dict):
+    latency = summary["latency_s"]
+    print(f"  {label:<18} sessions {summary['sessions']:4d}  msgs {summary['messages']:5d}  "
+          f"thr {summary['throughput_msg_s']:7.2f}/s  p50 {latency['p50']:7.3f}s  p95 {latency['p95']:7.3f}s  "
+          f"p99 {latency['p99']:7.3f}s  err {summary['error_rate'] * 100:5.1f}%")
+
+
+async def run(args) -> dict:
+    if args.target == "url":
+        if not args.url:
+            raise SystemExit("--url is required with --target url")
+        target = ChainlitUrlTarget(args.url, args.timeout)
+    else:
+        target = InProcessTarget(offline=args.target == "offline", latency_ms=args.latency_ms)
+
+    try:
+        if args.ramp:
+            steps = []
+            for index, rate in enumerate(float(r) for r in args.ramp.split(",")):
+                phase = await run_phase(target, args.users, rate, args.duration, args.follow_ups,
+                                        args.think_time, args.seed + index)
+                summary = {"arrival_rate": rate, "offered_sessions": rate * args.duration, **phase.summary()}
+                print_summary(f"{rate:g} sessions/s", summary)
+                steps.append(summary)
+            saturation = find_saturation(steps, args.max_error_rate, args.latency_factor)
+            print(f"Saturation point: {saturation if saturation is not None else 'not reached'}"
+                  + (" sessions/s" if saturation is not None else ""))
+            return {"mode": "ramp", "steps": steps, "saturation_arrival_rate": saturation}
+
+        phase = await run_phase(target, args.users, args.arrival_rate, args.duration, args.follow_ups,
+                                args.think_time, args.seed)
+        summary = phase.summary()
+        print_summary("arrival" if args.arrival_rate else f"{args.users} users", summary)
+        return {"mode": "arrival" if args.arrival_rate else "closed", **summary}
+    finally:
+        target.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["offline", "live", "url"], default="offline")
+    parser.add_argument("--url", help="base URL of a running deployment (with --target url)")
+    parser.add_argument("--users", type=int, default=10, help="concurrent users in the closed model")
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="new sessions per second (open model)")
+    parser.add_argument("--ramp", help="comma-separated arrival rates to step through")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of arrivals per phase")
+    parser.add_argument("--follow-ups", type=int, default=2, help="messages after the starter prompt")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds between a user's messages")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-message timeout for --target url")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated backend latency (offline)")
+    parser.add_argument("--max-error-rate", type=float, default=0.05)
+    parser.add_argument("--latency-factor", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="report path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    results["config"] = {k: v for k, v in vars(args).items() if k != "output"}
+    write_report("load", json.loads(json.dumps(results)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Offline end-to-end latency benchmark.
+
+Runs every tool in user_functions, the query router and run_multi_step_agent
+against the fakes in benchmarks/fakes.py and reports p50/p99 latency and
+allocations:
+
+    python -m benchmarks.offline --iterations 200
+    python -m benchmarks.offline --latency-ms 20      # give every fake backend call 20 ms
+    python -m benchmarks.compare old.json new.json
+
+Latency is measured without tracemalloc; allocations come from a separate,
+shorter pass with tracemalloc on.
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+from benchmarks import fakes
+from benchmarks.report import write_report
+from scripts.latency import summarize
+
+STARTERS = [
+    "How many patients have Hypertension and are prescribed Lisinopril?",
+    "Are there any recent updates in 2025 on new anticoagulant therapies from the FDA?",
+    "What does the ACC recommend as first-line therapy for hypertension in elderly patients?",
+    (
+        "I have a 79-year-old patient named Gloria Paul with hyperlipidemia. "
+        "She's on Atorvastatin. Can you confirm her medical details from the database, "
+        "check the ACC guidelines for hyperlipidemia, and see if there are any new medication "
+        "updates from the FDA as of Feb 2025? Then give me a summary."
+    ),
+]
+
+TOOL_CASES = {
+    "search_acc_guidelines": {"query": "first-line therapy for hypertension in elderly patients"},
+    "search_serpapi_web": {"query": "FDA anticoagulant approval 2025"},
+    "lookup_patient_data": {
+        "query": "SELECT COUNT(*) AS PatientCount FROM PatientMedicalData "
+                 "WHERE MedicalCondition = 'Hypertension' AND Medications = 'Lisinopril'"
+    },
+    "get_patient_by_name": {"first_name": "Gloria", "last_name": "Paul"},
+    "get_patient_by_id": {"patient_id": 42},
+    "list_patient_cohort": {"condition": "Hypertension", "medication": "Lisinopril"},
+    "generate_discharge_summary": {
+        "patient_name": "Gloria Paul", "diagnosis": "Hyperlipidemia", "treatment": "Atorvastatin"
+    },
+}
+
+
+def measure(call, iterations: int, alloc_iterations: int) -> dict:
+    """Latency and allocation statistics for `call` (a zero-arg callable)."""
+    call()  # warm up lazy imports and caches
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            call()
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "latency_s": summarize(latencies),
+        "alloc_peak_bytes": summarize(peaks),
+        "alloc_retained_bytes": summarize(retained),
+    }
+
+
+def bench_tools(iterations: int, alloc_iterations: int) -> dict:
+    from scripts.tools import user_functions
+
+    results = {}
+    for function in sorted(user_functions, key=lambda f: f.__name__):
+        kwargs = TOOL_CASES.get(function.__name__)
+        if kwargs is None:
+            print(f"  skipping {function.__name__}: no benchmark case")
+            continue
+        results[function.__name__] = measure(lambda: function(**kwargs), iterations, alloc_iterations)
+        print_row(function.__name__, results[function.__name__])
+    return results
+
+
+def bench_router(iterations: int, alloc_iterations: int) -> dict:
+    """Starters the query router answers directly; compare with the same starter through the agent."""
+    from scripts import query_router
+
+    results = {}
+    for index, prompt in enumerate(STARTERS, 1):
+        if query_router.try_answer(prompt) is None:
+            continue
+        name = f"query_router[starter_{index}]"
+        results[name] = measure(lambda: query_router.try_answer(prompt), iterations, alloc_iterations)
+        print_row(name, results[name])
+    return results
+
+
+def bench_agent(iterations: int, alloc_iterations: int) -> dict:
+    from chainlit.context import init_http_context
+    import main
+
+    loop = asyncio.new_event_loop()
+
+    def run_once(prompt):
+        async def session():
+            init_http_context()  # a fresh Chainlit session per conversation
+            await main.run_multi_step_agent(user_id="bench", user_query=prompt)
+        loop.run_until_complete(session())
+
+    results = {}
+    try:
+        for index, prompt in enumerate(STARTERS, 1):
+            name = f"run_multi_step_agent[starter_{index}]"
+            results[name] = measure(lambda: run_once(prompt), iterations, alloc_iterations)
+            print_row(name, results[name])
+    finally:
+        main.thread_pool.stop()
+        loop.close()
+    return results
+
+
+def print_row(name: str, stats: dict):
+    latency = stats["latency_s"]
+    print(f"  {name:<42} p50 {latency['p50'] * 1000:8.2f} ms   p99 {latency['p99'] * 1000:8.2f} ms   "
+          f"peak alloc {stats['alloc_peak_bytes']['p50'] / 1024:8.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--alloc-iterations", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=10000, help="patients seeded into the SQLite database")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency of each fake backend call")
+    parser.add_argument("--output", help="report path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    delay = args.latency_ms / 1000
+    latency = fakes.FakeLatency(secret=delay, token=delay, embedding=delay, search=delay,
+                                agent_call=delay, model_step=delay)
+    backend = fakes.install(rows=args.rows, latency=latency)
+    cwd = os.getcwd()
+    os.chdir(backend.workdir)  # discharge summaries are written relative to the cwd
+    try:
+        print("Tools:")
+        tools = bench_tools(args.iterations, args.alloc_iterations)
+        print("Router:")
+        router = bench_router(args.iterations, args.alloc_iterations)
+        print("Agent:")
+        agent = bench_agent(args.iterations, args.alloc_iterations)
+    finally:
+        os.chdir(cwd)
+        backend.close()
+
+    write_report("offline", {
+        "iterations": args.iterations,
+        "alloc_iterations": args.alloc_iterations,
+        "rows": args.rows,
+        "fake_latency_ms": args.latency_ms,
+        "cases": {**tools, **router, **agent},
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+main.py with every backend replaced by benchmarks/fakes.py, as a Chainlit target:
+
+    PYTHONPATH=. python serve.py benchmarks/offline_app.py --workers 4
+
+OFFLINE_ROWS and OFFLINE_LATENCY_MS configure the fakes.
+"""
+import os
+
+from benchmarks import fakes
+
+_delay = float(os.getenv("OFFLINE_LATENCY_MS", "0")) / 1000
+fakes.install(
+    rows=int(os.getenv("OFFLINE_ROWS", "10000")),
+    latency=fakes.FakeLatency(secret=_delay, token=_delay, embedding=_delay, search=_delay,
+                              agent_call=_delay, model_step=_delay),
+)
+
+import main  # noqa: E402,F401  registers the Chainlit handlers
@@ -0,0 +1,36 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_report(benchmark: str, results: dict, output: str = None) -> Path:
+    """Write a benchmark report as JSON, by default to results/<benchmark>-<commit>.json."""
+    commit = git_commit()
+    report = {
+        "benchmark": benchmark,
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    path = Path(output) if output else RESULTS_DIR / f"{benchmark}-{commit}.json"
+    os.makedirs(path.parent, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {path}")
+    return path
@@ -0,0 +1,143 @@
+"""
+Retrieval profile matrix.
+
+Runs the golden question set (benchmarks/golden_questions.jsonl) through
+search_acc_guidelines' retrieval path under each profile in
+scripts/retrieval.py and reports latency percentiles next to relevance, then
+names the fastest profile (by p95) whose hit rate meets the bar:
+
+    python -m benchmarks.retrieval_matrix --live --repeat 5
+    python -m benchmarks.retrieval_matrix --live --profiles legacy,hybrid-top5,keyword --min-hit-rate 0.8
+    python -m benchmarks.retrieval_matrix --latency-ms 20 --semantic-ms 60    # offline, against the fakes
+
+A question is a hit when one of the returned chunks contains one of its
+answer phrases. Profiles take turns on every question, so drift in service
+latency during the run is spread evenly across them. The bar defaults to the
+legacy profile's hit rate: a cheaper profile must retrieve as well as today.
+
+Only --live numbers mean anything. Offline, the fakes simulate each call's
+latency, vector neighbours are arbitrary and the semantic ranker reorders
+nothing; that run checks the harness and shows what skipping the embedding
+call or the ranker saves for a given backend latency.
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.chunking import GOLDEN_PATH, load_golden, normalize_text
+from benchmarks.report import write_report
+from scripts.chunking import count_tokens
+from scripts.latency import summarize
+from scripts.retrieval import DEFAULT_PROFILE, PROFILES
+
+
+def first_hit(texts: List[str], answers: List[str]) -> int:
+    """1-based rank of the first result containing an answer phrase, 0 if none does."""
+    for rank, text in enumerate(texts, 1):
+        text = normalize_text(text)
+        if any(answer in text for answer in answers):
+            return rank
+    return 0
+
+
+def run(profiles: List[str], golden: List[dict], repeat: int, warmup: int) -> Dict[str, dict]:
+    from scripts import tools
+
+    answers = [[normalize_text(answer) for answer in item["answers"]] for item in golden]
+    for item in golden[:warmup]:  # token, secrets, connection pools
+        for name in profiles:
+            tools.retrieve_guidelines(item["question"], PROFILES[name])
+
+    samples = {name: {"latencies": [], "hits": [], "tokens": [], "errors": 0} for name in profiles}
+    for _ in range(repeat):
+        for item, item_answers in zip(golden, answers):
+            for name in profiles:
+                sample = samples[name]
+                start = time.perf_counter()
+                try:
+                    texts = tools.retrieve_guidelines(item["question"], PROFILES[name])
+                except Exception as e:
+                    sample["errors"] += 1
+                    print(f"  {name}: {type(e).__name__}: {e}")
+                    continue
+                sample["latencies"].append(time.perf_counter() - start)
+                sample["hits"].append(first_hit(texts, item_answers))
+                sample["tokens"].append(sum(count_tokens(text) for text in texts))
+
+    rows = {}
+    for name in profiles:
+        sample = samples[name]
+        hits = sample["hits"]
+        rows[name] = {
+            "description": PROFILES[name].describe(),
+            "latency_s": summarize(sample["latencies"]),
+            "hit_rate": sum(1 for hit in hits if hit) / max(len(hits), 1),
+            "mrr": sum(1 / hit for hit in hits if hit) / max(len(hits), 1),
+            # What the results add to the model's prompt
+            "context_tokens": sum(sample["tokens"]) / max(len(sample["tokens"]), 1),
+            "errors": sample["errors"],
+        }
+    return rows
+
+
+def cheapest(rows: Dict[str, dict], min_hit_rate: float) -> str:
+    """The profile with the lowest p95 latency among those meeting `min_hit_rate` and free of errors."""
+    eligible = [name for name, row in rows.items() if row["hit_rate"] >= min_hit_rate and not row["errors"]]
+    return min(eligible, key=lambda name: rows[name]["latency_s"]["p95"], default=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the golden set")
+    parser.add_argument("--warmup", type=int, default=2, help="questions run once per profile before measuring")
+    parser.add_argument("--min-hit-rate", type=float, help="quality bar (default: the legacy profile's hit rate)")
+    parser.add_argument("--golden", default=str(GOLDEN_PATH))
+    parser.add_argument("--live", action="store_true", help="query the real index (Key Vault, Azure OpenAI, AI Search)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="offline: simulated latency of each fake call")
+    parser.add_argument("--semantic-ms", type=float, default=0.0, help="offline: extra latency of the semantic ranker")
+    parser.add_argument("--output", help="report path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    profiles = args.profiles.split(",")
+    unknown = [name for name in profiles if name not in PROFILES]
+    if unknown:
+        parser.error(f"unknown profiles {', '.join(unknown)}; choose from {', '.join(PROFILES)}")
+    golden = load_golden(Path(args.golden))
+
+    backend = None
+    if not args.live:
+        from benchmarks import fakes
+
+        delay = args.latency_ms / 1000
+        backend = fakes.install(latency=fakes.FakeLatency(secret=delay, token=delay, embedding=delay, search=delay,
+                                                          semantic=args.semantic_ms / 1000))
+    try:
+        print(f"{len(golden)} golden questions x {args.repeat}, {'live' if args.live else 'fakes'}")
+        rows = run(profiles, golden, args.repeat, args.warmup)
+    finally:
+        if backend is not None:
+            backend.close()
+
+    baseline = rows.get(DEFAULT_PROFILE)
+    min_hit_rate = args.min_hit_rate if args.min_hit_rate is not None else baseline["hit_rate"] if baseline else 0.0
+    for name, row in rows.items():
+        latency = row["latency_s"]
+        print(f"  {name:<18} {row['description']:<32} p50 {latency['p50'] * 1000:8.2f} ms  "
+              f"p95 {latency['p95'] * 1000:8.2f} ms  p99 {latency['p99'] * 1000:8.2f} ms  "
+              f"hit {row['hit_rate']:.2f}  mrr {row['mrr']:.2f}  context {row['context_tokens']:7.0f} tokens"
+              + (f"  errors {row['errors']}" if row["errors"] else ""))
+    choice = cheapest(rows, min_hit_rate)
+    print(f"Fastest profile with hit rate >= {min_hit_rate:.2f}: {choice or 'none'}")
+
+    write_report("retrieval_matrix", {
+        "config": {**{k: v for k, v in vars(args).items() if k != "output"}, "questions": len(golden)},
+        "min_hit_rate": min_hit_rate,
+        "recommended": choice,
+        "profiles": rows,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Telemetry overhead benchmark.
+
+Runs the set_starters prompts through run_multi_step_agent against the fakes
+once per telemetry mode and reports what exporting adds to request latency,
+next to what scripts/telemetry.py kept, dropped and exported:
+
+    python -m benchmarks.telemetry_overhead
+    python -m benchmarks.telemetry_overhead --export-ms 200 --latency-ms 5 --slow-ms 50
+
+Modes:
+    off          TELEMETRY_ENABLED=0, the baseline
+    head         10% head sampling only
+    head+tail    10% head sampling, plus every slow or failed trace (the default)
+    all          every trace
+
+Spans go to the in-memory exporter, wrapped to sleep --export-ms per batch as
+a remote exporter would; that time is spent on the export thread, so it
+should not show up in request latency. Each mode runs in its own process
+because the tracer provider can only be installed once.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.report import write_report
+
+MODES = {
+    "off": {"TELEMETRY_ENABLED": "0"},
+    "head": {"TELEMETRY_SAMPLE_RATIO": "0.1", "TELEMETRY_TAIL_SAMPLING": "0"},
+    "head+tail": {"TELEMETRY_SAMPLE_RATIO": "0.1", "TELEMETRY_TAIL_SAMPLING": "1"},
+    "all": {"TELEMETRY_SAMPLE_RATIO": "1.0", "TELEMETRY_TAIL_SAMPLING": "0"},
+}
+
+
+class DelayedExporter:
+    """Wraps a span exporter with a fixed delay per export call, like a network round trip."""
+
+    def __init__(self, exporter, delay_s: float):
+        self.exporter = exporter
+        self.delay_s = delay_s
+
+    def export(self, spans):
+        time.sleep(self.delay_s)
+        return self.exporter.export(spans)
+
+    def shutdown(self):
+        self.exporter.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def child(args):
+    """One mode, in this process: configure telemetry before main does, then run the agent benchmark."""
+    from benchmarks import fakes
+    from benchmarks.offline import bench_agent
+
+    delay = args.latency_ms / 1000
+    backend = fakes.install(latency=fakes.FakeLatency(secret=delay, token=delay, embedding=delay, search=delay,
+                                                      agent_call=delay, model_step=delay))
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from scripts import telemetry
+
+    spans = InMemorySpanExporter()
+    handle = telemetry.configure(span_exporter=DelayedExporter(spans, args.export_ms / 1000))
+    cwd = os.getcwd()
+    os.chdir(backend.workdir)
+    try:
+        cases = bench_agent(args.iterations, args.alloc_iterations)
+    finally:
+        os.chdir(cwd)
+        backend.close()
+
+    result = {"cases": cases, "telemetry": None}
+    if handle is not None:
+        started = time.perf_counter()
+        handle.force_flush()
+        stats = handle.stats()
+        ended = max(stats.get("spans_ended", 0), 1)
+        result["telemetry"] = {
+            **stats,
+            "flush_seconds": time.perf_counter() - started,
+            "spans_in_exporter": len(spans.get_finished_spans()),
+            # What span processing adds to a request, per span
+            "on_end_us_per_span": stats.get("on_end_seconds", 0) / ended * 1e6,
+            "on_start_us_per_span": stats.get("on_start_seconds", 0) / ended * 1e6,
+        }
+    with open(args.child_output, "w") as f:
+        json.dump(result, f)
+
+
+def run_mode(mode: str, args) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output = f.name
+    env = {
+        **os.environ,
+        "TELEMETRY_ENABLED": "1",
+        "TELEMETRY_EXPORTER": "memory",
+        "TELEMETRY_SLOW_TRACE_SECONDS": str(args.slow_ms / 1000),
+        "TELEMETRY_SCHEDULE_DELAY_SECONDS": str(args.schedule_delay_ms / 1000),
+        **MODES[mode],
+    }
+    command = [sys.executable, "-m", "benchmarks.telemetry_overhead", "--child-output", output,
+               "--iterations", str(args.iterations), "--alloc-iterations", str(args.alloc_iterations),
+               "--latency-ms", str(args.latency_ms), "--export-ms", str(args.export_ms)]
+    try:
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+        with open(output) as f:
+            return json.load(f)
+    finally:
+        os.remove(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--alloc-iterations", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency of each fake backend call")
+    parser.add_argument("--export-ms", type=float, default=100.0, help="simulated duration of one export call")
+    parser.add_argument("--slow-ms", type=float, default=10000.0, help="tail sampling's slow-trace threshold")
+    parser.add_argument("--schedule-delay-ms", type=float, default=500.0)
+    parser.add_argument("--output", help="report path (default: benchmarks/results/)")
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_output:
+        child(args)
+        return
+
+    modes = args.modes.split(",")
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown modes {', '.join(unknown)}; choose from {', '.join(MODES)}")
+
+    results = {}
+    for mode in modes:
+        print(f"{mode}:")
+        results[mode] = run_mode(mode, args)
+        baseline = results.get("off")
+        for case, stats in results[mode]["cases"].items():
+            latency = stats["latency_s"]
+            delta = ""
+            if baseline and mode != "off":
+                base = baseline["cases"][case]["latency_s"]
+                delta = (f"  (p50 {(latency['p50'] - base['p50']) * 1000:+6.2f} ms, "
+                         f"p99 {(latency['p99'] - base['p99']) * 1000:+6.2f} ms vs off)")
+            print(f"  {case:<36} p50 {latency['p50'] * 1000:7.2f} ms  p99 {latency['p99'] * 1000:7.2f} ms{delta}")
+        stats = results[mode]["telemetry"]
+        if stats:
+            print(f"  spans ended {stats.get('spans_ended', 0):.0f}, exported {stats.get('spans_exported', 0):.0f}, "
+                  f"dropped {stats.get('spans_dropped_queue_full', 0) + stats.get('spans_dropped_evicted', 0):.0f}; "
+                  f"traces kept slow/failed {stats.get('traces_kept_slow', 0):.0f}/"
+                  f"{stats.get('traces_kept_failed', 0):.0f}, dropped {stats.get('traces_dropped', 0):.0f}; "
+                  f"request path {stats['on_start_us_per_span'] + stats['on_end_us_per_span']:.1f} us/span, "
+                  f"export {stats.get('export_seconds', 0):.2f} s in {stats.get('export_batches', 0):.0f} batches")
+
+    write_report("telemetry_overhead", {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "child_output")},
+        "modes": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
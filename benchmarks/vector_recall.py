@@ -0,0 +1,320 @@
+"""
+Vector compression recall benchmark.
+
+Compares the VectorIndexOptions that setup_index accepts (scalar/binary
+quantization, rescoring with oversampling, truncated dimensions, HNSW m /
+efConstruction / efSearch) against exact full-precision search over the
+guideline chunks, entirely with local vector math, and reports recall@k next
+to the memory and disk each setting needs per vector:
+
+    python -m benchmarks.vector_recall
+    python -m benchmarks.vector_recall --compression scalar,binary --oversampling off,2,4,10 --dimensions full,768
+    python -m benchmarks.vector_recall --live --embeddings benchmarks/results/embeddings.npz
+
+Quantization mirrors the service: int8 per-dimension scalar quantization
+scored against the full-precision query, or 1 bit per dimension with the query
+binarized too; rescoring re-ranks oversampling x k candidates with the original
+vectors. The graph is layer 0 of an HNSW index (where nearly all of the search
+happens at this corpus size) built on the quantized vectors; --flat scores
+every vector instead, isolating the quantization loss.
+
+Embeddings default to a local LSA model of the corpus (TF-IDF, truncated SVD,
+randomly rotated up to 1536 dimensions) so the tool runs offline; its vectors
+have real neighbourhood structure but no Matryoshka ordering, so --live
+(Azure OpenAI, cached with --embeddings) is what to trust for truncation.
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from benchmarks.fakes import load_chunks
+from benchmarks.report import write_report
+from scripts.vector_compression import BINARY, NONE, SCALAR, VectorIndexOptions
+
+TOKEN = re.compile(r"[a-z][a-z0-9\-]+")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+# ---------- Corpus & embeddings ----------
+
+
+def sample_queries(chunks: List[Tuple[str, str]], count: int, seed: int) -> List[str]:
+    """A short window of words from randomly chosen chunks, standing in for user questions."""
+    rng = random.Random(seed)
+    candidates = [text for _, text in chunks if len(text.split()) >= 20]
+    queries = []
+    for text in rng.sample(candidates, min(count, len(candidates))):
+        words = text.split()
+        start = rng.randrange(0, len(words) - 12)
+        queries.append(" ".join(words[start:start + 12]))
+    return queries
+
+
+def lsa_embeddings(texts: List[str], queries: List[str], dimensions: int = 1536, rank: int = 256,
+                   seed: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """TF-IDF -> truncated SVD -> random rotation into `dimensions`; queries are folded into the same space."""
+    documents = [Counter(TOKEN.findall(text.lower())) for text in texts]
+    frequency = Counter(term for doc in documents for term in doc)
+    vocabulary = {term: i for i, term in enumerate(t for t, df in frequency.items() if df >= 2)}
+    idf = np.zeros(len(vocabulary), dtype=np.float32)
+    for term, i in vocabulary.items():
+        idf[i] = math.log((1 + len(documents)) / (1 + frequency[term])) + 1
+
+    def tfidf(bags):
+        matrix = np.zeros((len(bags), len(vocabulary)), dtype=np.float32)
+        for row, bag in enumerate(bags):
+            for term, count in bag.items():
+                if term in vocabulary:
+                    matrix[row, vocabulary[term]] = 1 + math.log(count)
+        return normalize(matrix * idf)
+
+    corpus = tfidf(documents)
+    _, _, vt = np.linalg.svd(corpus, full_matrices=False)
+    basis = vt[:rank].T
+    rotation, _ = np.linalg.qr(np.random.default_rng(seed).standard_normal((dimensions, basis.shape[1])))
+    lift = lambda matrix: normalize((matrix @ basis) @ rotation.T.astype(np.float32))
+    return lift(corpus), lift(tfidf([Counter(TOKEN.findall(q.lower())) for q in queries]))
+
+
+def live_embeddings(texts: List[str], queries: List[str], batch: int = 16) -> Tuple[np.ndarray, np.ndarray]:
+    """Embed with the Azure OpenAI deployment the search tool uses (Key Vault secrets, shared credential)."""
+    from openai import AzureOpenAI
+    from scripts import tools
+
+    secrets = tools.get_secrets(*tools.SEARCH_SECRETS)
+    client = AzureOpenAI(
+        azure_ad_token_provider=lambda: tools.credential.get_token("https://cognitiveservices.azure.com/.default").token,
+        azure_endpoint=secrets["azure-openai-endpoint"],
+        api_version="2024-04-01-preview",
+    )
+
+    def embed(items):
+        vectors = []
+        for start in range(0, len(items), batch):
+            response = client.embeddings.create(model=secrets["azure-openai-embedding-deployment"],
+                                                input=items[start:start + batch])
+            vectors.extend(d.embedding for d in response.data)
+        return normalize(np.array(vectors, dtype=np.float32))
+
+    return embed(texts), embed(queries)
+
+
+# ---------- Simulated index ----------
+
+
+class EncodedVectors:
+    """The corpus as the service holds it in the graph under `options`, and how a query scores against it."""
+
+    def __init__(self, vectors: np.ndarray, options: VectorIndexOptions):
+        self.options = options
+        self.dimensions = options.truncation_dimension or vectors.shape[1]
+        work = normalize(vectors[:, :self.dimensions])
+        if options.compression == SCALAR:
+            low, high = work.min(axis=0), work.max(axis=0)
+            scale = np.maximum(high - low, 1e-12) / 255
+            codes = np.round((work - low) / scale)  # 0..255, i.e. int8 shifted by 128
+            self.vectors = (codes * scale + low).astype(np.float32)
+        elif options.compression == BINARY:
+            self.vectors = np.where(work > 0, 1.0, -1.0).astype(np.float32)
+        else:
+            self.vectors = work
+
+    def encode_query(self, query: np.ndarray) -> np.ndarray:
+        query = normalize(query[:self.dimensions])
+        if self.options.compression == BINARY:
+            return np.where(query > 0, 1.0, -1.0).astype(np.float32)
+        return query
+
+    def top(self, query: np.ndarray, count: int) -> List[int]:
+        scores = self.vectors @ query
+        return list(np.argsort(-scores)[:count])
+
+
+class HnswLayer:
+    """Layer 0 of an HNSW graph over the encoded vectors: 2*m links per node, beam search of width ef."""
+
+    def __init__(self, encoded: EncodedVectors, m: int, ef_construction: int, seed: int = 1):
+        self.vectors = encoded.vectors
+        self.max_links = 2 * m
+        self.links: List[List[int]] = [[] for _ in range(len(self.vectors))]
+        order = np.random.default_rng(seed).permutation(len(self.vectors))
+        self.entry = int(order[0])
+        for node in order[1:]:
+            node = int(node)
+            found, _ = self.search(self.vectors[node], ef_construction)
+            for neighbor, _ in found[:m]:
+                self.links[node].append(neighbor)
+                self.links[neighbor].append(node)
+                if len(self.links[neighbor]) > self.max_links:
+                    self._prune(neighbor)
+
+    def _prune(self, node: int):
+        neighbors = self.links[node]
+        scores = self.vectors[neighbors] @ self.vectors[node]
+        self.links[node] = [neighbors[i] for i in np.argsort(-scores)[:self.max_links]]
+
+    def search(self, query: np.ndarray, ef: int) -> Tuple[List[Tuple[int, float]], int]:
+        """Best `ef` (node, score) pairs, best first, and how many vectors were scored on the way."""
+        entry_score = float(self.vectors[self.entry] @ query)
+        visited = {self.entry}
+        frontier = [(-entry_score, self.entry)]
+        best = [(entry_score, self.entry)]
+        while frontier:
+            negative, node = heapq.heappop(frontier)
+            if len(best) >= ef and -negative < best[0][0]:
+                break
+            fresh = [n for n in self.links[node] if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for neighbor, score in zip(fresh, (self.vectors[fresh] @ query).tolist()):
+                if len(best) < ef or score > best[0][0]:
+                    heapq.heappush(frontier, (-score, neighbor))
+                    heapq.heappush(best, (score, neighbor))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+        return [(node, score) for score, node in sorted(best, reverse=True)], len(visited)
+
+
+def run_variant(originals: np.ndarray, queries: np.ndarray, thresholds: np.ndarray, options: VectorIndexOptions,
+                k: int, encoded: EncodedVectors, graph: HnswLayer = None) -> Dict[str, float]:
+    """
+    Recall@k against exact search. A result counts when its exact score reaches the
+    k-th best exact score for the query, so ties between duplicate chunks aren't misses.
+    """
+    rescoring = options.compression != NONE and options.rescore
+    candidates = math.ceil(k * (options.oversampling or 1)) if rescoring else k
+    recalls, scored, elapsed = [], [], []
+    for query, threshold in zip(queries, thresholds):
+        start = time.perf_counter()
+        encoded_query = encoded.encode_query(query)
+        if graph is not None:
+            found, visited = graph.search(encoded_query, max(options.hnsw_ef_search, candidates))
+            ids = [node for node, _ in found[:candidates]]
+        else:
+            ids, visited = encoded.top(encoded_query, candidates), len(encoded.vectors)
+        if rescoring:
+            rescored = originals[ids] @ query
+            ids = [ids[i] for i in np.argsort(-rescored)]
+        elapsed.append(time.perf_counter() - start)
+        recalls.append(float(np.sum(originals[ids[:k]] @ query >= threshold - 1e-6)) / k)
+        scored.append(visited + (len(ids) if rescoring else 0))
+    return {
+        "recall": float(np.mean(recalls)),
+        "recall_min": float(np.min(recalls)),
+        "vectors_scored": float(np.mean(scored)),
+        "sim_ms_p50": float(np.median(elapsed) * 1000),
+    }
+
+
+# ---------- CLI ----------
+
+
+def variants(args) -> List[VectorIndexOptions]:
+    result = []
+    for compression in args.compression.split(","):
+        for dimensions in args.dimensions.split(","):
+            truncation = None if dimensions == "full" else int(dimensions)
+            if compression == NONE and truncation:
+                continue
+            for oversampling in (args.oversampling.split(",") if compression != NONE else ["off"]):
+                for ef_search in (int(e) for e in args.ef_search.split(",")):
+                    result.append(VectorIndexOptions(
+                        compression=compression,
+                        rescore=oversampling != "off",
+                        oversampling=None if oversampling == "off" else float(oversampling),
+                        truncation_dimension=truncation,
+                        stored=not args.not_stored,
+                        hnsw_m=args.hnsw_m,
+                        hnsw_ef_construction=args.ef_construction,
+                        hnsw_ef_search=ef_search,
+                    ))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=10, help="results per query (the search tool asks for 10)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--compression", default="none,scalar,binary")
+    parser.add_argument("--oversampling", default="off,2,4,10", help="'off' disables rescoring")
+    parser.add_argument("--dimensions", default="full,768", help="'full' or truncation dimensions")
+    parser.add_argument("--hnsw-m", type=int, default=4)
+    parser.add_argument("--ef-construction", type=int, default=400)
+    parser.add_argument("--ef-search", default="100,500")
+    parser.add_argument("--flat", action="store_true", help="score every vector instead of searching a graph")
+    parser.add_argument("--not-stored", action="store_true", help="size the index without retrievable vectors")
+    parser.add_argument("--docs", type=int, default=0, help="project memory/disk for this many chunks")
+    parser.add_argument("--live", action="store_true", help="embed with Azure OpenAI instead of local LSA")
+    parser.add_argument("--embeddings", help=".npz cache of the embeddings (written on first --live run)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="report path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    chunks = load_chunks()
+    texts = [text for _, text in chunks]
+    queries = sample_queries(chunks, args.queries, args.seed)
+    if args.embeddings and os.path.exists(args.embeddings):
+        cached = np.load(args.embeddings)
+        corpus, query_vectors, source = cached["corpus"], cached["queries"][:len(queries)], str(cached["source"])
+    else:
+        source = "azure_openai" if args.live else "lsa"
+        corpus, query_vectors = (live_embeddings if args.live else lsa_embeddings)(texts, queries)
+        if args.embeddings:
+            np.savez_compressed(args.embeddings, corpus=corpus, queries=query_vectors, source=source)
+    # Headings and other chunks with nothing to embed (all-zero LSA vectors) would only add noise
+    corpus = corpus[np.linalg.norm(corpus, axis=1) > 0.5]
+    query_vectors = query_vectors[np.linalg.norm(query_vectors, axis=1) > 0.5]
+    dimensions = corpus.shape[1]
+    thresholds = np.sort(query_vectors @ corpus.T, axis=1)[:, -args.k]
+    docs = args.docs or len(corpus)
+    print(f"{len(corpus)} chunks, {len(query_vectors)} queries, {dimensions}d {source} embeddings, "
+          f"recall@{args.k} vs exact full precision, {'flat' if args.flat else 'HNSW layer 0'}")
+
+    encodings, graphs, rows = {}, {}, []
+    for options in variants(args):
+        encoding_key = (options.compression, options.truncation_dimension)
+        if encoding_key not in encodings:
+            encodings[encoding_key] = EncodedVectors(corpus, options)
+        graph = None
+        if not args.flat:
+            if encoding_key not in graphs:
+                graphs[encoding_key] = HnswLayer(encodings[encoding_key], options.hnsw_m,
+                                                 options.hnsw_ef_construction, args.seed)
+            graph = graphs[encoding_key]
+        stats = run_variant(corpus, query_vectors, thresholds, options, args.k, encodings[encoding_key], graph)
+        size = options.bytes_per_vector(dimensions)
+        row = {
+            "variant": options.describe(),
+            "options": vars(options),
+            **stats,
+            "memory_bytes_per_vector": size["memory"],
+            "disk_bytes_per_vector": size["disk"],
+            "memory_mb": size["memory"] * docs / 2 ** 20,
+            "disk_mb": size["disk"] * docs / 2 ** 20,
+        }
+        rows.append(row)
+        print(f"  {row['variant']:<58} recall {row['recall']:.3f} (min {row['recall_min']:.2f})  "
+              f"scored {row['vectors_scored']:7.1f}  memory {size['memory']:>5} B  disk {size['disk']:>5} B")
+
+    write_report("vector_recall", {
+        "config": {**{k: v for k, v in vars(args).items() if k != "output"}, "embedding_source": source,
+                   "chunks": len(corpus), "dimensions": dimensions},
+        "variants": rows,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Worker scaling benchmark.
+
+Starts serve.py with the offline app (benchmarks/offline_app.py) at each
+worker count, drives it over Chainlit's socket.io endpoint with the load
+generator, and reports throughput and latency per worker count:
+
+    python -m benchmarks.workers --workers 1,2,4 --users 32
+    python -m benchmarks.workers --workers 1,2 --latency-ms 20 --duration 20 --arrival-rate 10
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+from benchmarks.load import ChainlitUrlTarget, print_summary, run_phase
+from benchmarks.report import write_report
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, workdir: str, rows: int, latency_ms: float) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(REPO_ROOT),
+        "OFFLINE_ROWS": str(rows),
+        "OFFLINE_LATENCY_MS": str(latency_ms),
+        "SESSION_STORE_URL": f"sqlite:///{os.path.join(workdir, 'sessions.db')}",
+    }
+    return subprocess.Popen(
+        [sys.executable, str(REPO_ROOT / "serve.py"), str(REPO_ROOT / "benchmarks" / "offline_app.py"),
+         "--workers", str(workers), "--port", str(port)],
+        cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+
+
+def wait_ready(server: subprocess.Popen, workers: int, port: int, timeout: float = 120.0):
+    """Wait until every worker has logged that it is serving and the port answers HTTP."""
+    deadline = time.monotonic() + timeout
+    ready = 0
+    while ready < workers:
+        line = server.stdout.readline()
+        if not line:
+            raise RuntimeError(f"serve.py exited with {server.poll()} before {workers} workers were ready")
+        if " serving " in line:
+            ready += 1
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"only {ready}/{workers} workers ready after {timeout:.0f}s")
+    while True:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5).read()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+    # Keep draining output so a chatty worker can't block on a full pipe
+    threading.Thread(target=server.stdout.read, daemon=True).start()
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--users", type=int, default=32, help="concurrent users in the closed model")
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="new sessions per second (open model)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of arrivals with --arrival-rate")
+    parser.add_argument("--follow-ups", type=int, default=2)
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--rows", type=int, default=10000, help="patients seeded into each worker's database")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated backend latency")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="report path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    steps = []
+    for workers in (int(w) for w in args.workers.split(",")):
+        workdir = tempfile.mkdtemp(prefix="workers-bench-")
+        port = free_port()
+        server = start_server(workers, port, workdir, args.rows, args.latency_ms)
+        try:
+            wait_ready(server, workers, port)
+            target = ChainlitUrlTarget(f"http://127.0.0.1:{port}", args.timeout)
+            phase = asyncio.run(run_phase(target, args.users, args.arrival_rate, args.duration,
+                                          args.follow_ups, args.think_time, args.seed))
+        finally:
+            stop_server(server)
+            shutil.rmtree(workdir, ignore_errors=True)
+        summary = {"workers": workers, **phase.summary()}
+        print_summary(f"{workers} workers", summary)
+        steps.append(summary)
+
+    base = steps[0]["throughput_msg_s"] if steps else 0
+    for step in steps:
+        step["speedup"] = step["throughput_msg_s"] / base if base else 0.0
+    print("Speedup: " + ", ".join(f"{s['workers']}w x{s['speedup']:.2f}" for s in steps))
+
+    write_report("workers", {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "steps": steps,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
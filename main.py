@@ -1,52 +1,112 @@
+import logging
 import os
+import threading
+import time
+from scripts.startup import profiler, prefetch_secrets  # first, so STARTUP_PROFILE can time the rest
 import chainlit as cl
 from chainlit import Starter
-from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 from azure.ai.projects import AIProjectClient
-from azure.ai.agents.models import ToolSet, FunctionTool
-from scripts.tools import user_functions
+from azure.ai.agents.models import ToolSet
+from scripts.token_broker import APP_EXCLUSIONS, get_credential
+from scripts.tools import user_functions, prefetch_tool_secrets
+from scripts.token_footprint import CompactFunctionTool
+from scripts.thread_pool import AgentThreadPool
+from scripts.session_store import open_store
+from scripts.admission import AdmissionController, AdmissionRejected
+from scripts.deadline import DEADLINE, DISCONNECT, RESET, STOP, Cancelled, Deadline, record_cancelled, scope
+from scripts import query_router, telemetry, tier_router
+from scripts.run_timing import collect_run_timing, format_run_timing, record_in_background, record_run_timing
+from opentelemetry import trace
 
 
-uami_client_id = os.environ["AZURE_CLIENT_ID"]  # you exported this in pipeline
-
-# Force DefaultAzureCredential to use UAMI
-credential = DefaultAzureCredential(
-    managed_identity_client_id=uami_client_id,
-    exclude_cli_credential=True,                # <-- important: skip Azure CLI login
-    exclude_powershell_credential=True,
-    exclude_developer_cli_credential=True
-)
+# One credential for the whole process, shared with the tools. Set AZURE_CREDENTIAL_TYPE=managed_identity
+# in the container to go straight to the UAMI named by AZURE_CLIENT_ID instead of probing the chain.
+with profiler.step("credential"):
+    credential = get_credential(**APP_EXCLUSIONS)
 
 
 # Key Vault clients (fetch once, reuse)
 kv = SecretClient(vault_url=os.environ["KEYVAULT_URL"], credential=credential)
 
-# Pull secrets once and cache in memory
-AIPROJECT_CONN_STR = kv.get_secret("ai-project-conn-string").value
-AGENT_ID = kv.get_secret("agent-id").value
+# Pull secrets once and cache in memory (fetched concurrently)
+with profiler.step("key vault secrets"):
+    secrets = prefetch_secrets(kv, ["ai-project-conn-string", "agent-id"], optional=["agent-id-fast"])
+AIPROJECT_CONN_STR = secrets["ai-project-conn-string"]
+AGENT_ID = secrets["agent-id"]
+# Smaller, faster agent for simple messages (scripts/tier_router.py); without it every message goes to AGENT_ID
+FAST_AGENT_ID = secrets["agent-id-fast"]
+AGENT_IDS = {tier_router.FULL: AGENT_ID, tier_router.FAST: FAST_AGENT_ID}
 
 
 # AI Project client (reuse across requests)
-project_client = AIProjectClient.from_connection_string(
-    AIPROJECT_CONN_STR, credential=credential
-)
+with profiler.step("project client"):
+    project_client = AIProjectClient.from_connection_string(
+        AIPROJECT_CONN_STR, credential=credential
+    )
 
 agent_client = project_client.agents
 
-# Tools
-functions = FunctionTool(user_functions)
-toolset = ToolSet()
-toolset.add(functions)
+# Spans and metrics exported in batches off the request path, head plus tail sampled (scripts/telemetry.py).
+# The Application Insights connection string comes from the project unless APPLICATIONINSIGHTS_CONNECTION_STRING
+# is set; fetching it happens on a background thread.
+with profiler.step("telemetry"):
+    telemetry.start(lambda: project_client.telemetry.get_connection_string())
+
+# Tools; their schemas go with every run, trimmed as AGENT_TOOL_SCHEMA says (scripts/token_footprint.py)
+with profiler.step("toolset"):
+    functions = CompactFunctionTool(user_functions)
+    toolset = ToolSet()
+    toolset.add(functions)
+
+# Pre-created threads so a session's first message doesn't wait on create_thread()
+thread_pool = AgentThreadPool(
+    agent_client,
+    target_size=int(os.getenv("AGENT_THREAD_POOL_SIZE", "4")),
+    max_idle_seconds=float(os.getenv("AGENT_THREAD_POOL_MAX_IDLE_SECONDS", "3600")),
+    refill_interval=float(os.getenv("AGENT_THREAD_POOL_REFILL_SECONDS", "5")),
+)
+thread_pool.start()
+
+# Session -> agent thread mapping shared by every worker process (SESSION_STORE_URL), so any worker
+# can serve any session and threads survive restarts
+with profiler.step("session store"):
+    session_store = open_store()
+
+# Tool secrets are warmed off the startup path
+threading.Thread(target=prefetch_tool_secrets, name="tool-secrets-prefetch", daemon=True).start()
+
+# Run step timing: recorded off the response path, or shown inline with AGENT_DEBUG_PANEL=1
+RUN_TIMING_ENABLED = os.getenv("AGENT_RUN_TIMING", "1") == "1"
+DEBUG_PANEL = os.getenv("AGENT_DEBUG_PANEL") == "1"
+
+# Admission control: cap agent runs in flight, one at a time per user, bounded wait queue
+admission = AdmissionController(
+    max_in_flight=int(os.getenv("AGENT_MAX_IN_FLIGHT", "8")),
+    max_queue=int(os.getenv("AGENT_MAX_QUEUE", "32")),
+    per_user_limit=int(os.getenv("AGENT_MAX_RUNS_PER_USER", "1")),
+)
+
+# End-to-end budget for one agent turn, the run and every tool call in it. Disconnecting, Stop and
+# Clear History end it early; either way the run is cancelled and in-flight backend calls are aborted.
+REQUEST_BUDGET_SECONDS = float(os.getenv("AGENT_REQUEST_BUDGET_SECONDS", "120"))
+# Run status polling starts at this interval and backs off to the SDK's 1s
+RUN_POLL_SECONDS = float(os.getenv("AGENT_RUN_POLL_SECONDS", "0.25"))
+ACTIVE_RUN_STATUSES = ("queued", "in_progress", "requires_action")
+
+tracer = trace.get_tracer(__name__)
+logger = logging.getLogger(__name__)
+
+profiler.report()
 
 
 # ---------- Helpers ----------
 
-def get_or_create_user_thread_id(user_id: str) -> str:
+async def get_or_create_user_thread_id(user_id: str) -> str:
     
     """
-    Return an existing thread_id for this user if present in session,
-    otherwise create a new thread and store it in the session.
+    Return an existing thread_id for this user if present in session or in the shared
+    session store, otherwise take a pre-created thread from the pool and store it in both.
     """
     
     # Chainlit user-scoped memory
@@ -54,38 +114,173 @@ def get_or_create_user_thread_id(user_id: str) -> str:
     if thread_id:
         return thread_id
 
-    thread = agent_client.create_thread()
-    cl.user_session.set("thread_id", thread.id)
-    return thread.id
+    # Another worker, or this one before a restart, may already have given this user a thread
+    key = session_key()
+    state = await cl.make_async(session_store.get)(key) or {}
+    thread_id = state.get("thread_id")
+    if not thread_id:
+        # A pool miss falls back to create_thread(), so keep it off the event loop
+        thread_id = await cl.make_async(thread_pool.acquire)()
+        await cl.make_async(session_store.set)(key, {**state, "thread_id": thread_id})
+    cl.user_session.set("thread_id", thread_id)
+    return thread_id
 
 
-def reset_user_thread():
+async def reset_user_thread():
     
     """Forget the stored thread_id so a new one is created next message."""
     cl.user_session.set("thread_id", None)
+    await cl.make_async(session_store.delete)(session_key())
 
 
-# ---------- Core run ----------
+def add_to_thread(thread_id: str, question: str, answer: str):
+    
+    """Record a routed question and its answer in the agent thread so follow-ups have the context."""
+    agent_client.create_message(thread_id=thread_id, role="user", content=question)
+    agent_client.create_message(thread_id=thread_id, role="assistant", content=answer)
 
 
-async def run_multi_step_agent(user_id: str, user_query: str):
+def session_key() -> str:
     
-    thread_id = get_or_create_user_thread_id(user_id)
+    """Who this session belongs to: the logged-in user if there is one, otherwise the Chainlit session."""
+    user = cl.user_session.get("user")
+    return user.identifier if user else cl.user_session.get("id")
 
-    # Add the user message to the (user-specific) thread
-    agent_client.create_message(thread_id=thread_id, role="user", content=user_query)
 
-    # Process a run against your existing Agent (ID from Key Vault), using your toolset
-    run = agent_client.create_and_process_run(
-        thread_id=thread_id, assistant_id=AGENT_ID, toolset=toolset
-    )
+def cancel_request(reason: str):
+    
+    """Cancel this session's agent turn, if one is in flight."""
+    request = cl.user_session.get("request")
+    if request is not None:
+        request.cancel(reason)
+
+
+# ---------- Core run ----------
+
+
+def run_agent(thread_id: str, request: Deadline, agent_id: str = AGENT_ID, additional_instructions: str = None):
+    
+    """
+    create_and_process_run under the request's deadline: polls the run, executes tool calls
+    and submits their outputs, and cancels the run on the service if the request ends first.
+    """
+    start = time.perf_counter()
+    run = agent_client.create_run(thread_id=thread_id, assistant_id=agent_id, tools=toolset.definitions,
+                                  additional_instructions=additional_instructions)
+    interval = RUN_POLL_SECONDS
+    try:
+        while run.status in ACTIVE_RUN_STATUSES:
+            request.sleep(interval)
+            interval = min(max(interval * 2, 0.05), 1.0)
+            run = agent_client.get_run(thread_id=thread_id, run_id=run.id)
+            if run.status != "requires_action":
+                continue
+            tool_calls = run.required_action.submit_tool_outputs.tool_calls
+            if not tool_calls:
+                logger.warning("Run %s requires action but has no tool calls; cancelling it", run.id)
+                run = agent_client.cancel_run(thread_id=thread_id, run_id=run.id)
+                break
+            # Tools see the request through the context and abort their backend calls when it ends
+            tool_outputs = toolset.execute_tool_calls(tool_calls)
+            request.check()
+            agent_client.submit_tool_outputs_to_run(thread_id=thread_id, run_id=run.id, tool_outputs=tool_outputs)
+            interval = RUN_POLL_SECONDS
+    except Cancelled as e:
+        record_cancelled("run", "agent_run", e.reason, start)
+        try:
+            agent_client.cancel_run(thread_id=thread_id, run_id=run.id)
+        except Exception:
+            logger.warning("Cancelling run %s failed", run.id, exc_info=True)
+        raise
+    return run
+
+
+def run_tier(thread_id: str, request: Deadline, tier: str, additional_instructions: str = None):
+    
+    """One run of `tier`'s agent: the run, its reply (None if it has none) and the client-side seconds."""
+    start = time.perf_counter()
+    try:
+        run = run_agent(thread_id, request, AGENT_IDS[tier], additional_instructions)
+    except Cancelled:
+        tier_router.record_run(tier, None, time.perf_counter() - start, "cancelled")
+        raise
+    client_s = time.perf_counter() - start
 
     # Fetch the new messages for this run only (keeps the list small)
     messages = agent_client.list_messages(thread_id=thread_id, run_id=run.id)
     last_msg = messages.get_last_text_message_by_role("assistant")
+    reply = last_msg.text.value if last_msg else None
+    return run, reply, client_s
 
-    reply = last_msg.text.value if last_msg else "I couldn't generate a response."
-    await cl.Message(content=reply, author="Agent").send()
+
+def process_run(thread_id: str, user_query: str, request: Deadline, tier: str = tier_router.FULL):
+    
+    """Blocking half of a turn: post the message, run the agent and fetch its reply. Runs on a worker thread."""
+
+    with scope(request):
+        # Add the user message to the (user-specific) thread
+        agent_client.create_message(thread_id=thread_id, role="user", content=user_query)
+
+        # Process a run against your existing Agent (ID from Key Vault), using your toolset
+        run, reply, client_s = run_tier(thread_id, request, tier)
+        escalation = tier_router.escalation_reason(run, reply) if tier == tier_router.FAST else None
+        tier_router.record_run(tier, run, client_s, "escalated" if escalation else "answered")
+        if escalation:
+            # Same thread and deadline: the full agent sees the question and whatever the fast one looked up
+            tier_router.record_escalation(escalation)
+            if RUN_TIMING_ENABLED:
+                record_in_background(agent_client, run, client_s)
+            tier = tier_router.FULL
+            run, reply, client_s = run_tier(thread_id, request, tier, tier_router.ESCALATED_INSTRUCTIONS)
+            tier_router.record_run(tier, run, client_s, "answered")
+
+        if run.status != "completed":
+            telemetry.mark_failed(f"agent run {getattr(run.status, 'value', run.status)}")
+
+    reply = reply or "I couldn't generate a response."
+
+    timing = None
+    if DEBUG_PANEL:
+        timing = collect_run_timing(agent_client, run, client_s)
+        record_run_timing(timing)
+    elif RUN_TIMING_ENABLED:
+        record_in_background(agent_client, run, client_s)
+    return reply, timing
+
+
+@tracer.start_as_current_span("run_multi_step_agent")  # type: ignore
+async def run_multi_step_agent(user_id: str, user_query: str):
+    
+    thread_id = await get_or_create_user_thread_id(user_id)
+
+    # Thanks, clarifications and short single questions go to the fast agent first
+    decision = tier_router.choose_tier(user_query, fast_available=FAST_AGENT_ID is not None)
+
+    request = Deadline(REQUEST_BUDGET_SECONDS)
+    cl.user_session.set("request", request)
+    try:
+        # The SDK calls block, so run them on a worker thread and keep serving other sessions meanwhile
+        reply, timing = await cl.make_async(process_run)(thread_id, user_query, request, decision.tier)
+    except Cancelled as e:
+        if e.reason == DEADLINE:
+            telemetry.mark_failed("request deadline exceeded")
+            await cl.Message(
+                content=f"⏱️ This question took longer than {REQUEST_BUDGET_SECONDS:.0f} seconds, so I stopped "
+                        "working on it. Try asking for less at once.",
+                author="Agent",
+            ).send()
+        return  # otherwise the user left, stopped the task or cleared the history
+    finally:
+        request.close()
+        if cl.user_session.get("request") is request:
+            cl.user_session.set("request", None)
+
+    elements = []
+    if timing is not None:
+        elements.append(cl.Text(name="Run timing", content=format_run_timing(timing), display="side"))
+        reply += "\n\nRun timing"
+
+    await cl.Message(content=reply, author="Agent", elements=elements).send()
 
 
 # ---------- UI bits ----------
@@ -93,13 +288,24 @@ async def run_multi_step_agent(user_id: str, user_query: str):
 
 @cl.action_callback("clear_history")
 async def on_clear_history(action):
-    reset_user_thread()  # make the next user message start a fresh thread
+    cancel_request(RESET)  # stop working on a question from the history being cleared
+    await reset_user_thread()  # make the next user message start a fresh thread
     await cl.Message(
         content="✅ History cleared and thread reset for this session."
     ).send()
     await action.remove()
 
 
+@cl.on_stop
+async def on_stop():
+    cancel_request(STOP)
+
+
+@cl.on_chat_end
+async def on_chat_end():
+    cancel_request(DISCONNECT)
+
+
 @cl.set_starters
 async def set_starters():
     return [
@@ -130,4 +336,36 @@ async def set_starters():
 @cl.on_message
 async def main(message: cl.Message):
     user_id = message.author
-    await run_multi_step_agent(user_id=user_id, user_query=message.content)
+    queued = None
+
+    async def show_position(position: int):
+        nonlocal queued
+        content = f"⏳ The assistant is busy. You're number {position} in line; your question will start shortly."
+        if queued is None:
+            queued = cl.Message(content=content, author="Agent")
+            await queued.send()
+        else:
+            queued.content = content
+            await queued.update()
+
+    try:
+        async with admission.admit(session_key(), on_queued=show_position):
+            if queued is not None:
+                await queued.remove()
+
+            # Well-known count/list questions are answered with one parameterized query, no LLM run
+            start = time.perf_counter()
+            answer = await cl.make_async(query_router.try_answer)(message.content)
+            if answer is not None:
+                await cl.Message(content=answer, author="Agent").send()
+                query_router.record_turn("routed", start)
+                thread_id = await get_or_create_user_thread_id(user_id)
+                await cl.make_async(add_to_thread)(thread_id, message.content, answer)
+            else:
+                await run_multi_step_agent(user_id=user_id, user_query=message.content)
+                query_router.record_turn("agent", start)
+    except AdmissionRejected:
+        await cl.Message(
+            content="🚦 The assistant is handling too many requests right now. Please try again in a minute.",
+            author="Agent",
+        ).send()
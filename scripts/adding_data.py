@@ -1,7 +1,9 @@
 from faker import Faker
 
-from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
+from token_broker import get_credential
+from patient_indexes import create_indexes
+from patient_schema import MEDICAL_CONDITIONS, MEDICATIONS
 from dotenv import load_dotenv
 import os
 import pyodbc
@@ -10,12 +12,8 @@ import random
 
 load_dotenv()
 
-credential = DefaultAzureCredential(
-    exclude_environment_credential=False,
-    exclude_managed_identity_credential=False,
-    exclude_shared_token_cache_credential=True,  # skip local cache
-    exclude_visual_studio_code_credential=True,
-)
+# Process-wide credential with cached, proactively refreshed tokens (AZURE_CREDENTIAL_TYPE)
+credential = get_credential()
 
 key_vault = SecretClient(vault_url=os.environ["KEYVAULT_URL"], credential=credential)
 
@@ -98,6 +96,10 @@ try:
     )
     cnxn.commit()
 
+    # Indexes the typed patient tools seek on; patient_indexes.py adds them to an existing database
+    create_indexes(cursor)
+    cnxn.commit()
+
     # Generate and insert fake data
     for _ in range(num_records):
         first_name = fake.first_name()
@@ -111,32 +113,10 @@ try:
         postal_code = fake.postcode()
         country = fake.country()
         medical_condition = fake.random_element(
-            elements=(
-                "Hypertension",
-                "Type 2 Diabetes",
-                "Asthma",
-                "Migraine",
-                "Anxiety",
-                "Depression",
-                "Arthritis",
-                "None",
-                "Hyperlipidemia",
-                None,
-            )
+            elements=(*MEDICAL_CONDITIONS, "None", None)
         )  # Added None for no condition
         medications = fake.random_element(
-            elements=(
-                "Lisinopril",
-                "Metformin",
-                "Albuterol",
-                "Ibuprofen",
-                "Sertraline",
-                "Acetaminophen",
-                "Aspirin",
-                "None",
-                "Atorvastatin",
-                None,
-            )
+            elements=(*MEDICATIONS, "None", None)
         )  # Added None for no medication
         allergies = fake.random_element(
             elements=(
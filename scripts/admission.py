@@ -0,0 +1,146 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+from opentelemetry import metrics
+
+
+meter = metrics.get_meter(__name__)
+
+queue_depth = meter.create_up_down_counter(
+    "admission.queue.depth", description="Requests waiting for an agent run slot."
+)
+in_flight = meter.create_up_down_counter(
+    "admission.in_flight", description="Agent runs currently admitted."
+)
+wait_time = meter.create_histogram(
+    "admission.wait_time", unit="s", description="Time a request waited before it was admitted."
+)
+rejected = meter.create_counter(
+    "admission.rejected", description="Requests turned away because the wait queue was full."
+)
+
+
+class AdmissionRejected(Exception):
+    """The wait queue is full; the caller should tell the user to try again shortly."""
+
+
+class _Waiter:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.granted = asyncio.get_running_loop().create_future()
+        self.moved = asyncio.Event()
+        self.enqueued_at = time.perf_counter()
+
+
+class AdmissionController:
+    """
+    Caps how many agent runs are in flight, globally and per user.
+
+    Requests that can't start right away wait in one FIFO queue of at most
+    `max_queue` entries; anything beyond that is rejected immediately. A user's
+    follow-up waits for their previous run, while other users' requests behind it
+    in the queue may still go ahead. Meant to be used from a single event loop.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_queue: int = 32, per_user_limit: int = 1):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.per_user_limit = per_user_limit
+        self._active = 0
+        self._active_by_user = defaultdict(int)
+        self._queue = []
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def _can_start(self, user_id: str) -> bool:
+        return self._active < self.max_in_flight and self._active_by_user[user_id] < self.per_user_limit
+
+    def _start(self, user_id: str):
+        self._active += 1
+        self._active_by_user[user_id] += 1
+        in_flight.add(1)
+
+    def _finish(self, user_id: str):
+        self._active -= 1
+        self._active_by_user[user_id] -= 1
+        if not self._active_by_user[user_id]:
+            del self._active_by_user[user_id]
+        in_flight.add(-1)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit every queued request that can start now, in arrival order."""
+        for waiter in list(self._queue):
+            if self._can_start(waiter.user_id):
+                self._queue.remove(waiter)
+                queue_depth.add(-1)
+                self._start(waiter.user_id)
+                waiter.granted.set_result(None)
+        for waiter in self._queue:
+            waiter.moved.set()
+
+    def position(self, waiter: _Waiter) -> int:
+        return self._queue.index(waiter) + 1
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, on_queued: Optional[Callable[[int], Awaitable[None]]] = None):
+        """
+        Hold a run slot for the duration of the block.
+
+        While waiting, `on_queued(position)` is awaited whenever the request's
+        1-based queue position changes. Raises AdmissionRejected if the queue is full.
+        """
+        if not self._queue and self._can_start(user_id):
+            self._start(user_id)
+            wait_time.record(0.0)
+        else:
+            if len(self._queue) >= self.max_queue:
+                rejected.add(1)
+                raise AdmissionRejected(f"{len(self._queue)} requests already waiting")
+            await self._wait(_Waiter(user_id), on_queued)
+
+        try:
+            yield
+        finally:
+            self._finish(user_id)
+
+    async def _wait(self, waiter: _Waiter, on_queued):
+        self._queue.append(waiter)
+        queue_depth.add(1)
+        self._dispatch()
+
+        last_position = None
+        try:
+            while not waiter.granted.done():
+                waiter.moved.clear()
+                position = self.position(waiter)
+                if on_queued and position != last_position:
+                    last_position = position
+                    await on_queued(position)
+                if waiter.granted.done():
+                    break
+                moved = asyncio.ensure_future(waiter.moved.wait())
+                try:
+                    await asyncio.wait({waiter.granted, moved}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    moved.cancel()
+        except BaseException:
+            if waiter.granted.done() and not waiter.granted.cancelled():
+                # Admitted just as we were cancelled: give the slot back
+                self._finish(waiter.user_id)
+            elif waiter in self._queue:
+                self._queue.remove(waiter)
+                queue_depth.add(-1)
+                self._dispatch()
+            raise
+        finally:
+            wait_time.record(time.perf_counter() - waiter.enqueued_at)
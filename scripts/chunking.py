@@ -0,0 +1,194 @@
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+
+PAGES, HEADINGS = "pages", "headings"
+CHARACTERS, TOKENS = "characters", "azureOpenAITokens"
+
+
+@dataclass(frozen=True)
+class ChunkingProfile:
+    """
+    How the skillset splits documents into the chunks that get embedded and indexed.
+
+    `pages` is the SplitSkill's pages mode: chunks of up to `max_length` units that
+    end on a sentence boundary where one is close enough, each starting with the
+    last `overlap` units of the one before. `headings` first splits the document
+    into sections at headings up to `heading_depth` (the Document Intelligence
+    layout skill on the service) and pages each section the same way, so no chunk
+    straddles two sections. `unit` is characters or cl100k tokens.
+    """
+
+    name: str
+    strategy: str = PAGES
+    max_length: int = 2000
+    overlap: int = 0
+    unit: str = CHARACTERS
+    heading_depth: int = 3
+
+    def __post_init__(self):
+        if self.strategy not in (PAGES, HEADINGS):
+            raise ValueError(f"strategy must be pages or headings, not {self.strategy!r}")
+        if self.unit not in (CHARACTERS, TOKENS):
+            raise ValueError(f"unit must be {CHARACTERS} or {TOKENS}, not {self.unit!r}")
+        if not 0 <= self.overlap < self.max_length:
+            raise ValueError("overlap must be at least 0 and less than max_length")
+        if not 1 <= self.heading_depth <= 6:
+            raise ValueError("heading_depth must be between 1 and 6")
+
+    def describe(self) -> str:
+        unit = "tokens" if self.unit == TOKENS else "chars"
+        parts = [self.strategy]
+        if self.strategy == HEADINGS:
+            parts.append(f"h1-h{self.heading_depth}")
+        parts.append(f"{self.max_length} {unit}, {self.overlap} overlap")
+        return " ".join(parts)
+
+
+PROFILES = {profile.name: profile for profile in [
+    # What setup_index always built: 25% overlap
+    ChunkingProfile("legacy", max_length=2000, overlap=500),
+    ChunkingProfile("pages-2000", max_length=2000, overlap=200),
+    ChunkingProfile("pages-2000-no-overlap", max_length=2000, overlap=0),
+    ChunkingProfile("pages-1000", max_length=1000, overlap=100),
+    # Sized for the embedding model rather than by characters
+    ChunkingProfile("tokens-512", max_length=512, overlap=64, unit=TOKENS),
+    ChunkingProfile("headings", strategy=HEADINGS, max_length=2000, overlap=200),
+]}
+DEFAULT_PROFILE = "legacy"
+
+
+def get_profile(name: str = None) -> ChunkingProfile:
+    """The profile called `name`, or AZURE_SEARCH_CHUNKING_PROFILE's (default: legacy)."""
+    name = name or os.getenv("AZURE_SEARCH_CHUNKING_PROFILE", DEFAULT_PROFILE)
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"unknown chunking profile {name!r}; choose from {', '.join(PROFILES)}") from None
+
+
+# ---------- Local chunking ----------
+# Mirrors what the service does closely enough to compare profiles offline
+# (benchmarks/chunking.py); the index itself is always chunked by the skillset.
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+# "# Title" from the layout skill's markdown, or a numbered section line such as "10.3.1. Pressure Offloading"
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+\S")
+NUMBERED_HEADING = re.compile(r"^(\d{1,2}(?:\.\d{1,2})*)\.?\s+[A-Z][^\n]{0,100}$")
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """tiktoken's cl100k_base, or None when tiktoken isn't usable and token counts are estimated."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # not installed, or the encoding can't be downloaded
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """cl100k_base tokens in `text`, estimated at 4 characters a token when tiktoken isn't usable."""
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _tail(text: str, length: int, unit: str) -> str:
+    """The last `length` units of `text`, starting on a word."""
+    if length <= 0:
+        return ""
+    if unit == TOKENS:
+        encoding = get_encoding()
+        if encoding is not None:
+            tail = encoding.decode(encoding.encode(text, disallowed_special=())[-length:])
+        else:
+            tail = text[-length * 4:]
+    else:
+        tail = text[-length:]
+    if len(tail) < len(text) and not text[-len(tail) - 1].isspace():
+        tail = tail.partition(" ")[2]  # drop the partial first word
+    return tail.strip()
+
+
+def _heading_level(paragraph: str) -> int:
+    """Heading level of a paragraph, 0 if it isn't one. Headings are a paragraph of their own."""
+    if "\n" in paragraph:
+        return 0
+    match = MARKDOWN_HEADING.match(paragraph)
+    if match:
+        return len(match.group(1))
+    match = NUMBERED_HEADING.match(paragraph)
+    # Not a numbered list item or reference ("2. Patients with...", "54. McDermott MM, et al. ...")
+    if match and not paragraph.endswith(".") and ". " not in paragraph[match.end(1) + 2:]:
+        return match.group(1).count(".") + 1
+    return 0
+
+
+def split_sections(text: str, depth: int) -> List[str]:
+    """`text` split before every heading of level `depth` or above; each section keeps its heading."""
+    sections, current = [], []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        level = _heading_level(paragraph)
+        if level and level <= depth and current:
+            sections.append("\n\n".join(current))
+            current = []
+        current.append(paragraph)
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+
+def _pieces(text: str, max_length: int, length: Callable[[str], int]) -> List[Tuple[str, int]]:
+    """Sentences with their lengths; a sentence longer than a chunk is broken between words."""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        for sentence in SENTENCE_END.split(paragraph.strip()):
+            sentence = " ".join(sentence.split())
+            if not sentence:
+                continue
+            size = length(sentence)
+            if size <= max_length:
+                pieces.append((sentence, size))
+                continue
+            words, run = sentence.split(" "), []
+            for word in words:
+                if run and length(" ".join(run + [word])) > max_length:
+                    pieces.append((" ".join(run), length(" ".join(run))))
+                    run = []
+                run.append(word)
+            if run:
+                pieces.append((" ".join(run), length(" ".join(run))))
+    return pieces
+
+
+def _pages(text: str, profile: ChunkingProfile) -> List[str]:
+    length = count_tokens if profile.unit == TOKENS else len
+    chunks, current, size = [], [], 0
+    for piece, piece_size in _pieces(text, profile.max_length, length):
+        if current and size + 1 + piece_size > profile.max_length:
+            chunk = " ".join(current)
+            chunks.append(chunk)
+            overlap = _tail(chunk, profile.overlap, profile.unit)
+            current, size = ([overlap], length(overlap)) if overlap else ([], 0)
+            if current and size + 1 + piece_size > profile.max_length:
+                current, size = [], 0  # no room for the overlap next to this sentence
+        current.append(piece)
+        size += piece_size + (1 if len(current) > 1 else 0)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def chunk_text(text: str, profile: ChunkingProfile) -> List[str]:
+    """Split one document's text into chunks the way `profile` would on the service."""
+    if profile.strategy == HEADINGS:
+        return [chunk for section in split_sections(text, profile.heading_depth) for chunk in _pages(section, profile)]
+    return _pages(text, profile)
@@ -1,30 +1,25 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 import os
-from azure.identity import DefaultAzureCredential
-from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
+from token_broker import get_credential
 
 
-credential = DefaultAzureCredential(
-    exclude_environment_credential=False,
-    exclude_managed_identity_credential=False,
-    exclude_shared_token_cache_credential=True,  # skip local cache
-    exclude_visual_studio_code_credential=True,
-)
-
-
-key_vault = SecretClient(vault_url=os.environ["KEYVAULT_URL"], credential=credential)
-
-
-token = credential.get_token("https://management.azure.com/.default").token
+ARM_ENDPOINT = "https://management.azure.com"
+ARM_SCOPE = "https://management.azure.com/.default"
+api_version = "2024-04-01-preview"
 
-
-# Azure AI Management API to configure the Content Filter
-subscription_id = key_vault.get_secret("subscription-id").value
-resource_group_name = key_vault.get_secret("rgName").value
-account_name = key_vault.get_secret("aiName").value  # name of Azure OpenAI resource
-api_version = "2024-04-01-preview"  # name of Azure OpenAI resource
+# Refresh the management token this long before it expires
+TOKEN_REFRESH_MARGIN_SECONDS = 300
 
 
 default_policy_data = {
@@ -104,27 +99,119 @@ default_policy_data = {
 }
 
 
+def _policy_key(content_filter: dict) -> Tuple[str, str]:
+    return content_filter.get("name", "").lower(), content_filter.get("source", "").lower()
+
+
+def diff_policy(desired: dict, live: Optional[dict]) -> List[dict]:
+    """
+    What applying `desired` would change in `live` (None when the policy doesn't exist yet).
+
+    contentFilters are matched on (name, source). Only the fields and filters set in
+    `desired` are compared: the service adds read-only fields of its own and keeps
+    entries from the base policy (protected_material_*, ...) that a PUT of `desired`
+    leaves as they are, so reporting them as removals would never settle.
+    """
+    if live is None:
+        return [{"change": "create"}]
+
+    desired_props = desired.get("properties", {})
+    live_props = live.get("properties", {})
+    changes = []
+
+    for key, value in desired_props.items():
+        if key != "contentFilters" and live_props.get(key) != value:
+            changes.append({"change": "update", "field": key, "live": live_props.get(key), "desired": value})
+
+    live_filters = {_policy_key(f): f for f in live_props.get("contentFilters", [])}
+    desired_filters = {_policy_key(f): f for f in desired_props.get("contentFilters", [])}
+    for key, wanted in desired_filters.items():
+        name = "/".join(key)
+        current = live_filters.get(key)
+        if current is None:
+            changes.append({"change": "add", "filter": name})
+            continue
+        for field_name, value in wanted.items():
+            if field_name in ("name", "source"):
+                continue
+            if current.get(field_name) != value:
+                changes.append({"change": "update", "filter": name, "field": field_name,
+                                "live": current.get(field_name), "desired": value})
+    return changes
+
+
+@dataclass
+class ReconcileResult:
+    account_name: str
+    rai_policy_name: str
+    status: str = "unchanged"  # unchanged | created | updated | would_change | failed
+    changes: List[dict] = field(default_factory=list)
+    duration_s: float = 0.0
+    error: str = ""
+
+
+class ManagementSession:
+    """
+    One pooled requests.Session for the management API, shared by every account.
+
+    Transient failures (429, 5xx) are retried by the adapter. The bearer token is
+    refreshed shortly before it expires, and once more if a request comes back 401.
+    """
+
+    def __init__(self, credential=None, pool_size: int = 16):
+        self.credential = credential or get_credential()
+        self._token = None
+        self._token_lock = threading.Lock()
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "PUT", "DELETE"}),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+
+    def access_token(self, force_refresh: bool = False) -> str:
+        with self._token_lock:
+            if (force_refresh or self._token is None
+                    or self._token.expires_on - TOKEN_REFRESH_MARGIN_SECONDS <= time.time()):
+                self._token = self.credential.get_token(ARM_SCOPE)
+            return self._token.token
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        for attempt in range(2):
+            headers = {
+                "Authorization": f"Bearer {self.access_token(force_refresh=attempt > 0)}",
+                "Content-Type": "application/json",
+            }
+            response = self.session.request(method, url, headers=headers, timeout=(10, 60), **kwargs)
+            if response.status_code != 401:
+                break
+        return response
+
+    def close(self):
+        self.session.close()
+
+
 class AOAIContentFilterManager:
-    def __init__(self, subscription_id, resource_group_name, account_name):
+    def __init__(self, subscription_id, resource_group_name, account_name, session: ManagementSession = None):
         self.subscription_id = subscription_id
         self.resource_group_name = resource_group_name
         self.account_name = account_name
         self.api_version = api_version
-        self.credential = DefaultAzureCredential()
-        self.access_token = self._get_access_token()
+        self.session = session or ManagementSession()
         self.default_policy_data = default_policy_data
 
-    def _get_access_token(self):
-        token = self.credential.get_token("https://management.azure.com/.default").token
-        return token
+    def _url(self, rai_policy_name=None):
+        url = f"{ARM_ENDPOINT}/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_group_name}/providers/Microsoft.CognitiveServices/accounts/{self.account_name}/raiPolicies"
+        if rai_policy_name:
+            url += f"/{rai_policy_name}"
+        return f"{url}?api-version={self.api_version}"
 
     def list_content_filters(self):
-        url = f"https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_group_name}/providers/Microsoft.CognitiveServices/accounts/{self.account_name}/raiPolicies?api-version={self.api_version}"
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
-        response = requests.get(url, headers=headers)
+        response = self.session.request("GET", self._url())
         if response.status_code == 200:
             response = response.json()
             filters = [filter["name"] for filter in response["value"]]
@@ -135,12 +222,7 @@ class AOAIContentFilterManager:
             )
 
     def get_filter_details(self, rai_policy_name):
-        url = f"https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_group_name}/providers/Microsoft.CognitiveServices/accounts/{self.account_name}/raiPolicies/{rai_policy_name}?api-version={self.api_version}"
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
-        response = requests.get(url, headers=headers)
+        response = self.session.request("GET", self._url(rai_policy_name))
         if response.status_code == 200:
             return response.json()
         else:
@@ -152,12 +234,7 @@ class AOAIContentFilterManager:
         if policy_data is None:
             policy_data = self.default_policy_data
 
-        url = f"https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_group_name}/providers/Microsoft.CognitiveServices/accounts/{self.account_name}/raiPolicies/{rai_policy_name}?api-version={self.api_version}"
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
-        response = requests.put(url, headers=headers, json=policy_data)
+        response = self.session.request("PUT", self._url(rai_policy_name), json=policy_data)
         if response.status_code in [200, 201]:
             return response.json()
         else:
@@ -166,13 +243,7 @@ class AOAIContentFilterManager:
             )
 
     def delete_filter(self, rai_policy_name):
-
-        url = f"https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_group_name}/providers/Microsoft.CognitiveServices/accounts/{self.account_name}/raiPolicies/{rai_policy_name}?api-version={self.api_version}"
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
-        response = requests.delete(url, headers=headers)
+        response = self.session.request("DELETE", self._url(rai_policy_name))
 
         if response.status_code == 202:
             return f"Filter {rai_policy_name} successfully deleted."
@@ -183,19 +254,93 @@ class AOAIContentFilterManager:
                 f"Failed to delete filter for {rai_policy_name}. Status code: {response.status_code}, Response: {response.text}"
             )
 
+    def reconcile(self, rai_policy_name, policy_data=None, dry_run=False) -> ReconcileResult:
+        """Bring `rai_policy_name` in line with `policy_data`, PUTting only if the live policy differs."""
+        if policy_data is None:
+            policy_data = self.default_policy_data
+        result = ReconcileResult(self.account_name, rai_policy_name)
+        start = time.perf_counter()
+        try:
+            response = self.session.request("GET", self._url(rai_policy_name))
+            if response.status_code == 404:
+                live = None
+            elif response.status_code == 200:
+                live = response.json()
+            else:
+                raise Exception(
+                    f"Failed to retrieve filter details for {rai_policy_name}. Status code: {response.status_code}, Response: {response.text}"
+                )
+
+            result.changes = diff_policy(policy_data, live)
+            if result.changes:
+                if dry_run:
+                    result.status = "would_change"
+                else:
+                    self.create_or_update_filter(rai_policy_name, policy_data)
+                    result.status = "created" if live is None else "updated"
+        except Exception as e:
+            result.status = "failed"
+            result.error = str(e)
+        result.duration_s = time.perf_counter() - start
+        return result
+
+
+def reconcile_accounts(accounts: List[Dict[str, str]], rai_policy_name: str, policy_data=None,
+                       dry_run: bool = False, max_workers: int = 8, credential=None) -> List[ReconcileResult]:
+    """
+    Reconcile one policy across many Azure OpenAI accounts concurrently.
+    Each account is a dict with subscription_id, resource_group_name and account_name.
+    """
+    session = ManagementSession(credential, pool_size=max_workers)
+    try:
+        managers = [AOAIContentFilterManager(session=session, **account) for account in accounts]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda m: m.reconcile(rai_policy_name, policy_data, dry_run), managers))
+    finally:
+        session.close()
+
+
+def print_report(results: List[ReconcileResult], elapsed: float):
+    for result in results:
+        print(f"{result.account_name:<32} {result.rai_policy_name:<20} {result.status:<13} "
+              f"{len(result.changes):3d} changes  {result.duration_s:6.2f}s  {result.error}")
+        for change in result.changes:
+            target = change.get("filter", "")
+            detail = f" {change['field']}: {change['live']!r} -> {change['desired']!r}" if "field" in change else ""
+            print(f"    {change['change']:<7} {target}{detail}")
+    changed = sum(r.status in ("created", "updated") for r in results)
+    failed = sum(r.status == "failed" for r in results)
+    print(f"{len(results)} accounts, {changed} changed, {failed} failed, {elapsed:.2f}s total")
+
+
+def parse_account(value: str) -> Dict[str, str]:
+    subscription_id, resource_group_name, account_name = value.split("/")
+    return {"subscription_id": subscription_id, "resource_group_name": resource_group_name,
+            "account_name": account_name}
+
 
-cf_manager = AOAIContentFilterManager(
-    subscription_id, resource_group_name, account_name
-)
-filters = cf_manager.list_content_filters()
-print("Content Filters:", filters)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the default content filter policy to Azure OpenAI accounts.")
+    parser.add_argument("--account", action="append", type=parse_account, dest="accounts",
+                        help="subscription_id/resource_group/account_name; repeat for more accounts "
+                             "(default: the account named in Key Vault)")
+    parser.add_argument("--policy", default="prompt-shield", help="RAI policy name")
+    parser.add_argument("--dry-run", action="store_true", help="report differences without applying them")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
 
-# reset filter to default
-_ = cf_manager.create_or_update_filter("prompt-shield", default_policy_data)
+    credential = get_credential()
 
-# # show details of current content filter
-# current_policy = cf_manager.get_filter_details('prompt-shield')
-# print(current_policy['properties']['contentFilters'])
-filters = cf_manager.list_content_filters()
+    accounts = args.accounts
+    if not accounts:
+        key_vault = SecretClient(vault_url=os.environ["KEYVAULT_URL"], credential=credential)
+        accounts = [{
+            "subscription_id": key_vault.get_secret("subscription-id").value,
+            "resource_group_name": key_vault.get_secret("rgName").value,
+            "account_name": key_vault.get_secret("aiName").value,  # name of Azure OpenAI resource
+        }]
 
-print("Content Filters:", filters)
+    start = time.perf_counter()
+    results = reconcile_accounts(accounts, args.policy, default_policy_data, dry_run=args.dry_run,
+                                 max_workers=args.workers, credential=credential)
+    print_report(results, time.perf_counter() - start)
@@ -1,12 +1,15 @@
+import asyncio
 import logging
 
 from azure.ai.projects import AIProjectClient
+from azure.core.exceptions import ResourceNotFoundError
 from azure.ai.agents.models import ToolSet
-from azure.ai.agents.models import FunctionTool
 from opentelemetry import trace
 from azure.monitor.opentelemetry import configure_azure_monitor
-from azure.identity import DefaultAzureCredential
 from tools import user_functions
+from tier_router import FAST_INSTRUCTIONS
+from token_footprint import CompactFunctionTool
+from token_broker import get_credential
 from pathlib import Path
 import logging
 import os
@@ -17,21 +20,17 @@ logging.getLogger("opentelemetry").setLevel(logging.WARNING)
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
-from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 
 
-credential = DefaultAzureCredential(
-    exclude_environment_credential=False,
-    exclude_managed_identity_credential=False,
-    exclude_shared_token_cache_credential=True,   # skip local cache
-    exclude_visual_studio_code_credential=True,
-)
+# Process-wide credential with cached, proactively refreshed tokens (AZURE_CREDENTIAL_TYPE)
+credential = get_credential()
 
 key_vault = SecretClient(vault_url=os.environ["KEYVAULT_URL"], credential=credential)
 
 
-functions = FunctionTool(user_functions)
+# Deployed with the AGENT_TOOL_SCHEMA schemas; keep it in step with the app's setting
+functions = CompactFunctionTool(user_functions)
 
 toolset = ToolSet()
 toolset.add(functions)
@@ -39,7 +38,7 @@ toolset.add(functions)
 
 agents_client = AIProjectClient.from_connection_string(
     key_vault.get_secret("ai-project-conn-string").value,
-    credential=DefaultAzureCredential(),
+    credential=credential,
 )
 agent_client = agents_client.agents
 
@@ -51,8 +50,19 @@ scenario = Path(__file__).name
 tracer = trace.get_tracer(__name__)
 
 
+def fast_model_deployment():
+    """The fast tier's chat model (infra's fastModelName), or None if it wasn't deployed."""
+    try:
+        return key_vault.get_secret("fast-model-deployment-name").value or None
+    except ResourceNotFoundError:
+        return None
+
+
 async def creating_agent():
-    """Initialize the agent with the sales data schema and instructions."""
+    """
+    Create the full agent and, when a fast model is deployed, the fast-tier agent with the
+    same tools (main.py routes simple messages to it), and store their ids in Key Vault.
+    """
 
     if not key_vault.get_secret("model-deployment-name").value:
         logger.error("MODEL_DEPLOYMENT_NAME environment variable is not set")
@@ -79,10 +89,28 @@ async def creating_agent():
 
             key_vault.set_secret(name="agent-id", value=agent.id)
 
+            fast_model = fast_model_deployment()
+            if not fast_model:
+                logger.warning("No fast-model-deployment-name in Key Vault; every message will go to the full agent")
+                return agent, None
+
+            # Same tools and instructions, plus when to hand a message back to the full agent
+            fast_agent = agent_client.create_agent(
+                model=fast_model,
+                name="healthcare_agent_fast",
+                instructions=instructions.decode("utf-8") + FAST_INSTRUCTIONS,
+                toolset=toolset,
+            )
+
+            print(f"Created fast agent ({fast_model}), ID: {fast_agent.id}")
+
+            key_vault.set_secret(name="agent-id-fast", value=fast_agent.id)
+            return agent, fast_agent
+
     except Exception as e:
         logger.error("An error occurred creating agent: %s", str(e))
 
 
 if __name__ == "__main__":
 
-    creating_agent()
+    asyncio.run(creating_agent())
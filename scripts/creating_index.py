@@ -4,19 +4,28 @@ import os
 import subprocess
  
 from azure.core.exceptions import ResourceExistsError
-from azure.identity import AzureDeveloperCliCredential, DefaultAzureCredential
+from azure.identity import AzureDeveloperCliCredential
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents.indexes import SearchIndexClient, SearchIndexerClient
 from azure.search.documents.indexes.models import (
+    AIServicesAccountIdentity,
     AzureOpenAIEmbeddingSkill,
+    AzureOpenAITokenizerParameters,
     AzureOpenAIVectorizerParameters,
     AzureOpenAIVectorizer,
+    BinaryQuantizationCompression,
+    DocumentIntelligenceLayoutSkill,
     FieldMapping,
     HnswAlgorithmConfiguration,
     HnswParameters,
     IndexProjectionMode,
+    IndexingParameters,
+    IndexingParametersConfiguration,
     InputFieldMappingEntry,
     OutputFieldMappingEntry,
+    RescoringOptions,
+    ScalarQuantizationCompression,
+    ScalarQuantizationParameters,
     SearchableField,
     SearchField,
     SearchFieldDataType,
@@ -37,25 +46,92 @@ from azure.search.documents.indexes.models import (
     SplitSkill,
     VectorSearch,
     VectorSearchAlgorithmMetric,
+    VectorSearchCompressionRescoreStorageMethod,
+    VectorSearchCompressionTarget,
     VectorSearchProfile,
 )
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
 from azure.keyvault.secrets import SecretClient
+from chunking import HEADINGS, TOKENS, ChunkingProfile, get_profile
+from dedupe import DedupeSettings, plan
+from token_broker import get_credential
+from vector_compression import BINARY, SCALAR, VectorIndexOptions
 
 
 load_dotenv()
 
-credential = DefaultAzureCredential(
-    exclude_environment_credential=False,
-    exclude_managed_identity_credential=False,
-    exclude_shared_token_cache_credential=True,  # skip local cache
-    exclude_visual_studio_code_credential=True,
-)
+# Process-wide credential with cached, proactively refreshed tokens (AZURE_CREDENTIAL_TYPE)
+credential = get_credential()
 
 key_vault = SecretClient(vault_url=os.environ["KEYVAULT_URL"], credential=credential)
   
  
+def vector_compression(options: VectorIndexOptions):
+    """The index's compression configuration for `options`, or None for full-precision vectors."""
+    if options.compression not in (SCALAR, BINARY):
+        return None
+    rescoring = RescoringOptions(
+        enable_rescoring=options.rescore,
+        default_oversampling=options.oversampling if options.rescore else None,
+        # Rescoring needs the full-precision originals; without it they're dead weight
+        rescore_storage_method=(
+            VectorSearchCompressionRescoreStorageMethod.PRESERVE_ORIGINALS if options.rescore
+            else VectorSearchCompressionRescoreStorageMethod.DISCARD_ORIGINALS
+        ),
+    )
+    # rescoring_options replaces rerank_with_original_vectors; the service rejects both
+    common = dict(
+        compression_name="vc",
+        rerank_with_original_vectors=None,
+        rescoring_options=rescoring,
+        truncation_dimension=options.truncation_dimension,
+    )
+    if options.compression == SCALAR:
+        return ScalarQuantizationCompression(
+            **common,
+            parameters=ScalarQuantizationParameters(quantized_data_type=VectorSearchCompressionTarget.INT8),
+        )
+    return BinaryQuantizationCompression(**common)
+
+
+def chunking_skills(profile: ChunkingProfile, ai_services_endpoint: str = None):
+    """
+    Skills that split each document into chunks under `profile`, and the context
+    the chunks end up at (for the embedding skill and the index projection).
+    """
+    split = dict(
+        text_split_mode="pages",
+        maximum_page_length=profile.max_length,
+        page_overlap_length=profile.overlap,
+        unit=TOKENS if profile.unit == TOKENS else None,
+        parameters=AzureOpenAITokenizerParameters(encoder_model_name="cl100k_base") if profile.unit == TOKENS else None,
+        outputs=[OutputFieldMappingEntry(name="textItems", target_name="pages")]
+    )
+    if profile.strategy != HEADINGS:
+        return [
+            SplitSkill(context="/document", inputs=[InputFieldMappingEntry(name="text", source="/document/content")], **split)
+        ], "/document/pages/*"
+
+    if not ai_services_endpoint:
+        raise ValueError(f"chunking profile {profile.name!r} needs the AI Services endpoint for the layout skill")
+    # The layout model turns the file into one markdown section per heading; each section is then paged
+    return [
+        DocumentIntelligenceLayoutSkill(
+            context="/document",
+            output_mode="oneToMany",
+            markdown_header_depth=f"h{profile.heading_depth}",
+            inputs=[InputFieldMappingEntry(name="file_data", source="/document/file_data")],
+            outputs=[OutputFieldMappingEntry(name="markdown_document", target_name="markdownDocument")]
+        ),
+        SplitSkill(
+            context="/document/markdownDocument/*",
+            inputs=[InputFieldMappingEntry(name="text", source="/document/markdownDocument/*/content")],
+            **split
+        )
+    ], "/document/markdownDocument/*/pages/*"
+
+
 def setup_index(
     azure_credential,
     index_name,
@@ -65,8 +141,16 @@ def setup_index(
     azure_openai_embedding_endpoint,
     azure_openai_embedding_deployment,
     azure_openai_embedding_model,
-    azure_openai_embeddings_dimensions
+    azure_openai_embeddings_dimensions,
+    vector_options: VectorIndexOptions = None,
+    chunking_profile: ChunkingProfile = None,
+    ai_services_endpoint: str = None
 ):
+    vector_options = vector_options or VectorIndexOptions()
+    compression = vector_compression(vector_options)
+    chunking_profile = chunking_profile or get_profile()
+    chunk_skills, chunk_context = chunking_skills(chunking_profile, ai_services_endpoint)
+    reads_files = chunking_profile.strategy == HEADINGS
     index_client = SearchIndexClient(azure_search_endpoint, azure_credential)
     indexer_client = SearchIndexerClient(azure_search_endpoint, azure_credential)
  
@@ -88,7 +172,10 @@ def setup_index(
     # Index
     # -----------------------------
     index_names = [index.name for index in index_client.list_indexes()]
-    if index_name not in index_names:
+    if index_name in index_names:
+        logger.info("Index %s already exists; vector settings (%s) only apply when it is created",
+                    index_name, vector_options.describe())
+    else:
         index_client.create_index(
             SearchIndex(
                 name=index_name,
@@ -103,17 +190,24 @@ def setup_index(
                         type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
                         vector_search_dimensions=azure_openai_embeddings_dimensions,
                         vector_search_profile_name="vp",
-                        stored=True,
-                        hidden=False
+                        stored=vector_options.stored,
+                        # A vector that isn't stored can't be retrievable
+                        hidden=not vector_options.stored
                     )
                 ],
                 vector_search=VectorSearch(
                     algorithms=[
                         HnswAlgorithmConfiguration(
                             name="algo",
-                            parameters=HnswParameters(metric=VectorSearchAlgorithmMetric.COSINE)
+                            parameters=HnswParameters(
+                                m=vector_options.hnsw_m,
+                                ef_construction=vector_options.hnsw_ef_construction,
+                                ef_search=vector_options.hnsw_ef_search,
+                                metric=VectorSearchAlgorithmMetric.COSINE
+                            )
                         )
                     ],
+                    compressions=[compression] if compression else None,
                     vectorizers=[
                         AzureOpenAIVectorizer(
                             vectorizer_name="openai_vectorizer",
@@ -126,7 +220,12 @@ def setup_index(
                         )
                     ],
                     profiles=[
-                        VectorSearchProfile(name="vp", algorithm_configuration_name="algo", vectorizer_name="openai_vectorizer")
+                        VectorSearchProfile(
+                            name="vp",
+                            algorithm_configuration_name="algo",
+                            vectorizer_name="openai_vectorizer",
+                            compression_name=compression.compression_name if compression else None
+                        )
                     ]
                 ),
                 semantic_search=SemanticSearch(
@@ -148,38 +247,36 @@ def setup_index(
     # Skillset
     # -----------------------------
     skillsets = indexer_client.get_skillsets()
-    if index_name not in [skillset.name for skillset in skillsets]:
+    if index_name in [skillset.name for skillset in skillsets]:
+        logger.info("Skillset %s already exists; chunking profile %s (%s) only applies when it is created",
+                    index_name, chunking_profile.name, chunking_profile.describe())
+    else:
         indexer_client.create_skillset(
             skillset=SearchIndexerSkillset(
                 name=index_name,
-                skills=[
-                    SplitSkill(
-                        text_split_mode="pages",
-                        context="/document",
-                        maximum_page_length=2000,
-                        page_overlap_length=500,
-                        inputs=[InputFieldMappingEntry(name="text", source="/document/content")],
-                        outputs=[OutputFieldMappingEntry(name="textItems", target_name="pages")]
-                    ),
+                skills=chunk_skills + [
                     AzureOpenAIEmbeddingSkill(
-                        context="/document/pages/*",
+                        context=chunk_context,
                         resource_url=azure_openai_embedding_endpoint,
                         deployment_name=azure_openai_embedding_deployment,
                         model_name=azure_openai_embedding_model,
                         dimensions=azure_openai_embeddings_dimensions,
-                        inputs=[InputFieldMappingEntry(name="text", source="/document/pages/*")],
+                        inputs=[InputFieldMappingEntry(name="text", source=chunk_context)],
                         outputs=[OutputFieldMappingEntry(name="embedding", target_name="embedding")]
                     )
                 ],
-                index_projections=SearchIndexerIndexProjection(
+                # The layout skill is billed to the AI Services account, reached with the search service's identity
+                cognitive_services_account=AIServicesAccountIdentity(identity=None, subdomain_url=ai_services_endpoint)
+                if reads_files else None,
+                index_projection=SearchIndexerIndexProjection(
                     selectors=[
                         SearchIndexerIndexProjectionSelector(
                             target_index_name=index_name,
                             parent_key_field_name="parent_id",
-                            source_context="/document/pages/*",
+                            source_context=chunk_context,
                             mappings=[
-                                InputFieldMappingEntry(name="chunk", source="/document/pages/*"),
-                                InputFieldMappingEntry(name="text_vector", source="/document/pages/*/embedding"),
+                                InputFieldMappingEntry(name="chunk", source=chunk_context),
+                                InputFieldMappingEntry(name="text_vector", source=f"{chunk_context}/embedding"),
                                 InputFieldMappingEntry(name="title", source="/document/metadata_storage_name")
                             ]
                         )
@@ -202,7 +299,12 @@ def setup_index(
                 data_source_name=index_name,
                 skillset_name=index_name,
                 target_index_name=index_name,
-                field_mappings=[FieldMapping(source_field_name="metadata_storage_name", target_field_name="title")]
+                field_mappings=[FieldMapping(source_field_name="metadata_storage_name", target_field_name="title")],
+                # The layout skill reads the original file rather than the extracted text
+                parameters=IndexingParameters(
+                    # query_timeout is an Azure SQL setting the blob indexer rejects; the SDK sends it by default
+                    configuration=IndexingParametersConfiguration(allow_skillset_to_read_file_data=True, query_timeout=None)
+                ) if reads_files else None
             )
         )
  
@@ -219,11 +321,24 @@ def upload_documents(azure_credential, indexer_name, azure_search_endpoint, azur
         container_client.create_container()
     existing_blobs = [blob.name for blob in container_client.list_blobs()]
  
-    for file in os.scandir("../data"):
+    files = sorted((entry for entry in os.scandir("../data") if entry.is_file()), key=lambda entry: entry.name)
+    # INGEST_DEDUPE_* (scripts/dedupe.py): near-duplicates of an earlier file here are flagged in blob metadata, or never
+    # embedded with INGEST_DEDUPE_MODE=skip; blobs already uploaded are compared only while their file is still in
+    # ../data, and unreadable files go up unchecked
+    report = plan([file.path for file in files], existing_blobs, DedupeSettings.from_env())
+    for file in files:
+        filename = os.path.basename(file.path)
+        if filename in existing_blobs:
+            continue
+        decision = report.decisions.get(filename)
+        if report.skipped(filename):
+            logger.info("Skipping %s: %.2f similar to %s", filename, decision.similarity, decision.duplicate_of)
+            continue
         with open(file.path, "rb") as opened_file:
-            filename = os.path.basename(file.path)
-            if filename not in existing_blobs:
-                container_client.upload_blob(filename, opened_file, overwrite=True)
+            container_client.upload_blob(filename, opened_file, overwrite=True,
+                                         metadata=decision.metadata() if decision else None)
+    if report.decisions:
+        logger.info(report.summary())
  
     try:
         indexer_client.run_indexer(indexer_name)
@@ -267,7 +382,12 @@ if __name__ == "__main__":
         azure_openai_embedding_endpoint=AZURE_OPENAI_EMBEDDING_ENDPOINT,
         azure_openai_embedding_deployment=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
         azure_openai_embedding_model=AZURE_OPENAI_EMBEDDING_MODEL,
-        azure_openai_embeddings_dimensions=EMBEDDINGS_DIMENSIONS
+        azure_openai_embeddings_dimensions=EMBEDDINGS_DIMENSIONS,
+        # AZURE_SEARCH_VECTOR_COMPRESSION etc.; compare settings offline with benchmarks/vector_recall.py
+        vector_options=VectorIndexOptions.from_env(),
+        # AZURE_SEARCH_CHUNKING_PROFILE (scripts/chunking.py); compare profiles offline with benchmarks/chunking.py
+        chunking_profile=get_profile(),
+        ai_services_endpoint=f"https://{key_vault.get_secret('aiName').value}.cognitiveservices.azure.com/"
     )
  
     upload_documents(
@@ -0,0 +1,171 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from opentelemetry import metrics, trace
+
+
+logger = logging.getLogger(__name__)
+meter = metrics.get_meter(__name__)
+
+cancelled_work = meter.create_counter(
+    "deadline.cancelled_work",
+    description="Work abandoned because its request was cancelled, by kind (run, tool, backend, abort), name and reason.",
+)
+cancelled_duration = meter.create_histogram(
+    "deadline.cancelled_work.duration", unit="s",
+    description="Time spent on work before it was abandoned, by kind, name and reason.",
+)
+
+# Why a request stops early
+DEADLINE, DISCONNECT, RESET, STOP = "deadline", "disconnect", "reset", "stop"
+
+
+class Cancelled(BaseException):
+    """
+    The request this work belongs to was cancelled or ran out of time.
+
+    A BaseException, like asyncio.CancelledError, so the tools' and the SDK's
+    `except Exception` handlers don't turn it into a tool result for the model.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(f"request cancelled: {reason}")
+        self.reason = reason
+
+
+class Deadline:
+    """
+    Time budget and cancel token for one user request.
+
+    Expires on its own after `budget_s`; `cancel()` ends it early. Backend calls
+    register an abort (cursor.cancel, client.close) with `on_cancel` so they stop
+    as soon as the request does instead of running to completion unobserved.
+    """
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+        self.reason: Optional[str] = None
+        # Resolved on cancellation, so it can sit in a concurrent.futures.wait() set
+        self.future: Future = Future()
+        self._event = threading.Event()
+        self._aborts = {}
+        self._lock = threading.Lock()
+        self._timer = threading.Timer(budget_s, self.cancel, (DEADLINE,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def cancel(self, reason: str):
+        """Cancel the request and run every registered abort. Only the first reason counts."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            aborts = list(self._aborts.values())
+            self._aborts.clear()
+        self._timer.cancel()
+        self.future.set_result(reason)
+        for name, abort in aborts:
+            cancelled_work.add(1, {"kind": "abort", "name": name, "reason": reason})
+            try:
+                abort()
+            except Exception:
+                logger.warning("aborting %s failed", name, exc_info=True)
+
+    def check(self):
+        """Raise Cancelled if the request was cancelled or its budget is spent."""
+        if not self._event.is_set() and time.monotonic() >= self.expires_at:
+            self.cancel(DEADLINE)
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def sleep(self, seconds: float):
+        """time.sleep that wakes up, with Cancelled, as soon as the request ends."""
+        if self._event.wait(min(seconds, self.remaining())):
+            raise Cancelled(self.reason)
+        self.check()
+
+    @contextmanager
+    def on_cancel(self, name: str, abort: Callable[[], None]):
+        """Call `abort` if the request is cancelled while the block runs."""
+        token = object()
+        with self._lock:
+            if not self._event.is_set():
+                self._aborts[token] = (name, abort)
+                registered = True
+            else:
+                registered = False
+        if not registered:
+            raise Cancelled(self.reason)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._aborts.pop(token, None)
+
+    def close(self):
+        """The request finished; stop the expiry timer."""
+        self._timer.cancel()
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+def current() -> Optional[Deadline]:
+    """The deadline of the request being served, if any. Copied into worker threads with the context."""
+    return _current.get()
+
+
+@contextmanager
+def scope(deadline: Deadline):
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def check():
+    deadline = current()
+    if deadline is not None:
+        deadline.check()
+
+
+def timeout(cap: float) -> float:
+    """`cap` seconds, or less if the current request has less time left (never below 1ms)."""
+    deadline = current()
+    if deadline is None:
+        return cap
+    return max(0.001, min(cap, deadline.remaining()))
+
+
+@contextmanager
+def on_cancel(name: str, abort: Callable[[], None]):
+    """Deadline.on_cancel for the current request; does nothing outside one."""
+    deadline = current()
+    if deadline is None:
+        yield
+        return
+    with deadline.on_cancel(name, abort):
+        yield
+
+
+def record_cancelled(kind: str, name: str, reason: str, started: float):
+    """Count abandoned work and how long it had been running (`started` is a perf_counter value)."""
+    attributes = {"kind": kind, "name": name, "reason": reason}
+    cancelled_work.add(1, attributes)
+    cancelled_duration.record(time.perf_counter() - started, attributes)
+    trace.get_current_span().add_event("deadline.cancelled", attributes)
@@ -0,0 +1,317 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from typing import Collection, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from opentelemetry import metrics
+
+try:
+    from scripts.chunking import ChunkingProfile, chunk_text, get_profile
+except ImportError:  # imported from inside scripts/
+    from chunking import ChunkingProfile, chunk_text, get_profile
+
+
+logger = logging.getLogger(__name__)
+meter = metrics.get_meter(__name__)
+
+documents_checked = meter.create_counter(
+    "ingest_dedupe.documents", description="Documents checked before upload, by result (unique, duplicate, unreadable)."
+)
+embeddings_saved = meter.create_counter(
+    "ingest_dedupe.embeddings_saved", description="Chunks of near-duplicate documents that were not uploaded for embedding."
+)
+
+SKIP, FLAG, OFF = "skip", "flag", "off"
+
+WORD = re.compile(r"\w+")
+
+
+@dataclass(frozen=True)
+class DedupeSettings:
+    """
+    How upload_documents treats near-duplicate documents.
+
+    Documents are compared by the estimated Jaccard similarity of their sets of
+    `shingle_size`-word shingles, from `num_perm` MinHash values split into
+    `bands` LSH bands. Those at or above `threshold` against a document kept
+    earlier in this run, or one already in blob storage that still has a local
+    copy next to it, are left out (`skip`) or uploaded with blob metadata naming
+    the original (`flag`, the default, so uploads only change once skipping is
+    opted into with INGEST_DEDUPE_MODE=skip). Chunks are compared the same way
+    and only ever flagged, since the skillset chunks on the service.
+    """
+
+    mode: str = FLAG
+    threshold: float = 0.85
+    shingle_size: int = 5
+    num_perm: int = 128
+    bands: int = 16
+
+    def __post_init__(self):
+        if self.mode not in (SKIP, FLAG, OFF):
+            raise ValueError(f"mode must be {SKIP}, {FLAG} or {OFF}, not {self.mode!r}")
+        if not 0 < self.threshold <= 1:
+            raise ValueError("threshold must be above 0 and at most 1")
+        if self.shingle_size < 1:
+            raise ValueError("shingle_size must be at least 1")
+        if self.bands < 1 or self.num_perm % self.bands:
+            raise ValueError("num_perm must be a multiple of bands")
+
+    @classmethod
+    def from_env(cls) -> "DedupeSettings":
+        return cls(
+            mode=os.getenv("INGEST_DEDUPE_MODE", FLAG),
+            threshold=float(os.getenv("INGEST_DEDUPE_THRESHOLD", "0.85")),
+            shingle_size=int(os.getenv("INGEST_DEDUPE_SHINGLE_WORDS", "5")),
+            num_perm=int(os.getenv("INGEST_DEDUPE_NUM_PERM", "128")),
+            bands=int(os.getenv("INGEST_DEDUPE_BANDS", "16")),
+        )
+
+
+# ---------- Signatures ----------
+# Universal hashing (a * h + b) mod p over 32-bit shingle hashes; with a, b and h
+# below 2**32 and p = 2**61 - 1 the products never overflow uint64.
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+# Shingles hashed per numpy pass, so a long document doesn't need a shingles x num_perm matrix at once
+BATCH = 4096
+
+
+def shingles(text: str, size: int) -> Set[str]:
+    """Lowercased `size`-word shingles of `text`; a text shorter than that is one shingle."""
+    words = WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items: Set[str]) -> Optional[np.ndarray]:
+        """MinHash signature of `items`, None for an empty set."""
+        if not items:
+            return None
+        hashes = np.fromiter((int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=4).digest(), "little")
+                              for item in items), dtype=np.uint64, count=len(items))
+        signature = np.full(len(self.a), MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), BATCH):
+            batch = hashes[start:start + BATCH, None]
+            permuted = ((batch * self.a + self.b) % MERSENNE_PRIME) & MAX_HASH
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+        return signature
+
+
+def similarity(left: np.ndarray, right: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return float(np.mean(left == right))
+
+
+class LSHIndex:
+    """Signatures bucketed by band, so a lookup only compares against those sharing a band."""
+
+    def __init__(self, num_perm: int, bands: int):
+        self.rows = num_perm // bands
+        self.bands = bands
+        self.buckets: List[Dict[bytes, List[str]]] = [defaultdict(list) for _ in range(bands)]
+        self.signatures: Dict[str, np.ndarray] = {}
+
+    def _keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, key: str, signature: np.ndarray):
+        self.signatures[key] = signature
+        for band, bucket in self._keys(signature):
+            self.buckets[band][bucket].append(key)
+
+    def nearest(self, signature: np.ndarray, threshold: float) -> Optional[Tuple[str, float]]:
+        """The most similar key at or above `threshold`, with its similarity."""
+        candidates = set()
+        for band, bucket in self._keys(signature):
+            candidates.update(self.buckets[band].get(bucket, ()))
+        best = None
+        for key in candidates:
+            score = similarity(signature, self.signatures[key])
+            if score >= threshold and (best is None or score > best[1]):
+                best = (key, score)
+        return best
+
+
+# ---------- Planning ----------
+
+
+def extract_text(path: str) -> Optional[str]:
+    """Text of a .txt/.md/.pdf file, None for anything else."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".txt", ".md"):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+    if extension == ".pdf":
+        from pypdf import PdfReader  # only needed for PDFs
+        return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    return None
+
+
+@dataclass
+class Decision:
+    name: str
+    size: int
+    chunks: int = 0
+    duplicate_of: Optional[str] = None
+    similarity: float = 0.0
+    # Chunks (by index) that repeat a chunk already kept, with the chunk they repeat
+    duplicate_chunks: Dict[int, str] = field(default_factory=dict)
+    readable: bool = True
+
+    def metadata(self) -> Optional[Dict[str, str]]:
+        """Blob metadata flagging what this document duplicates, None when there is nothing to flag."""
+        metadata = {}
+        if self.duplicate_of:
+            metadata["near_duplicate_of"] = self.duplicate_of
+            metadata["similarity"] = f"{self.similarity:.3f}"
+        if self.duplicate_chunks:
+            metadata["duplicate_chunks"] = str(len(self.duplicate_chunks))
+        return metadata or None
+
+
+@dataclass
+class DedupeReport:
+    settings: DedupeSettings
+    decisions: Dict[str, Decision] = field(default_factory=dict)
+
+    def skipped(self, name: str) -> bool:
+        decision = self.decisions.get(name)
+        return self.settings.mode == SKIP and decision is not None and decision.duplicate_of is not None
+
+    @property
+    def duplicates(self) -> List[Decision]:
+        return [d for d in self.decisions.values() if d.duplicate_of]
+
+    @property
+    def bytes_saved(self) -> int:
+        return sum(d.size for d in self.duplicates) if self.settings.mode == SKIP else 0
+
+    @property
+    def embeddings_saved(self) -> int:
+        return sum(d.chunks for d in self.duplicates) if self.settings.mode == SKIP else 0
+
+    @property
+    def duplicate_chunks(self) -> int:
+        return sum(len(d.duplicate_chunks) for d in self.decisions.values() if not d.duplicate_of)
+
+    @property
+    def unreadable(self) -> int:
+        return sum(not d.readable for d in self.decisions.values())
+
+    def summary(self) -> str:
+        action = "skipped" if self.settings.mode == SKIP else "flagged"
+        return (f"Near-duplicate check (threshold {self.settings.threshold:.2f}): {len(self.duplicates)} of "
+                f"{len(self.decisions)} documents {action}, saving {self.embeddings_saved} embeddings and "
+                f"{self.bytes_saved} bytes; {self.duplicate_chunks} chunks of kept documents repeat another chunk; "
+                f"{self.unreadable} without text uploaded unchecked")
+
+    def as_dict(self) -> dict:
+        return {
+            "settings": vars(self.settings),
+            "bytes_saved": self.bytes_saved,
+            "embeddings_saved": self.embeddings_saved,
+            "duplicate_chunks": self.duplicate_chunks,
+            "documents": [{**vars(d), "duplicate_chunks": {str(i): c for i, c in d.duplicate_chunks.items()}}
+                          for d in self.decisions.values()],
+        }
+
+
+def plan(paths: List[str], indexed: Collection[str] = (), settings: DedupeSettings = None,
+         profile: ChunkingProfile = None) -> DedupeReport:
+    """
+    Decide which of `paths` duplicate a document already kept. Files whose name
+    is in `indexed` (already in blob storage) are the reference and never
+    duplicates themselves; blobs without a local copy among `paths` are not
+    compared at all. The rest are taken in order, so of two revisions the one
+    listed first is kept. Chunks come from `profile`, as the skillset cuts them.
+    A file whose text can't be extracted (not text or PDF, or a PDF pypdf
+    can't read) is marked unreadable and uploaded unchecked.
+    """
+    settings = settings or DedupeSettings.from_env()
+    profile = profile or get_profile()
+    report = DedupeReport(settings)
+    if settings.mode == OFF:
+        return report
+
+    hasher = MinHasher(settings.num_perm)
+    documents = LSHIndex(settings.num_perm, settings.bands)
+    chunks = LSHIndex(settings.num_perm, settings.bands)
+    ordered = sorted(paths, key=lambda path: os.path.basename(path) not in indexed)
+    for path in ordered:
+        name = os.path.basename(path)
+        decision = Decision(name, os.path.getsize(path))
+        report.decisions[name] = decision
+        try:
+            text = extract_text(path)
+        except Exception as e:  # encrypted or malformed PDFs, or pypdf missing
+            logger.warning("Could not extract text from %s, uploading it unchecked: %s", name, e)
+            text = None
+        signature = hasher.signature(shingles(text, settings.shingle_size)) if text else None
+        if signature is None:
+            decision.readable = False
+            documents_checked.add(1, {"result": "unreadable"})
+            continue
+
+        pieces = chunk_text(text, profile)
+        decision.chunks = len(pieces)
+        match = documents.nearest(signature, settings.threshold) if name not in indexed else None
+        if match:
+            decision.duplicate_of, decision.similarity = match
+            documents_checked.add(1, {"result": "duplicate"})
+            if settings.mode == SKIP:
+                embeddings_saved.add(decision.chunks)
+            continue
+
+        documents.add(name, signature)
+        documents_checked.add(1, {"result": "unique"})
+        for index, piece in enumerate(pieces):
+            chunk_signature = hasher.signature(shingles(piece, settings.shingle_size))
+            if chunk_signature is None:
+                continue
+            chunk_match = chunks.nearest(chunk_signature, settings.threshold)
+            if chunk_match:
+                decision.duplicate_chunks[index] = chunk_match[0]
+            else:
+                chunks.add(f"{name}#{index}", chunk_signature)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report near-duplicate documents and chunks before upload.")
+    parser.add_argument("data_dir", nargs="?", default="../data")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("INGEST_DEDUPE_THRESHOLD", "0.85")))
+    parser.add_argument("--profile", help="chunking profile (default: AZURE_SEARCH_CHUNKING_PROFILE's)")
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    paths = [entry.path for entry in sorted(os.scandir(args.data_dir), key=lambda entry: entry.name) if entry.is_file()]
+    # Reported as skip would apply it, with the rest of INGEST_DEDUPE_* as ingestion reads it
+    settings = replace(DedupeSettings.from_env(), mode=SKIP, threshold=args.threshold)
+    report = plan(paths, settings=settings, profile=get_profile(args.profile))
+    for decision in report.decisions.values():
+        if decision.duplicate_of:
+            print(f"  {decision.name}: {decision.similarity:.2f} similar to {decision.duplicate_of} "
+                  f"({decision.chunks} chunks, {decision.size} bytes)")
+        elif decision.duplicate_chunks:
+            print(f"  {decision.name}: {len(decision.duplicate_chunks)} of {decision.chunks} chunks repeat another chunk")
+    print(report.summary())
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report.as_dict(), f, indent=2)
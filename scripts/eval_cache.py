@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+
+
+def _sha256(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def agent_fingerprint(agent_client, agent_id: str, functions) -> Dict[str, str]:
+    """
+    What an agent response depends on besides the question: the agent id, its
+    deployed model and instructions (fetched from the service) and the tool
+    schemas we pass with every run.
+    """
+    agent = agent_client.get_agent(agent_id)
+    return {
+        "agent_id": agent_id,
+        "instructions_sha256": _sha256({"model": agent.model, "instructions": agent.instructions}),
+        "tools_sha256": _sha256([definition.as_dict() for definition in functions.definitions]),
+    }
+
+
+class EvalCache:
+    """
+    Agent responses from earlier evaluation runs, keyed on (agent fingerprint, question).
+
+    Stored as a single JSON file so it can be inspected and diffed; only
+    completed runs are cached, so failures are retried on the next evaluation.
+    """
+
+    def __init__(self, path: str, fingerprint: Dict[str, str]):
+        self.path = path
+        self.fingerprint = fingerprint
+        self._entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    def key(self, question: str) -> str:
+        return _sha256({**self.fingerprint, "question": " ".join(question.split())})
+
+    def get(self, question: str) -> Optional[dict]:
+        entry = self._entries.get(self.key(question))
+        return entry["result"] if entry is not None else None
+
+    def put(self, question: str, result: dict):
+        if result.get("error") or result.get("run_status") != "completed":
+            return
+        self._entries[self.key(question)] = {
+            **self.fingerprint,
+            "question": question,
+            "cached_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "result": result,
+        }
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._entries, f, indent=1)
+        os.replace(tmp_path, self.path)
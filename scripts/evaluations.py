@@ -1,33 +1,45 @@
 from azure.ai.evaluation import evaluate, RelevanceEvaluator, AzureOpenAIModelConfiguration
 from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
+from azure.core.exceptions import HttpResponseError
 from azure.ai.agents.models import (
     ToolSet
 )
-from azure.ai.agents.models import FunctionTool
 from azure.keyvault.secrets import SecretClient
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
 import os
-from tools import user_functions
+import random
+import time
+from latency import summarize
+from eval_cache import EvalCache, agent_fingerprint
+from token_broker import get_credential
+from token_footprint import CompactFunctionTool
+from tools import RETRIEVAL_PROFILE, user_functions
 
 
-credential = DefaultAzureCredential(
-    exclude_environment_credential=False,
-    exclude_managed_identity_credential=False,
-    exclude_shared_token_cache_credential=True,   # skip local cache
-    exclude_visual_studio_code_credential=True,
-)
+DATA_PATH = "../evaluation_data/evaluation_data.jsonl"
+OUTPUT_PATH = "../scripts/evaluation.json"
+CACHE_PATH = "../scripts/evaluation_cache.json"
+
+# Process-wide credential with cached, proactively refreshed tokens (AZURE_CREDENTIAL_TYPE)
+credential = get_credential()
 
 key_vault = SecretClient(vault_url=os.getenv("KEYVAULT_URL"), credential=credential)
 
 agents_client = AIProjectClient.from_connection_string(
     key_vault.get_secret("ai-project-conn-string").value,
-    credential=DefaultAzureCredential())
+    credential=credential)
 agent_client = agents_client.agents
 
-functions = FunctionTool(user_functions)
+# Fetched once, not per evaluation row
+AGENT_ID = key_vault.get_secret("agent-id").value
+
+# Tool schemas as main.py sends them (AGENT_TOOL_SCHEMA)
+functions = CompactFunctionTool(user_functions)
 
 toolset = ToolSet()
-toolset.add(functions) 
+toolset.add(functions)
 
 model_config = AzureOpenAIModelConfiguration(
     azure_endpoint=key_vault.get_secret("azure-openai-endpoint").value,
@@ -38,50 +50,207 @@ model_config = AzureOpenAIModelConfiguration(
 
 evaluator = RelevanceEvaluator(model_config=model_config)
 
-def get_agents_response(question):
-    
-    thread = agent_client.create_thread()
-    # print(f"Created thread, ID: {thread.id}")
-    
-    message = agent_client.create_message(
-        thread_id=thread.id,
-        role="user",
-        content=question)
 
-    print(f"Created message, ID: {message.id}")
+class RateLimited(Exception):
+    """The agent service throttled the request; `retry_after` is its hint in seconds, if any."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def raise_rate_limited(call, *args, **kwargs):
+    """`call(*args, **kwargs)`, with a 429 from the agent service raised as RateLimited."""
+    try:
+        return call(*args, **kwargs)
+    except HttpResponseError as e:
+        if e.status_code == 429:
+            retry_after = e.response.headers.get("Retry-After") if e.response is not None else None
+            raise RateLimited(str(e), float(retry_after) if retry_after else None) from e
+        raise
+
+
+def get_agents_response(thread_id, toolset=toolset):
+    """Run the agent on the question already in `thread_id` and return its reply, latency and token usage."""
+    start = time.perf_counter()
+    run = raise_rate_limited(agent_client.create_and_process_run,
+                             thread_id=thread_id, assistant_id=AGENT_ID, toolset=toolset)
+    latency = time.perf_counter() - start
+
+    if run.status == "failed" and run.last_error and run.last_error.code == "rate_limit_exceeded":
+        raise RateLimited(run.last_error.message)
 
-    run = agent_client.create_and_process_run(thread_id = thread.id, assistant_id=key_vault.get_secret("agent-id").value, toolset=toolset)
-    
         # Fetch and log all messages
-    messages = agent_client.list_messages(thread_id=thread.id, run_id= run.id)
-    
+    messages = agent_client.list_messages(thread_id=thread_id, run_id= run.id)
+
     # print(f"Messages: {messages.data[-1]}")
-    
+
     last_msg = messages.get_last_text_message_by_role("assistant")
-    
-    print("Message: ", last_msg.text.value)
 
-    return {"response": last_msg.text.value}
+    reply = last_msg.text.value if last_msg else ""
+    print("Message: ", reply)
+
+    usage = run.usage
+    return {
+        "response": reply,
+        "latency_s": latency,
+        "run_status": run.status,
+        "prompt_tokens": usage.prompt_tokens if usage else None,
+        "completion_tokens": usage.completion_tokens if usage else None,
+        "total_tokens": usage.total_tokens if usage else None,
+    }
+
 
-def eval_run_eval():
+def with_backoff(call, max_retries=5, base_delay=2.0, max_delay=60.0):
+    """Return (call(), attempts), retrying RateLimited with jittered exponential backoff and honouring Retry-After."""
+    for attempt in range(max_retries + 1):
+        try:
+            return call(), attempt + 1
+        except RateLimited as e:
+            if attempt == max_retries:
+                raise
+            delay = e.retry_after or min(max_delay, base_delay * 2 ** attempt)
+            delay = delay * random.uniform(1.0, 1.5)
+            print(f"Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+
+def get_agents_response_with_backoff(question, max_retries=5, base_delay=2.0, max_delay=60.0, toolset=toolset):
+    """
+    Ask `question` on one thread, retrying each throttled call on its own, so
+    the thread and message are created once and only the run is repeated on
+    that thread. `attempts` counts the runs.
+    """
+    thread, _ = with_backoff(lambda: raise_rate_limited(agent_client.create_thread), max_retries, base_delay, max_delay)
+    # print(f"Created thread, ID: {thread.id}")
+    message, _ = with_backoff(lambda: raise_rate_limited(agent_client.create_message, thread_id=thread.id,
+                                                         role="user", content=question),
+                              max_retries, base_delay, max_delay)
+    print(f"Created message, ID: {message.id}")
+
+    result, attempts = with_backoff(lambda: get_agents_response(thread.id, toolset=toolset),
+                                    max_retries, base_delay, max_delay)
+    result["attempts"] = attempts
+    return result
+
+
+def run_agent_responses(data_path, responses_path, concurrency=4, max_retries=5, cache=None, refresh=False,
+                        toolset=toolset):
+    """
+    Run every evaluation question through the agent with up to `concurrency`
+    runs in flight, and write the rows plus responses, latency and token usage to `responses_path`.
+
+    With a `cache`, questions already answered by the same agent, instructions and
+    tool schemas reuse that response; `refresh` runs everything again and overwrites it.
+    `toolset` defaults to the tools with the AGENT_TOOL_SCHEMA schemas.
+    """
+    with open(data_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    def answer(row):
+        question = row.get("question") or row.get("query")
+        cached = cache.get(question) if cache is not None and not refresh else None
+        if cached is not None:
+            return {**row, **cached, "cached": True}
+        try:
+            result = get_agents_response_with_backoff(question, max_retries=max_retries, toolset=toolset)
+        except Exception as e:
+            print(f"Failed to answer {question!r}: {e}")
+            return {**row, "response": "", "error": str(e)}
+        if cache is not None:
+            cache.put(question, result)
+        return {**row, **result, "cached": False}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(answer, rows))
+
+    if cache is not None:
+        cache.save()
+        print(f"Evaluation cache: {sum(r.get('cached', False) for r in results)} reused, "
+              f"{sum(not r.get('cached', False) for r in results)} run through the agent")
+
+    with open(responses_path, "w") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+    return results
+
+
+def latency_report(results):
+    """
+    p50/p95/p99 latency over the questions answered in this run and token
+    totals over all answered ones. Cached rows keep the latency of the run
+    that produced them, so they are only counted.
+    """
+    answered = [r for r in results if "latency_s" in r]
+    return {
+        "questions": len(results),
+        "failed": len(results) - len(answered),
+        "cached": sum(bool(r.get("cached")) for r in results),
+        "latency_s": summarize(r["latency_s"] for r in answered if not r.get("cached")),
+        "prompt_tokens": sum(r["prompt_tokens"] or 0 for r in answered),
+        "completion_tokens": sum(r["completion_tokens"] or 0 for r in answered),
+        "total_tokens": sum(r["total_tokens"] or 0 for r in answered),
+        "per_question": [
+            {
+                "question": r.get("question") or r.get("query"),
+                "latency_s": r.get("latency_s"),
+                "total_tokens": r.get("total_tokens"),
+                "attempts": r.get("attempts"),
+                "cached": r.get("cached"),
+            }
+            for r in results
+        ],
+    }
+
+
+def eval_run_eval(concurrency=4, max_retries=5, use_cache=True, refresh=False):
     """
     Evaluate the model using the given data and column mapping.
+
+    Agent responses are collected first, in parallel, and then scored; the
+    latency distribution is written next to the relevance scores. Responses are
+    reused from the evaluation cache unless the agent, its instructions, the tool
+    schemas or the question changed.
     """
 
+    responses_path = OUTPUT_PATH.replace(".json", "_responses.jsonl")
+    # Tools run in this process, so how they search changes the answers too
+    fingerprint = {**agent_fingerprint(agent_client, AGENT_ID, functions), "retrieval_profile": repr(RETRIEVAL_PROFILE)}
+    cache = EvalCache(CACHE_PATH, fingerprint) if use_cache else None
+    results = run_agent_responses(DATA_PATH, responses_path, concurrency=concurrency, max_retries=max_retries,
+                                  cache=cache, refresh=refresh)
+
     result = evaluate(
-        data = "../evaluation_data/evaluation_data.jsonl",
-        target=get_agents_response,
+        data = responses_path,
         evaluation_name="evaluate_health_agent_score",
         evaluators={
             "relevance": evaluator,
         },
         azure_ai_project=agents_client.scope,
-        output_path=f"../scripts/evaluation.json"
-        
+        output_path=OUTPUT_PATH
+
     )
+
+    latency = latency_report(results)
+    with open(OUTPUT_PATH.replace(".json", "_latency.json"), "w") as f:
+        json.dump(latency, f, indent=2)
+
+    stats = latency["latency_s"]
+    print(f"Latency p50={stats['p50']:.2f}s p95={stats['p95']:.2f}s p99={stats['p99']:.2f}s "
+          f"over {stats['count']} questions run ({latency['cached']} cached), {latency['total_tokens']} tokens")
+
+    result["latency"] = latency
     return result
 
 
 
 if __name__ == '__main__':
-    eval_run_eval()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate the healthcare agent.")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("EVAL_CONCURRENCY", "4")))
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--refresh", action="store_true", help="re-run every question and overwrite the cache")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write the evaluation cache")
+    args = parser.parse_args()
+
+    eval_run_eval(concurrency=args.concurrency, max_retries=args.max_retries,
+                  use_cache=not args.no_cache, refresh=args.refresh)
@@ -0,0 +1,40 @@
+"""
+Create the secondary indexes in patient_schema.INDEXES that the typed patient
+tools seek on (get_patient_by_name, list_patient_cohort).
+
+Idempotent and separate from seeding: indexes that already exist are left
+alone and no rows are added, so a database seeded by an older adding_data.py
+gets them without duplicating its data:
+
+    python patient_indexes.py
+"""
+from patient_schema import INDEXES, TABLE
+
+
+def create_indexes(cursor) -> list:
+    """Create every index in INDEXES the table doesn't have yet; returns the names created."""
+    created = []
+    for index_name, key_columns, included_columns in INDEXES:
+        include = f" INCLUDE ({', '.join(included_columns)})" if included_columns else ""
+        cursor.execute("SELECT 1 FROM sys.indexes WHERE name = ? AND object_id = OBJECT_ID(?)",
+                       index_name, f"dbo.{TABLE}")
+        if cursor.fetchone() is None:
+            cursor.execute(f"CREATE INDEX {index_name} ON {TABLE} ({', '.join(key_columns)}){include}")
+            created.append(index_name)
+    return created
+
+
+if __name__ == "__main__":
+    from contextlib import closing
+
+    from tools import connect_sql
+
+    with closing(connect_sql()) as cnxn:
+        cursor = cnxn.cursor()
+        cursor.execute("SELECT OBJECT_ID(?)", f"dbo.{TABLE}")
+        if cursor.fetchone()[0] is None:
+            raise SystemExit(f"Table {TABLE} does not exist; run adding_data.py to create and seed it.")
+        created = create_indexes(cursor)
+        cnxn.commit()
+    existing = len(INDEXES) - len(created)
+    print(f"Created {', '.join(created) or 'no indexes'}; {existing} already existed.")
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Sequence, Tuple
+
+from opentelemetry import metrics
+
+try:
+    from scripts.patient_schema import MEDICAL_CONDITIONS, MEDICATIONS, TABLE
+except ImportError:  # imported from inside scripts/
+    from patient_schema import MEDICAL_CONDITIONS, MEDICATIONS, TABLE
+
+
+meter = metrics.get_meter(__name__)
+
+cache_requests = meter.create_counter(
+    "patient_cache.requests", description="Typed patient lookups answered from the cache or not, by kind and result."
+)
+
+# Clinical columns only: contact details and address stay out of the model's context
+PROFILE_COLUMNS = (
+    "PatientID", "FirstName", "LastName", "DateOfBirth", "Gender", "MedicalCondition", "Medications", "Allergies",
+    "BloodType", "LastVisitDate", "SmokingStatus", "AlcoholConsumption", "ExerciseFrequency", "Height_cm",
+    "Weight_kg", "BloodPressure", "HeartRate_bpm", "Temperature_C", "Notes",
+)
+# Covered by the condition and medication indexes, so a cohort never touches the table itself
+COHORT_COLUMNS = ("PatientID", "FirstName", "LastName", "DateOfBirth", "MedicalCondition", "Medications")
+
+# Patients sharing a name returned at most; the instructions cap any listing at 30 rows,
+# which list_patient_cohort and the query router's listings both use
+MAX_NAME_MATCHES = 10
+MAX_COHORT_ROWS = 30
+
+PATIENT_CACHE_TTL_SECONDS = float(os.getenv("PATIENT_CACHE_TTL_SECONDS", "300"))
+PATIENT_CACHE_MAX_ENTRIES = int(os.getenv("PATIENT_CACHE_MAX_ENTRIES", "2048"))
+
+
+# ---------- Queries ----------
+# Fixed statements with bound values, so SQL Server compiles one plan per shape
+# and every lookup is a seek on the primary key or one of patient_schema.INDEXES.
+# The row cap is part of the text (TOP n), not a parameter, for the same reason.
+# Names, conditions and medications are VARCHAR columns, and query_sql binds them as VARCHAR
+# (sql_params.input_sizes): an NVARCHAR parameter would convert the column and scan instead.
+
+
+def by_id() -> str:
+    return f"SELECT {', '.join(PROFILE_COLUMNS)} FROM {TABLE} WHERE PatientID = ?"
+
+
+def by_name(first_name: Optional[str]) -> str:
+    """Seek on IX_PatientMedicalData_Name; the first name is optional."""
+    where = "LastName = ? AND FirstName = ?" if first_name else "LastName = ?"
+    return (f"SELECT TOP {MAX_NAME_MATCHES + 1} {', '.join(PROFILE_COLUMNS)} FROM {TABLE} "
+            f"WHERE {where} ORDER BY FirstName, PatientID")
+
+
+def cohort(condition: Optional[str], medication: Optional[str], limit: int) -> str:
+    """Seek on IX_PatientMedicalData_Condition, or IX_PatientMedicalData_Medication without a condition."""
+    where = []
+    if condition:
+        where.append("MedicalCondition = ?")
+    if medication:
+        where.append("Medications = ?")
+    return (f"SELECT TOP {limit + 1} {', '.join(COHORT_COLUMNS)} FROM {TABLE} "
+            f"WHERE {' AND '.join(where)} ORDER BY LastName, FirstName, PatientID")
+
+
+def canonical(value: str, allowed: Sequence[str], kind: str) -> str:
+    """`value` as spelled in the table (case-insensitive match), or ValueError listing the allowed values."""
+    folded = " ".join(value.split()).lower()
+    for candidate in allowed:
+        if candidate.lower() == folded:
+            return candidate
+    raise ValueError(f"unknown {kind} {value!r}; use one of: {', '.join(allowed)}")
+
+
+def canonical_condition(value: str) -> str:
+    return canonical(value, MEDICAL_CONDITIONS, "condition")
+
+
+def canonical_medication(value: str) -> str:
+    return canonical(value, MEDICATIONS, "medication")
+
+
+def format_profile(row: Sequence[Any]) -> str:
+    """One patient as "Column: value" lines; empty values are left out."""
+    return "\n".join(f"{column}: {value}" for column, value in zip(PROFILE_COLUMNS, row)
+                     if value is not None and value != "")
+
+
+def format_matches(rows: Sequence[Sequence[Any]]) -> str:
+    """Several patients sharing a name, one line each with what tells them apart."""
+    positions = [PROFILE_COLUMNS.index(column) for column in COHORT_COLUMNS]
+    return "\n".join(", ".join(f"{COHORT_COLUMNS[i]}: {row[p]}" for i, p in enumerate(positions)) for row in rows)
+
+
+# ---------- Cache ----------
+
+
+class TTLCache:
+    """
+    Thread-safe LRU of at most `max_entries` values that expire `ttl` seconds
+    after they were stored. A ttl of 0 disables it. Patient records change
+    rarely and only through adding_data.py, so a few minutes of staleness is
+    the price of answering repeat lookups within a conversation from memory.
+    """
+
+    def __init__(self, ttl: float = PATIENT_CACHE_TTL_SECONDS, max_entries: int = PATIENT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, kind: str) -> Optional[Any]:
+        value = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    value = entry[1]
+                else:
+                    del self._entries[key]
+        cache_requests.add(1, {"kind": kind, "result": "hit" if value is not None else "miss"})
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Profile rows by PatientID, and the PatientIDs a (first, last) name resolved to
+cache = TTLCache()
+
+
+def name_key(first_name: Optional[str], last_name: str) -> Tuple[str, str, str]:
+    return ("name", " ".join((first_name or "").split()).lower(), " ".join(last_name.split()).lower())
+
+
+def cached_profiles(patient_ids: List[int]) -> Optional[List[Sequence[Any]]]:
+    """Profile rows for every id from the cache, or None if any has expired."""
+    rows = []
+    for patient_id in patient_ids:
+        row = cache.get(("id", patient_id), "id")
+        if row is None:
+            return None
+        rows.append(row)
+    return rows
+
+
+def remember(rows: List[Sequence[Any]], key: Hashable = None):
+    """Cache profile rows by id and, with a name `key`, the ids that name resolved to."""
+    for row in rows:
+        cache.put(("id", row[0]), tuple(row))
+    if key is not None:
+        cache.put(key, [row[0] for row in rows])
@@ -0,0 +1,35 @@
+"""Shape of the PatientMedicalData table that scripts/adding_data.py creates and seeds."""
+
+TABLE = "PatientMedicalData"
+
+# Categorical values adding_data.py draws from. The seed data also contains the
+# string "None" and NULL in both columns, meaning no condition/medication.
+MEDICAL_CONDITIONS = (
+    "Hypertension",
+    "Type 2 Diabetes",
+    "Asthma",
+    "Migraine",
+    "Anxiety",
+    "Depression",
+    "Arthritis",
+    "Hyperlipidemia",
+)
+
+MEDICATIONS = (
+    "Lisinopril",
+    "Metformin",
+    "Albuterol",
+    "Ibuprofen",
+    "Sertraline",
+    "Acetaminophen",
+    "Aspirin",
+    "Atorvastatin",
+)
+
+# Secondary indexes for the typed patient tools' lookups, as (name, key columns, included columns).
+# The clustered primary key on PatientID serves lookups by id.
+INDEXES = (
+    ("IX_PatientMedicalData_Name", ("LastName", "FirstName"), ()),
+    ("IX_PatientMedicalData_Condition", ("MedicalCondition", "Medications"), ("FirstName", "LastName", "DateOfBirth")),
+    ("IX_PatientMedicalData_Medication", ("Medications",), ("FirstName", "LastName", "DateOfBirth", "MedicalCondition")),
+)
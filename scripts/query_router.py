@@ -0,0 +1,207 @@
+import logging
+import os
+import re
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from opentelemetry import metrics, trace
+
+try:
+    from scripts import patient_queries, tools
+    from scripts.patient_schema import MEDICAL_CONDITIONS, MEDICATIONS, TABLE
+    from scripts.sql_params import input_sizes
+except ImportError:  # imported from inside scripts/
+    import patient_queries
+    import tools
+    from patient_schema import MEDICAL_CONDITIONS, MEDICATIONS, TABLE
+    from sql_params import input_sizes
+
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+meter = metrics.get_meter(__name__)
+
+turn_duration = meter.create_histogram(
+    "chat.turn.duration", unit="s", description="Time to answer a chat message, by path (routed or agent)."
+)
+decisions = meter.create_counter(
+    "query_router.decisions", description="Router outcomes: routed, fallback (not a known query shape) or error."
+)
+
+ENABLED = os.getenv("QUERY_ROUTER_ENABLED", "1") == "1"
+# Same cap as list_patient_cohort, which the instructions hold every listing to
+LIST_LIMIT = patient_queries.MAX_COHORT_ROWS
+
+# Everyday phrasings of the values in the table
+SYNONYMS = {
+    "high blood pressure": "Hypertension",
+    "diabetes": "Type 2 Diabetes",
+    "t2d": "Type 2 Diabetes",
+    "high cholesterol": "Hyperlipidemia",
+    "migraines": "Migraine",
+    "paracetamol": "Acetaminophen",
+    "tylenol": "Acetaminophen",
+    "lipitor": "Atorvastatin",
+    "zoloft": "Sertraline",
+}
+
+COUNT, LIST = "count", "list"
+CONDITION, MEDICATION = "condition", "medication"
+
+# The only words a routed question may contain besides one condition and one
+# medication. Anything else (an age, a city, "oldest", "most common", "not",
+# "or", another column) may be a filter or a question the two-column query
+# can't answer, so the whole question goes to the agent instead.
+INTENT_PHRASES = {
+    "how many": COUNT, "number of": COUNT, "count": COUNT,
+    "list": LIST, "show": LIST, "which": LIST, "who": LIST, "name": LIST, "find": LIST, "give": LIST,
+}
+STOP_WORDS = frozenset("""
+    a all and any are be being currently database diagnosed do does for from has have having in is me
+    of on our please prescribed suffer suffering take takes taking that the there treated us what with
+    patient patients
+""".split())
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def _phrases():
+    """(words, kind, value) for every phrase a question may contain, longest first."""
+    phrases = [(tuple(WORD.findall(phrase)), kind, kind) for phrase, kind in INTENT_PHRASES.items()]
+    for kind, values in ((CONDITION, MEDICAL_CONDITIONS), (MEDICATION, MEDICATIONS)):
+        phrases += [(tuple(WORD.findall(value.lower())), kind, value) for value in values]
+        phrases += [(tuple(WORD.findall(phrase)), kind, value) for phrase, value in SYNONYMS.items()
+                    if value in values]
+    return sorted(phrases, key=lambda phrase: -len(phrase[0]))
+
+
+PHRASES = _phrases()
+
+
+@dataclass
+class Route:
+    intent: str  # count | list
+    condition: Optional[str] = None
+    medication: Optional[str] = None
+
+    def query(self) -> Tuple[str, list]:
+        """Parameterized SQL for this route and its parameters."""
+        where, params = [], []
+        for column, value in (("MedicalCondition", self.condition), ("Medications", self.medication)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if self.intent == COUNT:
+            select = "SELECT COUNT(*) AS PatientCount"
+            order = ""
+        else:
+            select = "SELECT PatientID, FirstName, LastName, DateOfBirth, MedicalCondition, Medications"
+            order = " ORDER BY LastName, FirstName"
+        return f"{select} FROM {TABLE} WHERE {' AND '.join(where)}{order}", params
+
+    def describe(self) -> str:
+        parts = []
+        if self.condition:
+            parts.append(f"have {self.condition}")
+        if self.medication:
+            parts.append(f"are prescribed {self.medication}")
+        return " and ".join(parts)
+
+
+def _tokens(words: List[str]) -> Optional[List[Tuple[str, str]]]:
+    """(kind, value) for each phrase in `words`, longest match first; None if a word is in no phrase."""
+    tokens, i = [], 0
+    while i < len(words):
+        for phrase, kind, value in PHRASES:
+            if tuple(words[i:i + len(phrase)]) == phrase:
+                tokens.append((kind, value))
+                i += len(phrase)
+                break
+        else:
+            if words[i] not in STOP_WORDS:
+                return None
+            i += 1
+    return tokens
+
+
+def classify(question: str) -> Optional[Route]:
+    """
+    Recognize "how many / which patients have <condition> [and take <medication>]".
+
+    Every word has to be an intent phrase, a known condition or medication (or
+    a synonym of one) or a stop word, with at most one condition and one
+    medication; a count phrase wins over a list word ("how many patients who
+    ..."). Anything else returns None and the question goes to the agent.
+    """
+    tokens = _tokens(WORD.findall(question.lower()))
+    if not tokens:
+        return None
+    found = {kind: {value for k, value in tokens if k == kind} for kind in (CONDITION, MEDICATION)}
+    intents = {kind for kind, _ in tokens if kind in (COUNT, LIST)}
+    if not intents or not (found[CONDITION] or found[MEDICATION]):
+        return None
+    if len(found[CONDITION]) > 1 or len(found[MEDICATION]) > 1:
+        return None  # "Hypertension and Asthma" means both, which no row has; not worth guessing
+    return Route(COUNT if COUNT in intents else LIST,
+                 next(iter(found[CONDITION]), None), next(iter(found[MEDICATION]), None))
+
+
+def run_route(route: Route) -> str:
+    """Run the route's query and format the answer as markdown."""
+    sql, params = route.query()
+
+    def execute():
+        with closing(tools.connect_sql()) as connection:
+            cursor = connection.cursor()
+            cursor.setinputsizes(input_sizes(params))  # VARCHAR, so the condition/medication indexes are sought
+            cursor.execute(sql, params)
+            return [column[0] for column in cursor.description], cursor.fetchmany(LIST_LIMIT + 1)
+
+    columns, rows = tools.sql_backend.call(execute, is_failure=tools.is_sql_outage)
+
+    if route.intent == COUNT:
+        return f"Patients who {route.describe()}: **{rows[0][0]}**"
+
+    if not rows:
+        return f"No patients {route.describe()}."
+    shown = rows[:LIST_LIMIT]
+    lines = [
+        f"Patients who {route.describe()}"
+        + (f" (first {LIST_LIMIT}):" if len(rows) > LIST_LIMIT else f" ({len(rows)}):"),
+        "",
+        "| " + " | ".join(columns) + " |",
+        "|" + "---|" * len(columns),
+    ]
+    lines += ["| " + " | ".join("" if v is None else str(v) for v in row) + " |" for row in shown]
+    return "\n".join(lines)
+
+
+@tracer.start_as_current_span("query_router")  # type: ignore
+def try_answer(question: str) -> Optional[str]:
+    """Answer `question` directly if it matches a known query shape word for word, else None (use the agent)."""
+    if not ENABLED:
+        return None
+    span = trace.get_current_span()
+    route = classify(question)
+    span.set_attribute("router.matched", route is not None)
+    if route is None:
+        decisions.add(1, {"decision": "fallback"})
+        return None
+
+    span.set_attribute("router.intent", route.intent)
+    try:
+        answer = run_route(route)
+    except Exception as e:
+        # The agent can still try (and explain) if the direct query fails
+        logger.warning("Routed query failed, falling back to the agent: %s", e)
+        decisions.add(1, {"decision": "error"})
+        return None
+    decisions.add(1, {"decision": "routed", "intent": route.intent})
+    return answer
+
+
+def record_turn(path: str, start: float):
+    """Record chat.turn.duration for a message answered via `path` (routed or agent) that began at `start`."""
+    turn_duration.record(time.perf_counter() - start, {"path": path})
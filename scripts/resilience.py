@@ -0,0 +1,269 @@
+import contextvars
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from opentelemetry import metrics, trace
+
+try:
+    from scripts.latency import percentile
+    from scripts import deadline as request_deadline
+except ImportError:  # imported from inside scripts/
+    from latency import percentile
+    import deadline as request_deadline
+
+
+meter = metrics.get_meter(__name__)
+
+breaker_transitions = meter.create_counter(
+    "resilience.breaker.transitions", description="Circuit breaker state changes, by backend and new state."
+)
+short_circuited = meter.create_counter(
+    "resilience.breaker.rejected", description="Calls failed fast because the backend's breaker was open."
+)
+attempts_counter = meter.create_counter(
+    "resilience.attempts", description="Backend attempts, by backend, kind (first, retry, hedge) and outcome."
+)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Attempts run here so a caller can give up at its deadline (or on the first hedge to answer)
+# without waiting for a slow backend call to return.
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="backend-call")
+
+
+class BackendUnavailable(Exception):
+    """The backend's breaker is open, or it kept failing until the deadline."""
+
+    def __init__(self, backend: str, reason: str, retry_after: float = 0.0):
+        super().__init__(f"{backend} unavailable: {reason}")
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def to_result(self) -> str:
+        """Structured tool output telling the model not to retry right away."""
+        return json.dumps({
+            "status": "backend_unavailable",
+            "backend": self.backend,
+            "reason": self.reason,
+            "retry_after_seconds": round(self.retry_after),
+            "message": f"The {self.backend} service is temporarily unavailable. Do not call this tool again "
+                       "for this request; answer with what you have and say this source could not be reached.",
+        })
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker. `failure_threshold` consecutive failures open it;
+    after `reset_timeout` seconds one probe call is let through (half-open), and its
+    outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        self.state = state
+        breaker_transitions.add(1, {"backend": self.name, "state": state})
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.retry_after() == 0.0:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def release(self):
+        """The call was abandoned (request cancelled) without a verdict; let another probe through."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+
+@dataclass
+class Policy:
+    deadline_s: float = 15.0
+    retries: int = 2
+    base_delay_s: float = 0.2
+    max_delay_s: float = 2.0
+    # Hedging: send a second copy once the first has taken longer than the recent
+    # p`hedge_percentile` latency. Only for idempotent reads.
+    hedge: bool = False
+    hedge_percentile: float = 95.0
+    hedge_min_s: float = 0.05
+    failure_threshold: int = 5
+    reset_timeout_s: float = 30.0
+
+
+class Backend:
+    """A remote dependency (Azure Search, SQL, SerpAPI...) with its breaker, policy and recent latencies."""
+
+    def __init__(self, name: str, policy: Policy = None):
+        self.name = name
+        self.policy = policy or Policy()
+        self.breaker = CircuitBreaker(name, self.policy.failure_threshold, self.policy.reset_timeout_s)
+        self._latencies = deque(maxlen=200)
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.policy.hedge or len(self._latencies) < 20:
+            return None
+        return max(self.policy.hedge_min_s, percentile(list(self._latencies), self.policy.hedge_percentile))
+
+    def _submit(self, fn, kind: str):
+        context = contextvars.copy_context()  # keep the tool span as the parent inside the worker thread
+        start = time.perf_counter()
+
+        def run():
+            try:
+                result = context.run(fn)
+            except BaseException:
+                attempts_counter.add(1, {"backend": self.name, "kind": kind, "outcome": "error"})
+                raise
+            self._latencies.append(time.perf_counter() - start)
+            attempts_counter.add(1, {"backend": self.name, "kind": kind, "outcome": "ok"})
+            return result
+
+        return _executor.submit(run)
+
+    def _attempt(self, fn, kind: str, deadline: float, hedge: bool = True):
+        """One logical attempt, hedged if enabled. Returns the first successful result or raises."""
+        pending = {self._submit(fn, kind)}
+        hedge_at = self.hedge_delay() if hedge else None
+        hedged = False
+        error = None
+        request = request_deadline.current()
+        # Wake up as soon as the request is cancelled, not at the next timeout
+        watch = {request.future} if request is not None else set()
+        while pending:
+            if request is not None:
+                request.check()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{self.name} did not answer within {self.policy.deadline_s:.0f}s")
+            timeout = remaining if hedged or hedge_at is None else min(remaining, hedge_at)
+            done, pending = wait(pending | watch, timeout=timeout, return_when=FIRST_COMPLETED)
+            if watch & done:
+                request.check()
+            pending -= watch
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            if not hedged and hedge_at is not None and not done:
+                hedged = True
+                trace.get_current_span().add_event("resilience.hedge", {"backend": self.name})
+                pending.add(self._submit(fn, "hedge"))
+        raise error
+
+    def call(self, fn: Callable[[], object], is_failure: Callable[[BaseException], bool] = None,
+             hedge: bool = True):
+        """
+        Run `fn` under this backend's breaker, retry and hedging policy.
+
+        `hedge=False` never sends a second copy of this call, even when the
+        policy hedges, for requests that are billed or rate-limited per call.
+        Exceptions for which `is_failure` returns False (e.g. a bad SQL statement) are
+        raised straight away without retrying or counting against the breaker.
+        Raises BackendUnavailable when the breaker is open or attempts run out, and
+        deadline.Cancelled when the request being served is cancelled or out of time;
+        the call's own deadline never runs past the request's.
+        """
+        request = request_deadline.current()
+        if request is not None:
+            request.check()
+        if not self.breaker.allow():
+            short_circuited.add(1, {"backend": self.name})
+            raise BackendUnavailable(self.name, "circuit open", self.breaker.retry_after())
+
+        policy = self.policy
+        deadline = time.monotonic() + policy.deadline_s
+        if request is not None:
+            deadline = min(deadline, request.expires_at)
+        started = time.perf_counter()
+        try:
+            return self._call(fn, is_failure, deadline, hedge)
+        except request_deadline.Cancelled as e:
+            # Neither a success nor a failure of the backend: it just isn't needed any more
+            self.breaker.release()
+            request_deadline.record_cancelled("backend", self.name, e.reason, started)
+            raise
+
+    def _call(self, fn, is_failure, deadline: float, hedge: bool = True):
+        policy = self.policy
+        request = request_deadline.current()
+        last_error = None
+        for attempt in range(policy.retries + 1):
+            try:
+                result = self._attempt(fn, "retry" if attempt else "first", deadline, hedge)
+            except Exception as e:
+                if request is not None:
+                    request.check()  # a timeout at the request's deadline is not the backend's fault
+                if is_failure is not None and not is_failure(e):
+                    self.breaker.record_success()  # the backend answered; the request was bad
+                    raise
+                self.breaker.record_failure()
+                last_error = e
+                # Full jitter, and only if the sleep still leaves time for another try
+                delay = random.uniform(0, min(policy.max_delay_s, policy.base_delay_s * 2 ** attempt))
+                if attempt == policy.retries or time.monotonic() + delay >= deadline:
+                    break
+                if not self.breaker.allow():
+                    break
+                if request is not None:
+                    request.sleep(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+        if self.breaker.state == OPEN:
+            raise BackendUnavailable(self.name, f"circuit open after {type(last_error).__name__}: {last_error}",
+                                     self.breaker.retry_after()) from last_error
+        raise BackendUnavailable(self.name, f"{type(last_error).__name__}: {last_error}") from last_error
+
+
+_backends: Dict[str, Backend] = {}
+_backends_lock = threading.Lock()
+
+
+def backend(name: str, **policy) -> Backend:
+    """Process-wide Backend for `name`, created with the given Policy fields on first use."""
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = Backend(name, Policy(**policy))
+        return _backends[name]
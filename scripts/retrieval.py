@@ -0,0 +1,91 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+VECTOR, KEYWORD, HYBRID = "vector", "keyword", "hybrid"
+
+# Field names in the guidelines index as the search tool queries it
+TEXT_FIELD = "content"
+VECTOR_FIELD = "content_vector"
+# The semantic configuration setup_index creates
+SEMANTIC_CONFIGURATION = "default"
+
+
+@dataclass(frozen=True)
+class RetrievalProfile:
+    """
+    How search_acc_guidelines queries the index.
+
+    `mode` picks BM25 (`keyword`), nearest neighbours of the query embedding
+    (`vector`, `k` of them) or both fused by the service (`hybrid`); keyword
+    queries skip the embedding call altogether. `semantic` re-ranks the
+    candidates with the semantic ranker, which only sees the first 50, so a
+    semantic profile wants `k` of up to 50 and a smaller `top`. `count` asks for
+    the total match count, which the tool never reads.
+    """
+
+    name: str
+    mode: str = HYBRID
+    k: int = 10
+    top: int = 10
+    semantic: bool = False
+    count: bool = False
+
+    def __post_init__(self):
+        if self.mode not in (VECTOR, KEYWORD, HYBRID):
+            raise ValueError(f"mode must be vector, keyword or hybrid, not {self.mode!r}")
+        if self.k < 1 or self.top < 1:
+            raise ValueError("k and top must be at least 1")
+
+    @property
+    def needs_embedding(self) -> bool:
+        return self.mode != KEYWORD
+
+    def describe(self) -> str:
+        parts = [self.mode]
+        if self.needs_embedding:
+            parts.append(f"k={self.k}")
+        parts.append(f"top={self.top}")
+        if self.semantic:
+            parts.append("semantic")
+        if self.count:
+            parts.append("count")
+        return " ".join(parts)
+
+    def search_options(self, query: str, vector: Optional[List[float]] = None) -> dict:
+        """Keyword arguments for SearchClient.search; `vector` is the query embedding when needs_embedding."""
+        from azure.search.documents.models import VectorizedQuery
+
+        options = {"top": self.top, "include_total_count": self.count}
+        if self.mode != VECTOR:
+            options.update(search_text=query, search_fields=[TEXT_FIELD])
+        if self.needs_embedding:
+            options["vector_queries"] = [VectorizedQuery(vector=vector, k_nearest_neighbors=self.k, fields=VECTOR_FIELD)]
+        if self.semantic:
+            options.update(query_type="semantic", semantic_configuration_name=SEMANTIC_CONFIGURATION)
+            if self.mode == VECTOR:
+                options["semantic_query"] = query  # the ranker needs text to compare the candidates with
+        return options
+
+
+PROFILES = {profile.name: profile for profile in [
+    # What search_acc_guidelines always sent
+    RetrievalProfile("legacy", mode=HYBRID, k=10, top=10, count=True),
+    RetrievalProfile("hybrid", mode=HYBRID, k=10, top=10),
+    RetrievalProfile("hybrid-top5", mode=HYBRID, k=10, top=5),
+    RetrievalProfile("hybrid-semantic", mode=HYBRID, k=50, top=5, semantic=True),
+    RetrievalProfile("vector", mode=VECTOR, k=10, top=10),
+    RetrievalProfile("keyword", mode=KEYWORD, top=10),
+    RetrievalProfile("keyword-semantic", mode=KEYWORD, top=5, semantic=True),
+]}
+DEFAULT_PROFILE = "legacy"
+
+
+def get_profile(name: str = None) -> RetrievalProfile:
+    """The profile called `name`, or SEARCH_RETRIEVAL_PROFILE's (default: legacy)."""
+    name = name or os.getenv("SEARCH_RETRIEVAL_PROFILE", DEFAULT_PROFILE)
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"unknown retrieval profile {name!r}; choose from {', '.join(PROFILES)}") from None
@@ -0,0 +1,194 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+from opentelemetry import context, metrics, trace
+
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+meter = metrics.get_meter(__name__)
+
+run_duration = meter.create_histogram(
+    "agent.run.duration", unit="s", description="Agent run time from creation to completion, as seen by the service."
+)
+run_phase_duration = meter.create_histogram(
+    "agent.run.phase.duration", unit="s", description="Agent run time split into queue, model and tool phases."
+)
+run_steps = meter.create_histogram(
+    "agent.run.steps", description="Run steps per agent run, by step type."
+)
+run_tokens = meter.create_counter(
+    "agent.run.tokens", description="Tokens consumed by agent runs, by token type."
+)
+
+
+@dataclass
+class RunStepTiming:
+    type: str
+    status: str
+    duration_s: float
+    tools: List[str] = field(default_factory=list)
+
+
+@dataclass
+class RunTiming:
+    """
+    Where the time in one agent run went.
+
+    queue_s is creation to start. tool_s adds up the tool_calls steps, which
+    run from the model asking for a tool until we submit its output, so they
+    include our polling delay. model_s is whatever is left of the run.
+    The service reports whole seconds, so treat sub-second splits as approximate.
+    """
+    run_id: str
+    status: str
+    queue_s: float = 0.0
+    total_s: float = 0.0
+    model_s: float = 0.0
+    tool_s: float = 0.0
+    client_s: Optional[float] = None
+    model_steps: int = 0
+    tool_steps: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    steps: List[RunStepTiming] = field(default_factory=list)
+
+
+def _seconds(start, end) -> float:
+    if start is None or end is None:
+        return 0.0
+    if isinstance(start, datetime):
+        return max(0.0, (end - start).total_seconds())
+    return max(0.0, float(end) - float(start))
+
+
+def _finished_at(obj):
+    for attr in ("completed_at", "failed_at", "cancelled_at", "expired_at"):
+        value = getattr(obj, attr, None)
+        if value is not None:
+            return value
+    return None
+
+
+def _name(value) -> str:
+    """"completed" rather than "RunStatus.COMPLETED" for the SDK's str enums."""
+    return str(getattr(value, "value", value))
+
+
+def list_all_run_steps(agent_client, run):
+    """Every step of `run`, oldest first, following the list's pages."""
+    after = None
+    while True:
+        page = agent_client.list_run_steps(thread_id=run.thread_id, run_id=run.id, order="asc", limit=100,
+                                           **({"after": after} if after else {}))
+        yield from page.data
+        if not getattr(page, "has_more", False) or not page.data:
+            return
+        after = getattr(page, "last_id", None) or page.data[-1].id
+
+
+def collect_run_timing(agent_client, run, client_s: float = None) -> RunTiming:
+    """Pull the run's steps and work out its queue/model/tool breakdown and token usage."""
+    timing = RunTiming(run_id=run.id, status=_name(run.status), client_s=client_s)
+    timing.queue_s = _seconds(run.created_at, run.started_at)
+    timing.total_s = _seconds(run.created_at, _finished_at(run))
+
+    for step in list_all_run_steps(agent_client, run):
+        duration = _seconds(step.created_at, _finished_at(step))
+        tools = []
+        if step.type == "tool_calls":
+            timing.tool_steps += 1
+            timing.tool_s += duration
+            for call in getattr(step.step_details, "tool_calls", None) or []:
+                function = getattr(call, "function", None)
+                tools.append(function.name if function is not None else _name(call.type))
+        else:
+            timing.model_steps += 1
+        timing.steps.append(RunStepTiming(type=_name(step.type), status=_name(step.status), duration_s=duration,
+                                          tools=tools))
+
+    active = _seconds(run.started_at, _finished_at(run))
+    timing.model_s = max(0.0, active - timing.tool_s)
+
+    if run.usage:
+        timing.prompt_tokens = run.usage.prompt_tokens or 0
+        timing.completion_tokens = run.usage.completion_tokens or 0
+        timing.total_tokens = run.usage.total_tokens or 0
+    return timing
+
+
+def record_run_timing(timing: RunTiming, span=None):
+    """Emit the breakdown as events on `span` (default: the current span) and as metrics."""
+    span = span or trace.get_current_span()
+    span.add_event("agent.run.timing", {
+        "run_id": timing.run_id,
+        "status": timing.status,
+        "queue_s": timing.queue_s,
+        "model_s": timing.model_s,
+        "tool_s": timing.tool_s,
+        "total_s": timing.total_s,
+        "client_s": timing.client_s if timing.client_s is not None else -1.0,
+        "model_steps": timing.model_steps,
+        "tool_steps": timing.tool_steps,
+        "prompt_tokens": timing.prompt_tokens,
+        "completion_tokens": timing.completion_tokens,
+    })
+    for index, step in enumerate(timing.steps):
+        span.add_event("agent.run.step", {
+            "index": index, "type": step.type, "status": step.status,
+            "duration_s": step.duration_s, "tools": step.tools,
+        })
+
+    attributes = {"status": timing.status}
+    run_duration.record(timing.total_s, attributes)
+    for phase_name in ("queue", "model", "tool"):
+        run_phase_duration.record(getattr(timing, f"{phase_name}_s"), {**attributes, "phase": phase_name})
+    run_steps.record(timing.model_steps, {"type": "message_creation"})
+    run_steps.record(timing.tool_steps, {"type": "tool_calls"})
+    run_tokens.add(timing.prompt_tokens, {"type": "prompt"})
+    run_tokens.add(timing.completion_tokens, {"type": "completion"})
+
+
+def record_in_background(agent_client, run, client_s: float = None):
+    """Collect and record a run's timing on a daemon thread, as a child of the current span."""
+    parent = context.get_current()
+
+    def work():
+        try:
+            timing = collect_run_timing(agent_client, run, client_s)
+            with tracer.start_as_current_span("agent_run_timing", context=parent) as span:
+                record_run_timing(timing, span)
+        except Exception as e:
+            logger.warning("Could not collect timing for run %s: %s", run.id, e)
+
+    threading.Thread(target=work, name="agent-run-timing", daemon=True).start()
+
+
+def format_run_timing(timing: RunTiming) -> str:
+    """Markdown summary for the Chainlit debug panel."""
+    lines = [
+        "| | seconds |",
+        "|---|---:|",
+        f"| Queued | {timing.queue_s:.2f} |",
+        f"| Model ({timing.model_steps} steps) | {timing.model_s:.2f} |",
+        f"| Tools ({timing.tool_steps} steps) | {timing.tool_s:.2f} |",
+        f"| Run total | {timing.total_s:.2f} |",
+    ]
+    if timing.client_s is not None:
+        lines.append(f"| Client wall time | {timing.client_s:.2f} |")
+    lines += [
+        "",
+        f"Tokens: {timing.prompt_tokens} prompt + {timing.completion_tokens} completion = {timing.total_tokens}",
+        "",
+        "| # | step | status | seconds | tools |",
+        "|---:|---|---|---:|---|",
+    ]
+    lines += [
+        f"| {i} | {s.type} | {s.status} | {s.duration_s:.2f} | {', '.join(s.tools)} |"
+        for i, s in enumerate(timing.steps, 1)
+    ]
+    return "\n".join(lines)
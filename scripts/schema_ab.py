@@ -0,0 +1,106 @@
+"""
+A/B of the tool schema variants in token_footprint.py on the evaluation set.
+
+Every pass sends each evaluation question through the agent once per variant,
+with the same agent and instructions, then scores the answers with the same
+relevance evaluator as evaluations.py:
+
+    python schema_ab.py --variants full,compact,minimal --repeat 2
+
+Only the tool schemas sent with each run differ, so differences in prompt
+tokens are the schema savings times the model calls per run. The variant
+order is rotated every pass to spread drift in service latency across them.
+A variant passes when its mean relevance is within --max-relevance-drop of the
+first (baseline) variant's.
+"""
+import argparse
+import json
+import os
+from typing import Dict, List
+
+from azure.ai.agents.models import ToolSet
+from azure.ai.evaluation import evaluate
+
+from evaluations import DATA_PATH, OUTPUT_PATH, evaluator, latency_report, run_agent_responses
+from latency import summarize
+from token_footprint import CompactFunctionTool, definition_tokens, get_variant
+from tools import user_functions
+
+
+def toolset_for(variant_name: str) -> ToolSet:
+    toolset = ToolSet()
+    toolset.add(CompactFunctionTool(user_functions, get_variant(variant_name)))
+    return toolset
+
+
+def relevance(responses_path: str) -> Dict[str, float]:
+    """Aggregate relevance metrics for the answers in `responses_path` (not logged to the project)."""
+    result = evaluate(data=responses_path, evaluators={"relevance": evaluator})
+    return {name: value for name, value in result["metrics"].items() if name.startswith("relevance.")}
+
+
+def run(variants: List[str], repeat: int, concurrency: int, max_retries: int, output_dir: str) -> Dict[str, dict]:
+    toolsets = {name: toolset_for(name) for name in variants}
+    results = {name: [] for name in variants}
+    paths = {name: [] for name in variants}
+    for attempt in range(repeat):
+        shift = attempt % len(variants)
+        for name in variants[shift:] + variants[:shift]:
+            path = os.path.join(output_dir, f"schema_ab_{name}_{attempt}.jsonl")
+            print(f"Pass {attempt + 1}/{repeat}: {name}")
+            results[name].extend(run_agent_responses(DATA_PATH, path, concurrency=concurrency,
+                                                     max_retries=max_retries, toolset=toolsets[name]))
+            paths[name].append(path)
+
+    rows = {}
+    for name in variants:
+        answered = [r for r in results[name] if "latency_s" in r]
+        scores = [relevance(path) for path in paths[name]]
+        rows[name] = {
+            "description": get_variant(name).describe(),
+            "schema_tokens": sum(definition_tokens(d.as_dict()) for d in toolsets[name].definitions),
+            "latency": latency_report(results[name]),
+            "prompt_tokens_per_question": summarize(r["prompt_tokens"] or 0 for r in answered),
+            "relevance": {metric: sum(score[metric] for score in scores) / len(scores) for metric in scores[0]},
+        }
+        del rows[name]["latency"]["per_question"]
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", default="full,compact", help="schema variants; the first is the baseline")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the evaluation set")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("EVAL_CONCURRENCY", "4")))
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--max-relevance-drop", type=float, default=0.1,
+                        help="largest drop in mean relevance (1-5 scale) a variant may show against the baseline")
+    parser.add_argument("--output", default=OUTPUT_PATH.replace(".json", "_schema_ab.json"))
+    args = parser.parse_args()
+
+    variants = args.variants.split(",")
+    for name in variants:
+        get_variant(name)  # fail on a typo before any run
+    rows = run(variants, args.repeat, args.concurrency, args.max_retries, os.path.dirname(args.output))
+
+    baseline = rows[variants[0]]
+    base_prompt = baseline["prompt_tokens_per_question"]["mean"]
+    base_relevance = baseline["relevance"].get("relevance.relevance", 0.0)
+    for name, row in rows.items():
+        latency = row["latency"]["latency_s"]
+        prompt = row["prompt_tokens_per_question"]["mean"]
+        score = row["relevance"].get("relevance.relevance", 0.0)
+        row["prompt_tokens_saved_per_question"] = base_prompt - prompt
+        row["relevance_change"] = score - base_relevance
+        row["passes"] = score >= base_relevance - args.max_relevance_drop and not row["latency"]["failed"]
+        print(f"  {name:<10} p50 {latency['p50']:6.2f}s  p95 {latency['p95']:6.2f}s  "
+              f"prompt tokens/question {prompt:8.0f} ({base_prompt - prompt:+.0f} saved)  "
+              f"relevance {score:.2f} ({score - base_relevance:+.2f})  {'ok' if row['passes'] else 'REJECT'}")
+
+    with open(args.output, "w") as f:
+        json.dump({"config": vars(args), "variants": rows}, f, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from opentelemetry import metrics
+
+
+meter = metrics.get_meter(__name__)
+
+store_duration = meter.create_histogram(
+    "session_store.duration", unit="s", description="Session store operation latency, by backend and operation."
+)
+
+# sqlite:///relative/path.db, sqlite:////absolute/path.db, redis://host:6379/0 or rediss://...
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "sqlite:///sessions.db")
+# Sessions untouched for this long are forgotten
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+class SQLiteSessionStore:
+    """
+    Session state in a local SQLite file, shared by every worker process on the host.
+
+    WAL mode lets readers and the single writer work concurrently; each thread
+    keeps its own connection.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, ttl: int = SESSION_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT state FROM sessions WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, state: dict):
+        self._connect().execute(
+            "INSERT INTO sessions (key, state, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at",
+            (key, json.dumps(state), time.time() + self.ttl),
+        )
+
+    def delete(self, key: str):
+        self._connect().execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+
+class RedisSessionStore:
+    """Session state in Redis (or anything speaking its protocol), for workers spread across hosts."""
+
+    backend = "redis"
+
+    def __init__(self, url: str, ttl: int = SESSION_TTL_SECONDS, prefix: str = "session:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("SESSION_STORE_URL points at Redis but the redis package is not installed") from e
+        self.client = redis.Redis.from_url(url, socket_timeout=2.0, socket_connect_timeout=2.0)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value else None
+
+    def set(self, key: str, state: dict):
+        self.client.set(self.prefix + key, json.dumps(state), ex=self.ttl)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+
+class SessionStore:
+    """Times every call on the wrapped backend; get/set/delete of a JSON-able dict per session key."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.backend = backend.backend
+
+    def _timed(self, operation: str, *args):
+        start = time.perf_counter()
+        try:
+            return getattr(self._backend, operation)(*args)
+        finally:
+            store_duration.record(time.perf_counter() - start, {"backend": self.backend, "operation": operation})
+
+    def get(self, key: str) -> Optional[dict]:
+        return self._timed("get", key)
+
+    def set(self, key: str, state: dict):
+        self._timed("set", key, state)
+
+    def delete(self, key: str):
+        self._timed("delete", key)
+
+
+def open_store(url: str = None) -> SessionStore:
+    """The session store described by `url` (default: SESSION_STORE_URL)."""
+    url = url or SESSION_STORE_URL
+    scheme = urlparse(url).scheme
+    if scheme == "sqlite":
+        return SessionStore(SQLiteSessionStore(url[len("sqlite:///"):]))
+    if scheme in ("redis", "rediss", "unix"):
+        return SessionStore(RedisSessionStore(url))
+    raise ValueError(f"Unsupported SESSION_STORE_URL {url!r}")
@@ -0,0 +1,114 @@
+import functools
+import inspect
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, Hashable
+
+from opentelemetry import metrics, trace
+
+try:
+    from scripts import deadline as request_deadline
+except ImportError:  # imported from inside scripts/
+    import deadline as request_deadline
+
+
+meter = metrics.get_meter(__name__)
+
+coalesced_calls = meter.create_counter(
+    "singleflight.calls", description="Tool calls by role: leader (ran the backend call) or follower (shared it)."
+)
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running wait for it and get the same result, or the same exception.
+    Nothing is cached: once the call finishes, the next one with that key runs again.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], attributes: Dict[str, str] = None):
+        """Return (result, shared); `shared` is True for followers. `attributes` label the calls metric."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = Future()
+            coalesced_calls.add(1, {**(attributes or {}), "role": "leader" if leader else "follower"})
+            if leader:
+                break
+
+            # Stop waiting if our own request is cancelled; the leader carries on for the others
+            request = request_deadline.current()
+            wait([call, request.future] if request is not None else [call], return_when=FIRST_COMPLETED)
+            if request is not None:
+                request.check()
+            error = call.exception()
+            if isinstance(error, request_deadline.Cancelled):
+                continue  # the leader's request went away, not ours: run it again
+            if error is not None:
+                raise error
+            return call.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+            call.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[key]
+        call.set_result(result)
+        return result, False
+
+
+_group = SingleFlight()
+
+
+# A quoted SQL literal or identifier ('' or "" escape the quote); an unterminated one runs to the end
+QUOTED = re.compile(r"""('(?:[^']|'')*'?|"(?:[^"]|"")*"?)""")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(value):
+    """
+    Collapse whitespace and a trailing semicolon so trivially different SQL or
+    queries share a key. Quoted literals are kept as written, so queries for
+    'a  b' and 'a b' never share a result.
+    """
+    if isinstance(value, str):
+        # Even parts are outside quotes, odd parts the quoted literals
+        parts = QUOTED.split(value)
+        for i in range(0, len(parts), 2):
+            parts[i] = WHITESPACE.sub(" ", parts[i])
+        parts[0] = parts[0].lstrip()
+        parts[-1] = parts[-1].rstrip().rstrip(";").rstrip()
+        return "".join(parts)
+    if isinstance(value, list):
+        return tuple(normalize(item) for item in value)
+    return value
+
+
+def coalesce(func):
+    """Share one execution of `func` among concurrent calls with the same (name, normalized arguments)."""
+    signature = inspect.signature(func)
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (name, tuple((k, normalize(v)) for k, v in bound.arguments.items()))
+        result, shared = _group.do(key, lambda: func(*args, **kwargs), {"tool": name})
+        trace.get_current_span().set_attribute("coalesced", shared)
+        return result
+
+    return wrapper
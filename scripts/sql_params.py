@@ -0,0 +1,115 @@
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from opentelemetry import metrics
+
+
+meter = metrics.get_meter(__name__)
+
+rewrites = meter.create_counter(
+    "sql.autoparameterize", description="Model-written SQL by outcome: parameterized, unchanged or explicit (caller bound)."
+)
+
+# SQL Server allows 2100 parameters; a statement with this many literals isn't a hot query anyway
+MAX_PARAMETERS = 200
+
+# pyodbc.SQL_VARCHAR, spelled out so this module doesn't need the ODBC driver manager to import.
+# pyodbc binds every str as NVARCHAR, and comparing that to a VARCHAR column converts the column
+# (CONVERT_IMPLICIT) and scans instead of seeking; one fixed width also keeps one plan per query shape.
+SQL_VARCHAR = 12
+VARCHAR_SIZE = 8000
+
+
+class NVarChar(str):
+    """A string written as an N'...' literal, which keeps pyodbc's NVARCHAR binding."""
+
+_TOKEN = re.compile(
+    r"""
+      (?P<string>[Nn]?'(?:[^']|'')*')
+    | (?P<number>(?<![\w.@#])\d+(?:\.\d+)?(?![\w.]))
+    | (?P<word>[A-Za-z_@#][\w@#$]*|\[[^\]]*\]|"[^"]*")
+    | (?P<op><>|!=|<=|>=|=|<|>)
+    | (?P<space>\s+)
+    | (?P<other>.)
+    """,
+    re.S | re.X,
+)
+
+# Literals are only rewritten while inside one of these clauses...
+_FILTER_START = {"WHERE", "HAVING", "ON"}
+# ...and these end it. A nested SELECT ends it too, which errs on the side of leaving literals alone.
+_FILTER_END = {"SELECT", "GROUP", "ORDER", "UNION", "EXCEPT", "INTERSECT", "OFFSET", "FETCH", "FOR", "OPTION"}
+
+
+def parameterize(sql: str) -> Tuple[str, List]:
+    """
+    Replace literals in a SELECT's filters with `?` placeholders so SQL Server can reuse the plan.
+
+    String literals in WHERE/HAVING/ON clauses always become parameters (N'...' ones as
+    NVarChar, see input_sizes); numbers only when they are compared (`= 5`, `> 60`, `BETWEEN 1 AND 9`), so TOP, OFFSET and
+    select-list or GROUP BY expressions keep their literals. Statements that aren't
+    plain SELECTs, or that contain comments or placeholders already, come back unchanged
+    with no parameters.
+    """
+    stripped = sql.strip()
+    if not re.match(r"(?is)^(select|with)\b", stripped) or "--" in sql or "/*" in sql:
+        return sql, []
+
+    tokens = [(m.lastgroup, m.group()) for m in _TOKEN.finditer(sql)]
+    if any(kind == "other" and text in ("?", "'") for kind, text in tokens):
+        return sql, []
+
+    out, params = [], []
+    in_filter = False
+    previous = ""  # last significant token, upper-cased
+    between = False
+    for kind, text in tokens:
+        if kind == "space":
+            out.append(text)
+            continue
+        if kind == "word":
+            keyword = text.upper()
+            if keyword in _FILTER_START:
+                in_filter = True
+            elif keyword in _FILTER_END:
+                in_filter = False
+            elif keyword == "BETWEEN":
+                between = True
+        if in_filter and kind == "string":
+            if text[0] in "Nn":
+                params.append(NVarChar(text[2:-1].replace("''", "'")))
+            else:
+                params.append(text[1:-1].replace("''", "'"))
+            out.append("?")
+        elif in_filter and kind == "number" and (previous in ("=", "<>", "!=", "<", ">", "<=", ">=", "BETWEEN")
+                                                  or (previous == "AND" and between)):
+            params.append(float(text) if "." in text else int(text))
+            out.append("?")
+            if previous == "AND":
+                between = False
+        else:
+            out.append(text)
+        previous = text.upper()
+
+    if not params or len(params) > MAX_PARAMETERS:
+        return sql, []
+    return "".join(out), params
+
+
+def prepare(query: str, parameters=None) -> Tuple[str, List]:
+    """The statement and parameters to execute: the caller's binding if given, else the auto-parameterized query."""
+    if parameters:
+        rewrites.add(1, {"result": "explicit"})
+        return query, list(parameters)
+    sql, params = parameterize(query)
+    rewrites.add(1, {"result": "parameterized" if params else "unchanged"})
+    return sql, params
+
+
+def input_sizes(params: Sequence) -> List[Optional[tuple]]:
+    """
+    cursor.setinputsizes() for `params`: plain strings as VARCHAR, so they seek on the
+    table's VARCHAR columns; NVarChar, longer strings and everything else as pyodbc binds them.
+    """
+    return [(SQL_VARCHAR, VARCHAR_SIZE, 0) if type(param) is str and len(param) <= VARCHAR_SIZE else None
+            for param in params]
@@ -0,0 +1,126 @@
+import builtins
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+# Kept stdlib-only on purpose: this module is imported before anything heavy
+# so that it can time everything else.
+
+
+class StartupProfiler:
+    """
+    Records how long each top-level import and each named startup step takes.
+
+    Enabled with STARTUP_PROFILE=1. The report is printed to stderr and, when
+    STARTUP_PROFILE_OUTPUT is set, also written there as JSON.
+    """
+
+    def __init__(self, enabled: bool = False, import_depth: int = 2):
+        self.enabled = enabled
+        self.import_depth = import_depth
+        self.started_at = time.perf_counter()
+        self.imports = []
+        self.steps = []
+        self._local = threading.local()
+        self._original_import = None
+
+    def install_import_hook(self):
+        """Time every import that actually loads a module, down to `import_depth` levels of nesting."""
+        if self._original_import is not None:
+            return
+        self._original_import = builtins.__import__
+        original_import = self._original_import
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            depth = getattr(self._local, "depth", 0)
+            if depth >= self.import_depth or level or name in sys.modules:
+                return original_import(name, globals, locals, fromlist, level)
+            self._local.depth = depth + 1
+            start = time.perf_counter()
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                self._local.depth = depth
+                self.imports.append((name, time.perf_counter() - start, depth + 1))
+
+        builtins.__import__ = timed_import
+
+    def uninstall_import_hook(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextmanager
+    def step(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - start))
+
+    def report(self) -> dict:
+        if not self.enabled:
+            return {}
+        self.uninstall_import_hook()
+
+        result = {
+            "total_s": time.perf_counter() - self.started_at,
+            "imports": [
+                {"name": n, "seconds": s, "depth": d} for n, s, d in sorted(self.imports, key=lambda i: -i[1])
+            ],
+            "steps": [{"name": n, "seconds": s} for n, s in self.steps],
+        }
+
+        lines = [f"Startup profile: {result['total_s'] * 1000:.1f} ms total"]
+        lines += [
+            f"  import {'  ' * (i['depth'] - 1)}{i['name']:<40} {i['seconds'] * 1000:8.1f} ms"
+            for i in result["imports"][:25]
+        ]
+        lines += [f"  step   {s['name']:<40} {s['seconds'] * 1000:8.1f} ms" for s in result["steps"]]
+        print("\n".join(lines), file=sys.stderr)
+
+        output = os.getenv("STARTUP_PROFILE_OUTPUT")
+        if output:
+            with open(output, "w") as f:
+                json.dump(result, f, indent=2)
+        return result
+
+
+profiler = StartupProfiler(
+    enabled=os.getenv("STARTUP_PROFILE") == "1",
+    import_depth=int(os.getenv("STARTUP_PROFILE_IMPORT_DEPTH", "2")),
+)
+if profiler.enabled:
+    profiler.install_import_hook()
+
+
+def prefetch_secrets(key_vault, names, max_workers: int = 8, optional=()) -> dict:
+    """
+    Fetch several independent Key Vault secrets concurrently and return {name: value}.
+    Secrets in `optional` that the vault doesn't have come back as None.
+    """
+    names = list(dict.fromkeys([*names, *optional]))
+    if not names:
+        return {}
+
+    def fetch(name):
+        from azure.core.exceptions import ResourceNotFoundError  # already loaded by the Key Vault client
+
+        try:
+            return key_vault.get_secret(name).value
+        except ResourceNotFoundError:
+            if name in optional:
+                return None
+            raise
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(names))) as pool:
+        values = pool.map(fetch, names)
+        return dict(zip(names, values))
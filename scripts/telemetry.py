@@ -0,0 +1,533 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from opentelemetry import metrics, trace
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import Decision, Sampler, SamplingResult, TraceIdRatioBased
+from opentelemetry.trace import Status, StatusCode
+
+
+logger = logging.getLogger(__name__)
+
+AZURE_MONITOR, MEMORY, CONSOLE, NONE = "azure_monitor", "memory", "console", "none"
+
+# Read by the Azure Monitor exporter: App Insights scales head-sampled items back up by it
+SAMPLE_RATE_ATTRIBUTE = "_MS.sampleRate"
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+@dataclass(frozen=True)
+class TelemetrySettings:
+    """
+    How the app exports its spans and metrics.
+
+    `sample_ratio` of traces are kept when they start (head sampling). With
+    `tail` on, every trace is recorded and held in memory until its root span
+    ends, and one whose root took `slow_seconds` or more or with any failed
+    span is kept whether head-sampled or not, weighted once in App Insights;
+    at most `max_pending_traces` are held at once.
+    Kept spans wait in a queue of at most `max_queue_size` (new ones are dropped
+    when it is full) and are exported `max_export_batch_size` at a time by a
+    background thread every `schedule_delay_s`. Metrics are exported every
+    `metric_interval_s`, also off the request path.
+    """
+
+    enabled: bool = True
+    exporter: str = AZURE_MONITOR
+    sample_ratio: float = 0.1
+    tail: bool = True
+    slow_seconds: float = 10.0
+    max_pending_traces: int = 1000
+    max_spans_per_trace: int = 256
+    max_queue_size: int = 2048
+    max_export_batch_size: int = 512
+    schedule_delay_s: float = 5.0
+    export_timeout_s: float = 30.0
+    metric_interval_s: float = 60.0
+
+    def __post_init__(self):
+        if self.exporter not in (AZURE_MONITOR, MEMORY, CONSOLE, NONE):
+            raise ValueError(f"exporter must be azure_monitor, memory, console or none, not {self.exporter!r}")
+        if not 0.0 <= self.sample_ratio <= 1.0:
+            raise ValueError("sample_ratio must be between 0 and 1")
+        if self.max_export_batch_size > self.max_queue_size:
+            raise ValueError("max_export_batch_size must not exceed max_queue_size")
+
+    @classmethod
+    def from_env(cls) -> "TelemetrySettings":
+        return cls(
+            enabled=os.getenv("TELEMETRY_ENABLED", "1") == "1",
+            exporter=os.getenv("TELEMETRY_EXPORTER", AZURE_MONITOR),
+            sample_ratio=_env_float("TELEMETRY_SAMPLE_RATIO", 0.1),
+            tail=os.getenv("TELEMETRY_TAIL_SAMPLING", "1") == "1",
+            slow_seconds=_env_float("TELEMETRY_SLOW_TRACE_SECONDS", 10.0),
+            max_pending_traces=_env_int("TELEMETRY_MAX_PENDING_TRACES", 1000),
+            max_queue_size=_env_int("TELEMETRY_MAX_QUEUE_SIZE", 2048),
+            max_export_batch_size=_env_int("TELEMETRY_MAX_EXPORT_BATCH_SIZE", 512),
+            schedule_delay_s=_env_float("TELEMETRY_SCHEDULE_DELAY_SECONDS", 5.0),
+            metric_interval_s=_env_float("TELEMETRY_METRIC_INTERVAL_SECONDS", 60.0),
+        )
+
+
+# ---------- Head sampling ----------
+
+
+class HeadSampler(Sampler):
+    """
+    Samples `ratio` of new traces by trace id and follows the parent's decision
+    for the rest of the trace. Unsampled spans are still recorded (RECORD_ONLY)
+    when `record_unsampled` is set, so TailSamplingProcessor can keep them.
+    """
+
+    def __init__(self, ratio: float, record_unsampled: bool):
+        self.ratio = ratio
+        self.record_unsampled = record_unsampled
+        self._ratio_sampler = TraceIdRatioBased(ratio)
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None,
+                      trace_state=None) -> SamplingResult:
+        parent = trace.get_current_span(parent_context).get_span_context()
+        if parent.is_valid:
+            sampled = parent.trace_flags.sampled
+            trace_state = parent.trace_state
+        else:
+            sampled = self._ratio_sampler.should_sample(parent_context, trace_id, name).decision.is_sampled()
+        if sampled:
+            return SamplingResult(Decision.RECORD_AND_SAMPLE,
+                                  {**(attributes or {}), SAMPLE_RATE_ATTRIBUTE: self.ratio * 100}, trace_state)
+        if self.record_unsampled:
+            return SamplingResult(Decision.RECORD_ONLY, attributes, trace_state)
+        return SamplingResult(Decision.DROP, None, trace_state)
+
+    def get_description(self) -> str:
+        return f"HeadSampler{{{self.ratio}, record_unsampled={self.record_unsampled}}}"
+
+
+# ---------- Span processors ----------
+
+
+class ProcessorStats:
+    """Counters a processor keeps for stats(); plain ints under a lock, cheap enough for the request path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values: Dict[str, float] = {}
+
+    def add(self, name: str, amount: float = 1):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.values)
+
+
+class BatchExportProcessor(SpanProcessor):
+    """
+    Queues ended spans and exports them in batches from a background thread.
+
+    on_end only appends to a bounded deque; when the queue is full the span is
+    dropped and counted rather than blocking the request. Unlike the SDK's
+    BatchSpanProcessor it exports every span it is handed, sampled or not, so it
+    can sit behind TailSamplingProcessor.
+    """
+
+    def __init__(self, exporter: SpanExporter, max_queue_size: int = 2048, max_export_batch_size: int = 512,
+                 schedule_delay_s: float = 5.0, export_timeout_s: float = 30.0):
+        self.exporter = exporter
+        self.max_queue_size = max_queue_size
+        self.max_export_batch_size = max_export_batch_size
+        self.schedule_delay_s = schedule_delay_s
+        self.export_timeout_s = export_timeout_s
+        self.stats = ProcessorStats()
+        self._queue: deque = deque()
+        self._condition = threading.Condition()
+        self._flush_requests: List[threading.Event] = []
+        self._shutdown = False
+        self._worker = threading.Thread(target=self._run, name="telemetry-span-export", daemon=True)
+        self._worker.start()
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if self._shutdown:
+            return
+        with self._condition:
+            if len(self._queue) >= self.max_queue_size:
+                self.stats.add("spans_dropped_queue_full")
+                return
+            self._queue.append(span)
+            if len(self._queue) >= self.max_export_batch_size:
+                self._condition.notify()
+        self.stats.add("spans_queued")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._shutdown and not self._flush_requests and len(self._queue) < self.max_export_batch_size:
+                    self._condition.wait(self.schedule_delay_s)
+                flushes, self._flush_requests = self._flush_requests, []
+                shutdown = self._shutdown
+            if flushes or shutdown:
+                self._export_all()
+            else:
+                self._export_batch()
+            for done in flushes:
+                done.set()
+            if shutdown:
+                return
+
+    def _export_batch(self) -> int:
+        with self._condition:
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_export_batch_size))]
+        if not batch:
+            return 0
+        started = time.perf_counter()
+        try:
+            result = self.exporter.export(batch)
+        except Exception:
+            logger.exception("Exporting %d spans failed", len(batch))
+            result = SpanExportResult.FAILURE
+        self.stats.add("export_seconds", time.perf_counter() - started)
+        self.stats.add("export_batches")
+        self.stats.add("spans_exported" if result == SpanExportResult.SUCCESS else "spans_export_failed", len(batch))
+        return len(batch)
+
+    def _export_all(self):
+        while self._export_batch():
+            pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        if self._shutdown:
+            return True
+        done = threading.Event()
+        with self._condition:
+            self._flush_requests.append(done)
+            self._condition.notify()
+        return done.wait(timeout_millis / 1000)
+
+    def shutdown(self) -> None:
+        if self._shutdown:
+            return
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify()
+        self._worker.join(self.export_timeout_s)
+        self.exporter.shutdown()
+
+
+# What TailSamplingProcessor does with a trace once its root has ended
+DROP, AS_SAMPLED, KEEP_ALL = "drop", "as_sampled", "keep_all"
+
+
+def with_sample_rate(span: ReadableSpan, rate: float) -> ReadableSpan:
+    """`span` with SAMPLE_RATE_ATTRIBUTE set to `rate` (a copy: ended spans are read-only)."""
+    if (span.attributes or {}).get(SAMPLE_RATE_ATTRIBUTE) == rate:
+        return span
+    return ReadableSpan(
+        name=span.name, context=span.context, parent=span.parent, resource=span.resource,
+        attributes={**(span.attributes or {}), SAMPLE_RATE_ATTRIBUTE: rate}, events=span.events,
+        links=span.links, kind=span.kind, status=span.status, start_time=span.start_time,
+        end_time=span.end_time, instrumentation_scope=span.instrumentation_scope,
+    )
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """
+    Holds the spans of each trace until its local root span ends, then decides
+    once for the whole trace. A trace whose root took `slow_seconds` or more,
+    or with any span ended with an error status, is passed on with a sample
+    rate of 100, since every such trace is kept: App Insights counts it once,
+    whether or not it was head-sampled. Other head-sampled traces are passed on
+    as they are, weighted by the head sampling rate; the rest are dropped.
+    Spans that end after their root, e.g. from a background thread, follow the
+    decision already made for their trace.
+    """
+
+    def __init__(self, next_processor: SpanProcessor, slow_seconds: float = 10.0, max_pending_traces: int = 1000,
+                 max_spans_per_trace: int = 256, max_decisions: int = 10000):
+        self.next_processor = next_processor
+        self.slow_seconds = slow_seconds
+        self.max_pending_traces = max_pending_traces
+        self.max_spans_per_trace = max_spans_per_trace
+        self.max_decisions = max_decisions
+        self.stats = ProcessorStats()
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[int, dict]" = OrderedDict()
+        self._decisions: "OrderedDict[int, str]" = OrderedDict()
+
+    def on_end(self, span: ReadableSpan) -> None:
+        sampled = span.context.trace_flags.sampled
+        failed = span.status.status_code == StatusCode.ERROR
+        is_root = span.parent is None or span.parent.is_remote
+        trace_id = span.context.trace_id
+        # Head-sampled spans that can't be held (evicted, or past the per-trace cap) go on as sampled
+        overflow = []
+        with self._lock:
+            decision = self._decisions.get(trace_id)
+            if decision is not None:
+                spans = [span]
+            else:
+                pending = self._pending.get(trace_id)
+                if pending is None:
+                    pending = self._pending[trace_id] = {"spans": [], "failed": False, "sampled": sampled}
+                    if len(self._pending) > self.max_pending_traces:
+                        _, evicted = self._pending.popitem(last=False)
+                        if evicted["sampled"]:
+                            overflow += evicted["spans"]
+                        else:
+                            self.stats.add("spans_dropped_evicted", len(evicted["spans"]))
+                if len(pending["spans"]) < self.max_spans_per_trace:
+                    pending["spans"].append(span)
+                elif sampled:
+                    overflow.append(span)
+                else:
+                    self.stats.add("spans_dropped_trace_too_long")
+                pending["failed"] = pending["failed"] or failed
+                if not is_root:
+                    spans = []  # the trace is still being held
+                else:
+                    del self._pending[trace_id]
+                    slow = (span.end_time - span.start_time) / 1e9 >= self.slow_seconds
+                    if pending["failed"] or slow:
+                        decision = KEEP_ALL
+                        self.stats.add("traces_kept_failed" if pending["failed"] else "traces_kept_slow")
+                    elif pending["sampled"]:
+                        decision = AS_SAMPLED
+                    else:
+                        decision = DROP
+                        self.stats.add("traces_dropped")
+                    self._decisions[trace_id] = decision
+                    if len(self._decisions) > self.max_decisions:
+                        self._decisions.popitem(last=False)
+                    spans = pending["spans"]
+        for held in overflow:
+            self.stats.add("spans_head_sampled")
+            self.next_processor.on_end(held)
+        if decision == DROP:
+            return
+        for kept in spans:
+            if decision == KEEP_ALL:
+                kept = with_sample_rate(kept, 100.0)
+            else:
+                self.stats.add("spans_head_sampled")
+            self.next_processor.on_end(kept)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.next_processor.force_flush(timeout_millis)
+
+    def shutdown(self) -> None:
+        self.next_processor.shutdown()
+
+
+class TimedProcessor(SpanProcessor):
+    """Measures the time the wrapped processor spends on the request path (on_start/on_end)."""
+
+    def __init__(self, processor: SpanProcessor, stats: ProcessorStats):
+        self.processor = processor
+        self.stats = stats
+
+    def on_start(self, span, parent_context=None) -> None:
+        started = time.perf_counter()
+        self.processor.on_start(span, parent_context=parent_context)
+        self.stats.add("on_start_seconds", time.perf_counter() - started)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        started = time.perf_counter()
+        self.processor.on_end(span)
+        self.stats.add("on_end_seconds", time.perf_counter() - started)
+        self.stats.add("spans_ended")
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.processor.force_flush(timeout_millis)
+
+    def shutdown(self) -> None:
+        self.processor.shutdown()
+
+
+# ---------- Bootstrap ----------
+
+
+@dataclass
+class Telemetry:
+    settings: TelemetrySettings
+    tracer_provider: object
+    meter_provider: object
+    processors: Sequence[SpanProcessor]
+    span_exporter: Optional[SpanExporter] = None
+    metric_reader: object = None  # InMemoryMetricReader with the memory exporter
+
+    def stats(self) -> Dict[str, float]:
+        """Counters from every span processor, e.g. spans_dropped_queue_full or on_end_seconds."""
+        merged: Dict[str, float] = {}
+        for processor in self.processors:
+            for name, value in processor.stats.snapshot().items():
+                merged[name] = merged.get(name, 0) + value
+        return merged
+
+    def force_flush(self, timeout_s: float = 30.0) -> bool:
+        flushed = self.tracer_provider.force_flush(int(timeout_s * 1000))
+        return self.meter_provider.force_flush(int(timeout_s * 1000)) and flushed
+
+    def shutdown(self):
+        self.tracer_provider.shutdown()
+        self.meter_provider.shutdown()
+
+
+_current: Optional[Telemetry] = None
+
+
+def current() -> Optional[Telemetry]:
+    """The Telemetry configure() set up in this process, if any."""
+    return _current
+
+
+def _exporters(settings: TelemetrySettings, connection_string: Optional[str]):
+    """(span exporter, metric reader) for settings.exporter."""
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+    interval_ms = settings.metric_interval_s * 1000
+    if settings.exporter == AZURE_MONITOR:
+        from azure.monitor.opentelemetry.exporter import AzureMonitorMetricExporter, AzureMonitorTraceExporter
+
+        return (AzureMonitorTraceExporter(connection_string=connection_string),
+                PeriodicExportingMetricReader(AzureMonitorMetricExporter(connection_string=connection_string),
+                                              export_interval_millis=interval_ms))
+    if settings.exporter == MEMORY:
+        from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+        return InMemorySpanExporter(), InMemoryMetricReader()
+    if settings.exporter == CONSOLE:
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter(), PeriodicExportingMetricReader(ConsoleMetricExporter(),
+                                                                     export_interval_millis=interval_ms)
+    return None, None
+
+
+def configure(settings: TelemetrySettings = None, connection_string: Optional[str] = None,
+              span_exporter: SpanExporter = None) -> Optional[Telemetry]:
+    """
+    Install the global tracer and meter providers for this process, once.
+
+    Spans from tracers obtained before this call (module-level `tracer`s) are
+    exported too; spans they ended earlier are not. `span_exporter` replaces the
+    one settings.exporter picks, e.g. to wrap it for a benchmark.
+    """
+    global _current
+    if _current is not None:
+        return _current
+    settings = settings or TelemetrySettings.from_env()
+    if not settings.enabled:
+        return None
+
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+
+    default_exporter, metric_reader = _exporters(settings, connection_string)
+    span_exporter = span_exporter or default_exporter
+    resource = Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "healthcare-agent")})
+
+    tracer_provider = TracerProvider(
+        resource=resource,
+        sampler=HeadSampler(settings.sample_ratio, record_unsampled=settings.tail),
+    )
+    processors = []
+    if span_exporter is not None:
+        export = BatchExportProcessor(span_exporter, settings.max_queue_size, settings.max_export_batch_size,
+                                      settings.schedule_delay_s, settings.export_timeout_s)
+        processors.append(export)
+        head = export
+        if settings.tail:
+            head = TailSamplingProcessor(export, settings.slow_seconds, settings.max_pending_traces,
+                                         settings.max_spans_per_trace)
+            processors.append(head)
+        # Counts the time span processing adds to requests (Telemetry.stats()["on_end_seconds"])
+        timed = TimedProcessor(head, ProcessorStats())
+        processors.append(timed)
+        tracer_provider.add_span_processor(timed)
+    meter_provider = MeterProvider(resource=resource, metric_readers=[metric_reader] if metric_reader else [])
+
+    trace.set_tracer_provider(tracer_provider)
+    metrics.set_meter_provider(meter_provider)
+    _current = Telemetry(settings, tracer_provider, meter_provider, processors, span_exporter,
+                         metric_reader if settings.exporter == MEMORY else None)
+    _register_self_metrics(_current)
+    return _current
+
+
+def start(connection_string: Union[str, Callable[[], str], None] = None) -> None:
+    """
+    configure() from the environment for the app. With Azure Monitor and no
+    APPLICATIONINSIGHTS_CONNECTION_STRING, `connection_string` is called to fetch
+    one (from the AI project) on a background thread, off the startup path.
+    """
+    settings = TelemetrySettings.from_env()
+    if not settings.enabled:
+        return
+    if settings.exporter != AZURE_MONITOR:
+        configure(settings)
+        return
+    value = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING") or connection_string
+    if not callable(value):
+        configure(settings, connection_string=value)
+        return
+
+    def work():
+        try:
+            resolved = value()
+            if not resolved:
+                logger.warning("Telemetry disabled: no Application Insights connection string")
+                return
+            configure(settings, connection_string=resolved)
+        except Exception:
+            logger.exception("Telemetry disabled: could not set up the Azure Monitor exporters")
+
+    threading.Thread(target=work, name="telemetry-setup", daemon=True).start()
+
+
+def _register_self_metrics(telemetry: Telemetry):
+    """Export pipeline health as observable metrics, read only when metrics are collected."""
+    from opentelemetry.metrics import Observation
+
+    meter = metrics.get_meter(__name__)
+
+    def observe(*names):
+        def callback(options):
+            values = telemetry.stats()
+            return [Observation(values.get(name, 0), {"type": name}) for name in names]
+        return callback
+
+    meter.create_observable_counter(
+        "telemetry.spans", callbacks=[observe(
+            "spans_ended", "spans_head_sampled", "spans_queued", "spans_exported", "spans_export_failed",
+            "spans_dropped_queue_full", "spans_dropped_evicted", "spans_dropped_trace_too_long")],
+        description="Spans through the export pipeline, by type.",
+    )
+    meter.create_observable_counter(
+        "telemetry.traces", callbacks=[observe("traces_kept_slow", "traces_kept_failed", "traces_dropped")],
+        description="Unsampled traces the tail sampler kept or dropped, by type.",
+    )
+    meter.create_observable_counter(
+        "telemetry.overhead", unit="s", callbacks=[observe("on_start_seconds", "on_end_seconds", "export_seconds")],
+        description="Time spent on span processing on the request path (on_*) and exporting in the background.",
+    )
+
+
+def mark_failed(description: str):
+    """Give the current span an error status, so the tail sampler keeps its trace."""
+    trace.get_current_span().set_status(Status(StatusCode.ERROR, description))
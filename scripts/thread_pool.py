@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from opentelemetry import metrics
+
+
+logger = logging.getLogger(__name__)
+meter = metrics.get_meter(__name__)
+
+acquire_counter = meter.create_counter(
+    "agent_thread_pool.acquire",
+    description="Thread acquisitions from the pre-warmed pool, by result (hit/miss).",
+)
+expired_counter = meter.create_counter(
+    "agent_thread_pool.expired",
+    description="Pre-created threads deleted because they sat unused for too long.",
+)
+
+
+class AgentThreadPool:
+    """
+    Keeps a small stock of pre-created agent threads so a session can take one
+    instantly instead of paying for create_thread() on its first message.
+
+    A daemon thread tops the pool back up to `target_size`, and deletes threads
+    that stayed unused for longer than `max_idle_seconds`.
+    """
+
+    def __init__(self, agent_client, target_size: int = 4, max_idle_seconds: float = 3600,
+                 refill_interval: float = 5.0):
+        self.agent_client = agent_client
+        self.target_size = target_size
+        self.max_idle_seconds = max_idle_seconds
+        self.refill_interval = refill_interval
+
+        self._threads = deque()  # (thread_id, created_at) oldest first
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._worker = None
+        self._stats = {"hits": 0, "misses": 0, "created": 0, "expired": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+    # ---------- Lifecycle ----------
+
+    def start(self):
+        if self.target_size <= 0 or self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name="agent-thread-pool", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(timeout=self.refill_interval)
+            self._worker = None
+
+    # ---------- Public API ----------
+
+    def acquire(self) -> str:
+        """Return a ready thread id, falling back to a synchronous create on a miss."""
+        now = time.monotonic()
+        thread_id = None
+        with self._lock:
+            while self._threads:
+                candidate, created_at = self._threads.popleft()
+                if now - created_at < self.max_idle_seconds:
+                    thread_id = candidate
+                    break
+                # Too old to hand out; delete it in the background
+                self._expire(candidate)
+
+        # Ask the worker to replace what we just took
+        self._wakeup.set()
+
+        if thread_id is not None:
+            self._bump("hits")
+            acquire_counter.add(1, {"result": "hit"})
+            return thread_id
+
+        self._bump("misses")
+        acquire_counter.add(1, {"result": "miss"})
+        return self.agent_client.create_thread().id
+
+    def stats(self) -> dict:
+        with self._lock:
+            available = len(self._threads)
+        with self._stats_lock:
+            counts = dict(self._stats)
+        return {**counts, "available": available, "target_size": self.target_size}
+
+    def _bump(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    # ---------- Background maintenance ----------
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            try:
+                self._evict_expired()
+                self._replenish()
+            except Exception as e:
+                self._bump("errors")
+                logger.warning("Agent thread pool maintenance failed: %s", e)
+            self._wakeup.wait(self.refill_interval)
+
+    def _replenish(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                missing = self.target_size - len(self._threads)
+            if missing <= 0:
+                return
+            thread = self.agent_client.create_thread()
+            self._bump("created")
+            with self._lock:
+                self._threads.append((thread.id, time.monotonic()))
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._threads and now - self._threads[0][1] >= self.max_idle_seconds:
+                thread_id, _ = self._threads.popleft()
+                self._expire(thread_id)
+
+    def _expire(self, thread_id: str):
+        self._bump("expired")
+        expired_counter.add(1)
+        threading.Thread(target=self._delete_quietly, args=(thread_id,), daemon=True).start()
+
+    def _delete_quietly(self, thread_id: str):
+        try:
+            self.agent_client.delete_thread(thread_id)
+        except Exception as e:
+            logger.debug("Could not delete expired thread %s: %s", thread_id, e)
@@ -0,0 +1,152 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from opentelemetry import metrics, trace
+
+
+meter = metrics.get_meter(__name__)
+
+decisions = meter.create_counter(
+    "agent.tier.decisions", description="Messages sent to each agent tier, by tier and reason."
+)
+escalations = meter.create_counter(
+    "agent.tier.escalations", description="Fast-tier runs handed to the full tier, by reason."
+)
+run_duration = meter.create_histogram(
+    "agent.tier.run.duration", unit="s",
+    description="Client-side time of one agent run, by tier and outcome (answered, escalated, cancelled).",
+)
+run_tokens = meter.create_counter(
+    "agent.tier.tokens", description="Tokens used by agent runs, by tier and type (prompt, completion)."
+)
+run_cost = meter.create_counter(
+    "agent.tier.cost", unit="USD", description="Estimated model cost of agent runs, by tier (needs AGENT_TIER_*_USD_*)."
+)
+
+FAST, FULL = "fast", "full"
+
+ENABLED = os.getenv("TIER_ROUTER_ENABLED", "1") == "1"
+# Longer messages go to the full tier
+FAST_MAX_WORDS = int(os.getenv("TIER_FAST_MAX_WORDS", "25"))
+
+# What the fast agent answers with when a message is beyond it
+ESCALATE_MARKER = "[[ESCALATE]]"
+
+# Appended to instructions.txt for the fast agent (creating_agent.py)
+FAST_INSTRUCTIONS = f"""
+
+You are the fast tier of this assistant. Answer greetings, thanks, clarifications of your previous
+answers and simple questions that need at most one tool call. If the message needs several tool calls,
+a discharge summary, a comparison or careful clinical reasoning, or if you are not confident in your
+answer, reply with exactly {ESCALATE_MARKER} and nothing else; a more capable agent will take over.
+"""
+
+# Added to the full agent's run when it takes over a message from the fast tier
+ESCALATED_INSTRUCTIONS = (
+    f"The previous assistant message ({ESCALATE_MARKER}) is a hand-off from a smaller model, not an answer. "
+    "Answer the user's last message in full."
+)
+
+SMALL_TALK_PATTERN = re.compile(
+    r"^(thanks?|thank you|thx|ok(ay)?|great|cool|nice|perfect|got it|sounds good|understood|bye|goodbye|"
+    r"hi|hello|hey|yes|no|sure)\b"
+)
+CLARIFY_PATTERN = re.compile(
+    r"\b(what do you mean|what does (that|this|it) mean|can you (explain|clarify|rephrase|elaborate)|"
+    r"in (simpler|plain) (terms|english)|say that again|(make it|be) shorter|shorten (it|that)|tl;?dr)\b"
+)
+# Work the small model is likely to get wrong or only half do
+FULL_PATTERN = re.compile(
+    r"\b(summary|summari[sz]e|discharge|compare|comparison|versus|vs|differences?|then|also|"
+    r"plan|assess\w*|evaluate|analy[sz]\w*|why|risks?|interactions?|contraindicat\w*|dos(e|age|ing))\b"
+)
+
+
+@dataclass
+class TierDecision:
+    tier: str
+    reason: str
+
+
+def classify(message: str) -> TierDecision:
+    """Pick the agent tier for a chat message from its length and wording; no model call."""
+    text = " ".join(message.lower().split())
+    words = len(text.split())
+    if SMALL_TALK_PATTERN.match(text) and words <= 6:
+        return TierDecision(FAST, "small_talk")
+    if CLARIFY_PATTERN.search(text) and words <= FAST_MAX_WORDS:
+        return TierDecision(FAST, "clarification")
+    if words > FAST_MAX_WORDS:
+        return TierDecision(FULL, "long")
+    if text.count("?") > 1:
+        return TierDecision(FULL, "several_questions")
+    if FULL_PATTERN.search(text):
+        return TierDecision(FULL, "complex")
+    return TierDecision(FAST, "short")
+
+
+def choose_tier(message: str, fast_available: bool) -> TierDecision:
+    """classify(), or the full tier when routing is off or no fast agent was provisioned."""
+    if not ENABLED:
+        decision = TierDecision(FULL, "disabled")
+    elif not fast_available:
+        decision = TierDecision(FULL, "no_fast_agent")
+    else:
+        decision = classify(message)
+    decisions.add(1, {"tier": decision.tier, "reason": decision.reason})
+    trace.get_current_span().set_attributes({"agent.tier": decision.tier, "agent.tier.reason": decision.reason})
+    return decision
+
+
+def escalation_reason(run, reply: Optional[str]) -> Optional[str]:
+    """Why a fast-tier run's result shouldn't be shown, or None if it's a proper answer."""
+    if run.status != "completed":  # RunStatus is a str enum
+        return f"run_{getattr(run.status, 'value', run.status)}"
+    if not reply or not reply.strip():
+        return "no_reply"
+    if ESCALATE_MARKER in reply:
+        return "declined"
+    return None
+
+
+@dataclass
+class TierPricing:
+    """USD per million tokens for a tier's model; zero leaves cost unreported."""
+    prompt_per_million: float = 0.0
+    completion_per_million: float = 0.0
+
+    @classmethod
+    def from_env(cls, tier: str) -> "TierPricing":
+        prefix = f"AGENT_TIER_{tier.upper()}_USD_PER_1M"
+        return cls(
+            prompt_per_million=float(os.getenv(f"{prefix}_PROMPT", "0")),
+            completion_per_million=float(os.getenv(f"{prefix}_COMPLETION", "0")),
+        )
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.prompt_per_million + completion_tokens * self.completion_per_million) / 1e6
+
+
+PRICING = {tier: TierPricing.from_env(tier) for tier in (FAST, FULL)}
+
+
+def record_run(tier: str, run, duration_s: float, outcome: str):
+    """Latency, tokens and estimated cost of one agent run; `run` is None if it was cancelled."""
+    run_duration.record(duration_s, {"tier": tier, "outcome": outcome})
+    usage = getattr(run, "usage", None)
+    if not usage:
+        return
+    prompt_tokens = usage.prompt_tokens or 0
+    completion_tokens = usage.completion_tokens or 0
+    run_tokens.add(prompt_tokens, {"tier": tier, "type": "prompt"})
+    run_tokens.add(completion_tokens, {"tier": tier, "type": "completion"})
+    cost = PRICING[tier].cost(prompt_tokens, completion_tokens)
+    if cost:
+        run_cost.add(cost, {"tier": tier})
+
+
+def record_escalation(reason: str):
+    escalations.add(1, {"reason": reason})
+    trace.get_current_span().add_event("agent.tier.escalated", {"reason": reason})
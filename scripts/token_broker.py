@@ -0,0 +1,202 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from azure.core.credentials import AccessToken
+from opentelemetry import metrics
+
+
+logger = logging.getLogger(__name__)
+meter = metrics.get_meter(__name__)
+
+fetch_duration = meter.create_histogram(
+    "token_broker.fetch.duration", unit="s", description="Time to fetch a token from the identity provider, by scope and trigger."
+)
+token_requests = meter.create_counter(
+    "token_broker.requests", description="get_token calls served by the broker, by scope and result (hit/miss)."
+)
+
+# default | managed_identity | workload_identity | environment | azure_cli
+# In production set managed_identity to go straight to the UAMI named by AZURE_CLIENT_ID.
+CREDENTIAL_TYPE = os.getenv("AZURE_CREDENTIAL_TYPE", "default")
+
+# A cached token is refreshed in the background once it is this close to expiring,
+# and fetched inline if a caller finds it even closer than REFRESH_MARGIN_SECONDS.
+PROACTIVE_REFRESH_SECONDS = float(os.getenv("TOKEN_BROKER_PROACTIVE_REFRESH_SECONDS", "600"))
+REFRESH_MARGIN_SECONDS = 60.0
+
+# The app's DefaultAzureCredential has always skipped the developer CLIs (main.py), so a developer
+# machine running it probes the same chain as before; the deployment scripts keep them for azd/az logins.
+APP_EXCLUSIONS = {
+    "exclude_cli_credential": True,
+    "exclude_powershell_credential": True,
+    "exclude_developer_cli_credential": True,
+}
+
+
+def build_credential(credential_type: str = None, **exclusions):
+    """
+    The underlying azure-identity credential for `credential_type` (default:
+    AZURE_CREDENTIAL_TYPE). `exclusions` are extra exclude_* options for the
+    `default` chain, e.g. APP_EXCLUSIONS.
+    """
+    credential_type = credential_type or CREDENTIAL_TYPE
+    client_id = os.getenv("AZURE_CLIENT_ID")
+
+    if credential_type == "managed_identity":
+        from azure.identity import ManagedIdentityCredential
+        return ManagedIdentityCredential(client_id=client_id)
+    if credential_type == "workload_identity":
+        from azure.identity import WorkloadIdentityCredential
+        return WorkloadIdentityCredential()
+    if credential_type == "environment":
+        from azure.identity import EnvironmentCredential
+        return EnvironmentCredential()
+    if credential_type == "azure_cli":
+        from azure.identity import AzureCliCredential
+        return AzureCliCredential()
+    if credential_type == "default":
+        from azure.identity import DefaultAzureCredential
+        return DefaultAzureCredential(
+            managed_identity_client_id=client_id,
+            exclude_shared_token_cache_credential=True,   # skip local cache
+            exclude_visual_studio_code_credential=True,
+            **exclusions,
+        )
+    raise ValueError(f"Unknown AZURE_CREDENTIAL_TYPE {credential_type!r}")
+
+
+class TokenBroker:
+    """
+    A TokenCredential that wraps one underlying credential for the whole process.
+
+    Tokens are cached per scope and refreshed by a background thread before they
+    expire, so callers normally get a cached token without a round trip to IMDS or
+    Entra ID. Pass it anywhere the Azure SDKs take a `credential`.
+    """
+
+    def __init__(self, credential=None, proactive_refresh: float = PROACTIVE_REFRESH_SECONDS, **exclusions):
+        self._credential = credential
+        self._injected = credential is not None
+        self.exclusions = exclusions
+        self.proactive_refresh = proactive_refresh
+        self._tokens: Dict[Tuple, AccessToken] = {}
+        self._locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def credential(self):
+        """Built on the first fetch, so get_credential(**exclusions) can still set the chain until then."""
+        if self._credential is None:
+            with self._lock:
+                if self._credential is None:
+                    self._credential = build_credential(**self.exclusions)
+        return self._credential
+
+    def configure(self, **exclusions):
+        if exclusions == self.exclusions:
+            return
+        if self._credential is not None and not self._injected:
+            raise RuntimeError("the credential chain is already in use; call get_credential(**exclusions) "
+                               "before the first token is fetched")
+        self.exclusions = exclusions
+
+    def get_token(self, *scopes: str, claims: str = None, tenant_id: str = None, enable_cae: bool = False,
+                  **kwargs) -> AccessToken:
+        if claims:  # a claims challenge needs a fresh token, never a cached one
+            return self._fetch(scopes, tenant_id, enable_cae, "challenge", claims=claims, **kwargs)
+
+        # CAE and non-CAE tokens for the same scope aren't interchangeable, so each is cached on its own
+        key = (scopes, tenant_id, enable_cae)
+        scope = " ".join(scopes)
+        token = self._tokens.get(key)
+        if token is not None and token.expires_on - REFRESH_MARGIN_SECONDS > time.time():
+            token_requests.add(1, {"scope": scope, "result": "hit"})
+            return token
+
+        token_requests.add(1, {"scope": scope, "result": "miss"})
+        with self._lock_for(key):
+            # Another thread may have refreshed it while we waited
+            token = self._tokens.get(key)
+            if token is None or token.expires_on - REFRESH_MARGIN_SECONDS <= time.time():
+                token = self._fetch(scopes, tenant_id, enable_cae, "on_demand", **kwargs)
+                self._tokens[key] = token
+        self._ensure_refresher()
+        return token
+
+    def _lock_for(self, key) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _fetch(self, scopes, tenant_id, enable_cae: bool, trigger: str, **kwargs) -> AccessToken:
+        if tenant_id:
+            kwargs["tenant_id"] = tenant_id
+        if enable_cae:
+            kwargs["enable_cae"] = True
+        start = time.perf_counter()
+        try:
+            return self.credential.get_token(*scopes, **kwargs)
+        finally:
+            fetch_duration.record(time.perf_counter() - start, {"scope": " ".join(scopes), "trigger": trigger})
+
+    # ---------- Background refresh ----------
+
+    def _ensure_refresher(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="token-broker-refresh", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            now = time.time()
+            next_due = now + self.proactive_refresh
+            for key, token in list(self._tokens.items()):
+                due = token.expires_on - self.proactive_refresh
+                if due <= now:
+                    self._refresh(key)
+                    token = self._tokens[key]
+                    due = token.expires_on - self.proactive_refresh
+                next_due = min(next_due, max(due, now + 5.0))
+            self._wakeup.wait(max(1.0, next_due - time.time()))
+
+    def _refresh(self, key):
+        scopes, tenant_id, enable_cae = key
+        try:
+            with self._lock_for(key):
+                self._tokens[key] = self._fetch(scopes, tenant_id, enable_cae, "background")
+        except Exception as e:
+            # The cached token is still valid for a while; get_token fetches inline if it runs out
+            logger.warning("Background refresh of %s failed: %s", " ".join(scopes), e)
+
+    def close(self):
+        """SDK clients may close their credential; the broker is shared, so it stays open."""
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+
+_broker: Optional[TokenBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_credential(**exclusions) -> TokenBroker:
+    """
+    The process-wide TokenBroker, created on first use. `exclusions` (see
+    build_credential) set its chain; callers passing none share whatever was set.
+    """
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = TokenBroker(**exclusions)
+        elif exclusions:
+            _broker.configure(**exclusions)
+        return _broker
@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from azure.ai.agents.models import FunctionTool
+
+try:
+    from scripts.chunking import count_tokens, get_encoding
+except ImportError:  # imported from inside scripts/
+    from chunking import count_tokens, get_encoding
+
+
+# What FunctionTool writes for a parameter without a ":param name: ..." line in the docstring
+PLACEHOLDER = "No description"
+
+INSTRUCTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instructions.txt")
+
+
+@dataclass(frozen=True)
+class SchemaVariant:
+    """
+    How much of the tool docstrings goes into the JSON schemas sent with every run.
+
+    `full` is what FunctionTool generates. The others drop the "No description"
+    placeholders, cut each tool's description to its first sentence and at most
+    `description_chars` characters, and keep parameter descriptions (cut to
+    `parameter_chars`) only when `parameter_descriptions` is set. Names,
+    types and required parameters are never touched, so tool calls still bind.
+    """
+
+    name: str
+    compact: bool = True
+    description_chars: Optional[int] = None
+    parameter_descriptions: bool = True
+    parameter_chars: Optional[int] = None
+
+    def describe(self) -> str:
+        if not self.compact:
+            return "as generated"
+        parts = [f"description <= {self.description_chars} chars" if self.description_chars else "first sentence"]
+        if not self.parameter_descriptions:
+            parts.append("no parameter descriptions")
+        elif self.parameter_chars:
+            parts.append(f"parameters <= {self.parameter_chars} chars")
+        return ", ".join(parts)
+
+
+VARIANTS = {variant.name: variant for variant in [
+    SchemaVariant("full", compact=False),
+    SchemaVariant("compact", description_chars=120, parameter_chars=160),
+    SchemaVariant("minimal", description_chars=60, parameter_descriptions=False),
+]}
+DEFAULT_VARIANT = "full"
+
+
+def get_variant(name: str = None) -> SchemaVariant:
+    """The variant called `name`, or AGENT_TOOL_SCHEMA's (default: full)."""
+    name = name or os.getenv("AGENT_TOOL_SCHEMA", DEFAULT_VARIANT)
+    try:
+        return VARIANTS[name]
+    except KeyError:
+        raise ValueError(f"unknown tool schema variant {name!r}; choose from {', '.join(VARIANTS)}") from None
+
+
+# ---------- Compaction ----------
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z])")
+# Words a cut description shouldn't end on
+DANGLING = re.compile(r"(\s+(a|an|and|as|by|for|from|in|of|on|or|the|to|using|with))+$", re.IGNORECASE)
+
+
+def trim(text: str, limit: Optional[int], first_sentence: bool = True) -> str:
+    """`text` (its first sentence only, by default) cut at a word boundary to at most `limit` characters."""
+    text = " ".join(text.split())
+    if first_sentence:
+        text = SENTENCE_END.split(text, maxsplit=1)[0]
+    if limit and len(text) > limit:
+        text = DANGLING.sub("", text[:limit + 1].rsplit(" ", 1)[0].rstrip(",;:"))
+    return text
+
+
+def compact_definition(definition: Dict[str, Any], variant: SchemaVariant) -> Dict[str, Any]:
+    """A copy of one tool definition (FunctionToolDefinition.as_dict()) trimmed as `variant` says."""
+    if not variant.compact:
+        return definition
+    function = dict(definition["function"])
+    function["description"] = trim(function.get("description", ""), variant.description_chars)
+    parameters = dict(function.get("parameters") or {})
+    properties = {}
+    for name, schema in (parameters.get("properties") or {}).items():
+        schema = dict(schema)
+        description = schema.pop("description", "")
+        if variant.parameter_descriptions and description and description != PLACEHOLDER:
+            schema["description"] = trim(description, variant.parameter_chars, first_sentence=False)
+        properties[name] = schema
+    parameters["properties"] = properties
+    if not parameters.get("required"):
+        parameters.pop("required", None)
+    function["parameters"] = parameters
+    return {**definition, "function": function}
+
+
+class CompactFunctionTool(FunctionTool):
+    """FunctionTool whose definitions are trimmed by a SchemaVariant; executing the tools is unchanged."""
+
+    def __init__(self, functions: Set[Callable[..., Any]], variant: SchemaVariant = None):
+        self.variant = variant or get_variant()
+        super().__init__(functions)
+
+    def _build_function_definitions(self, functions):
+        from azure.ai.agents.models import FunctionToolDefinition
+
+        definitions = super()._build_function_definitions(functions)
+        if not self.variant.compact:
+            return definitions
+        return [FunctionToolDefinition(compact_definition(definition.as_dict(), self.variant))
+                for definition in definitions]
+
+
+# ---------- Footprint ----------
+# Counted on the JSON the SDK sends; the model sees the tools rendered in its own
+# prompt format, so treat the numbers as close estimates rather than billing.
+
+
+def definition_tokens(definition: Dict[str, Any]) -> int:
+    return count_tokens(json.dumps(definition, separators=(",", ":")))
+
+
+def instruction_sections(text: str) -> List[Dict[str, Any]]:
+    """Tokens per "## " section of the instructions; text before the first heading is its own entry."""
+    sections, title, lines = [], "(preamble)", []
+    for line in text.splitlines(keepends=True):
+        if line.startswith("## "):
+            if "".join(lines).strip():
+                sections.append({"section": title, "tokens": count_tokens("".join(lines))})
+            title, lines = line[3:].strip(), []
+        lines.append(line)
+    if "".join(lines).strip():
+        sections.append({"section": title, "tokens": count_tokens("".join(lines))})
+    return sections
+
+
+def footprint(instructions: str, functions: Set[Callable[..., Any]], variant: SchemaVariant) -> Dict[str, Any]:
+    """Fixed input tokens of every model call: the agent's instructions plus the tool schemas under `variant`."""
+    definitions = [definition.as_dict() for definition in CompactFunctionTool(functions, variant).definitions]
+    tools = sorted(({"tool": d["function"]["name"], "tokens": definition_tokens(d)} for d in definitions),
+                   key=lambda row: -row["tokens"])
+    instructions_tokens = count_tokens(instructions)
+    tools_tokens = sum(row["tokens"] for row in tools)
+    return {
+        "variant": variant.name,
+        "description": variant.describe(),
+        "instructions_tokens": instructions_tokens,
+        "tools_tokens": tools_tokens,
+        "total_tokens": instructions_tokens + tools_tokens,
+        "tools": tools,
+        "definitions": definitions,
+    }
+
+
+def print_report(rows: List[Dict[str, Any]], sections: List[Dict[str, Any]], tokenizer: str):
+    print(f"Tokens: {tokenizer}. Sent with every model call, i.e. once per tool round of a run.")
+    print("\nInstructions")
+    for row in sections:
+        print(f"  {row['tokens']:>6}  {row['section']}")
+    print(f"  {sum(row['tokens'] for row in sections):>6}  total")
+    baseline = rows[0]["total_tokens"]
+    print("\nTool schemas")
+    for row in rows:
+        saved = baseline - row["total_tokens"]
+        print(f"  {row['variant']:<10} {row['description']:<48} tools {row['tools_tokens']:>5}  "
+              f"instructions + tools {row['total_tokens']:>6}" + (f"  saves {saved}" if saved else ""))
+        for tool in row["tools"]:
+            print(f"    {tool['tokens']:>6}  {tool['tool']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the token footprint of the agent instructions and tool schemas.")
+    parser.add_argument("--instructions", default=INSTRUCTIONS_PATH)
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="schema variants; the first is the baseline")
+    parser.add_argument("--output", help="also write the report, with the compacted schemas, as JSON")
+    args = parser.parse_args()
+
+    try:
+        from scripts.tools import user_functions
+    except ImportError:
+        from tools import user_functions
+
+    with open(args.instructions, encoding="utf-8") as f:
+        instructions = f.read()
+    rows = [footprint(instructions, user_functions, get_variant(name)) for name in args.variants.split(",")]
+    sections = instruction_sections(instructions)
+    tokenizer = "cl100k_base" if get_encoding() is not None else "estimated (4 chars/token)"
+    print_report(rows, sections, tokenizer)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"tokenizer": tokenizer, "instructions": sections, "variants": rows}, f, indent=2)
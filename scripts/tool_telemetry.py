@@ -0,0 +1,89 @@
+import functools
+import time
+from contextlib import contextmanager
+
+from opentelemetry import metrics, trace
+from opentelemetry.trace import Status, StatusCode
+
+try:
+    from scripts.deadline import Cancelled, record_cancelled
+except ImportError:  # imported from inside scripts/
+    from deadline import Cancelled, record_cancelled
+
+
+tracer = trace.get_tracer(__name__)
+meter = metrics.get_meter(__name__)
+
+tool_duration = meter.create_histogram(
+    "tool.duration", unit="s", description="End-to-end duration of a tool call, by tool and outcome."
+)
+phase_duration = meter.create_histogram(
+    "tool.phase.duration", unit="s", description="Duration of one phase of a tool call, by tool and phase."
+)
+result_rows = meter.create_histogram(
+    "tool.result.rows", description="Rows or hits a tool call produced, by tool."
+)
+result_bytes = meter.create_histogram(
+    "tool.result.bytes", unit="By", description="UTF-8 size of the text a tool returned to the model, by tool."
+)
+result_chars = meter.create_histogram(
+    "tool.result.chars", description="Characters a tool returned to the model, by tool."
+)
+
+
+@contextmanager
+def phase(tool: str, name: str):
+    """Child span plus a tool.phase.duration sample for one step of a tool, e.g. key_vault or query."""
+    attributes = {"tool": tool, "phase": name}
+    start = time.perf_counter()
+    with tracer.start_as_current_span(f"{tool}.{name}", attributes=attributes) as span:
+        try:
+            yield span
+        except Exception as e:
+            attributes["error"] = type(e).__name__
+            raise
+        except Cancelled:
+            attributes["error"] = "cancelled"
+            raise
+        finally:
+            phase_duration.record(time.perf_counter() - start, attributes)
+
+
+def record_result(tool: str, text: str, rows: int = None):
+    """Record how much a tool handed back to the model, on the current span and as metrics."""
+    attributes = {"tool": tool}
+    encoded = len(text.encode("utf-8"))
+    span = trace.get_current_span()
+    span.set_attribute("result.chars", len(text))
+    span.set_attribute("result.bytes", encoded)
+    result_chars.record(len(text), attributes)
+    result_bytes.record(encoded, attributes)
+    if rows is not None:
+        span.set_attribute("result.rows", rows)
+        result_rows.record(rows, attributes)
+
+
+def measure_tool(func):
+    """
+    Record tool.duration for every call; an error string returned by the tool still counts as ok.
+    Calls cut short by a cancelled request count as outcome=cancelled in deadline.cancelled_work too.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            outcome = "exception"
+            trace.get_current_span().set_status(Status(StatusCode.ERROR))
+            raise
+        except Cancelled as e:
+            outcome = "cancelled"
+            record_cancelled("tool", func.__name__, e.reason, start)
+            raise
+        finally:
+            tool_duration.record(time.perf_counter() - start, {"tool": func.__name__, "outcome": outcome})
+
+    return wrapper
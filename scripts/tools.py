@@ -1,93 +1,219 @@
+import math
 import os
-import pandas as pd
-import pyodbc
-# from azure.core.credentials import TokenCredential
-from azure.identity import DefaultAzureCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.models import VectorizedQuery
-from openai import AzureOpenAI
-from serpapi import GoogleSearch
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.units import inch
-from typing import Any, Callable, Set
+import threading
+from contextlib import closing
+from typing import Any, Callable, Dict, List, Optional, Set
 from opentelemetry import trace
 from azure.keyvault.secrets import SecretClient
 
-credential = DefaultAzureCredential(
-    exclude_environment_credential=False,
-    exclude_managed_identity_credential=False,
-    exclude_shared_token_cache_credential=True,   # skip local cache
-    exclude_visual_studio_code_credential=True,
-)
+try:
+    from scripts.startup import prefetch_secrets
+    from scripts.tool_telemetry import measure_tool, phase, record_result
+    from scripts.resilience import BackendUnavailable, backend
+    from scripts.singleflight import coalesce
+    from scripts.token_broker import get_credential
+    from scripts.sql_params import input_sizes, prepare
+    from scripts.retrieval import RetrievalProfile, get_profile as get_retrieval_profile
+    from scripts import deadline as request_deadline
+    from scripts import patient_queries
+except ImportError:  # imported from inside scripts/
+    from startup import prefetch_secrets
+    from tool_telemetry import measure_tool, phase, record_result
+    from resilience import BackendUnavailable, backend
+    from singleflight import coalesce
+    from token_broker import get_credential
+    from sql_params import input_sizes, prepare
+    from retrieval import RetrievalProfile, get_profile as get_retrieval_profile
+    import deadline as request_deadline
+    import patient_queries
+
+# Heavy tool dependencies (pandas, pyodbc, openai, serpapi, reportlab and the
+# Search SDK) are imported inside the tools on first use to keep cold start short.
+
+# Process-wide credential with cached, proactively refreshed tokens (AZURE_CREDENTIAL_TYPE)
+credential = get_credential()
 
 key_vault = SecretClient(vault_url=os.environ["KEYVAULT_URL"], credential=credential)
 
 tracer = trace.get_tracer(__name__)
 
+SEARCH_SECRETS = ("azureai-search-index-name", "azure-openai-endpoint", "azure-openai-embedding-deployment")
+SQL_SECRETS = ("azure-sql-server", "azure-sql-database", "azure-sql-username", "azure-sql-password")
+SERPAPI_SECRETS = ("serp-api-key",)
 
-@tracer.start_as_current_span("search_acc_guidelines")  # type: ignore
-def search_acc_guidelines(query: str) -> str:
+# Overrides https://serpapi.com, e.g. to point at a local stand-in for benchmarks
+SERPAPI_BACKEND = os.getenv("SERPAPI_BACKEND")
+
+# k, top, keyword/vector/hybrid, semantic ranking and counting for the guidelines search (SEARCH_RETRIEVAL_PROFILE)
+RETRIEVAL_PROFILE = get_retrieval_profile()
+
+# Breakers, retries and hedging per backend; see scripts/resilience.py
+embedding_backend = backend("azure_openai", hedge=True, deadline_s=10.0)
+search_backend = backend("azure_search", hedge=True, deadline_s=10.0)
+sql_backend = backend("azure_sql", retries=1, deadline_s=30.0)
+serpapi_backend = backend("serpapi", retries=1, deadline_s=15.0)  # billed per query, so no hedging
+
+_secret_cache: Dict[str, str] = {}
+_secret_lock = threading.Lock()
+
+
+def get_secrets(*names: str) -> Dict[str, str]:
+    """Return the requested secrets, fetching any not yet cached concurrently."""
+    missing = [name for name in names if name not in _secret_cache]
+    if missing:
+        fetched = prefetch_secrets(key_vault, missing)
+        with _secret_lock:
+            _secret_cache.update(fetched)
+    return {name: _secret_cache[name] for name in names}
+
+
+def prefetch_tool_secrets():
+    """Warm the secret cache for every tool so the first tool call doesn't hit Key Vault."""
+    get_secrets(*SEARCH_SECRETS, *SQL_SECRETS, *SERPAPI_SECRETS)
+
+
+def connect_sql():
+    """Open a DB-API connection to the patient database (Azure SQL over ODBC)."""
+    import pyodbc
+
+    secrets = get_secrets(*SQL_SECRETS)
+    server = secrets["azure-sql-server"]
+    database = secrets["azure-sql-database"]
+    username = secrets["azure-sql-username"]
+    password = secrets["azure-sql-password"]
+    driver = '{ODBC Driver 18 for SQL Server}'
+    connection_string = f'DRIVER={driver};SERVER={server};DATABASE={database};UID={username};PWD={password}'
+    return pyodbc.connect(connection_string, timeout=30)
+
+
+def is_sql_outage(error: BaseException) -> bool:
+    """Connection failures and timeouts count against the SQL breaker; mistakes in the model's SQL don't."""
+    while error is not None:
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        # pyodbc puts the SQLSTATE first: 08xxx is a connection error, HYT00/HYT01 a timeout
+        sqlstate = str(error.args[0]) if error.args else ""
+        if sqlstate.startswith(("08", "HYT")):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def query_sql(tool: str, sql: str, params, max_rows: int = None):
     """
-    Searches the Azure AI Search index 'acc-guidelines-index'
-    for relevant American College of Cardiology (ACC) guidelines.
+    Run one SELECT against the patient database under the SQL breaker and the
+    request deadline; (column names, rows), at most `max_rows` of them if given.
     """
-    
-    try:
-        credential = DefaultAzureCredential()
+    with phase(tool, "key_vault"):
+        get_secrets(*SQL_SECRETS)
+
+    # Each attempt opens its own connection: a timed-out attempt may still be using the old one
+    def run_query():
+        with phase(tool, "connect"):
+            engine = connect_sql()
+        with closing(engine):
+            # No longer on the server than the request has left, and cancelled outright if the request ends
+            engine.timeout = math.ceil(request_deadline.timeout(sql_backend.policy.deadline_s))
+            cursor = engine.cursor()
+            with request_deadline.on_cancel("azure_sql", cursor.cancel), phase(tool, "query"):
+                cursor.setinputsizes(input_sizes(params))
+                cursor.execute(sql, params)
+                columns = [column[0] for column in cursor.description]
+                rows = cursor.fetchall() if max_rows is None else cursor.fetchmany(max_rows)
+                return columns, [tuple(row) for row in rows]
+
+    return sql_backend.call(run_query, is_failure=is_sql_outage)
+
+
+def retrieve_guidelines(query: str, profile: RetrievalProfile, tool: str = "search_acc_guidelines") -> List[str]:
+    """Chunks from the guidelines index for `query`, searched the way `profile` says."""
+    from azure.search.documents import SearchClient
+
+    with phase(tool, "key_vault"):
         # AZURE_SEARCH_ENDPOINT = key_vault.get_secret("azure-search-endpoint").value
         AZURE_SEARCH_ENDPOINT = os.environ["AZURE_SEARCH_ENDPOINT"]
-        SEARCH_INDEX_NAME = key_vault.get_secret("azureai-search-index-name").value
-        AOAI_ENDPOINT = key_vault.get_secret("azure-openai-endpoint").value
+        secrets = get_secrets(*SEARCH_SECRETS)
+        SEARCH_INDEX_NAME = secrets["azureai-search-index-name"]
+        AOAI_ENDPOINT = secrets["azure-openai-endpoint"]
         AOAI_API_VERSION = "2024-04-01-preview"
-        AOAI_EMBEDDING_DEPLOYMENT = key_vault.get_secret("azure-openai-embedding-deployment").value
-        
-        aad_token = DefaultAzureCredential().get_token("https://cognitiveservices.azure.com/.default").token
-        aoai_client = AzureOpenAI(
-            azure_ad_token=aad_token,
-            azure_endpoint=AOAI_ENDPOINT,
-            api_version=AOAI_API_VERSION,
-        )
-        qvec = aoai_client.embeddings.create(
-            model=AOAI_EMBEDDING_DEPLOYMENT,
-            input=query
-        ).data[0].embedding
-        
+        AOAI_EMBEDDING_DEPLOYMENT = secrets["azure-openai-embedding-deployment"]
+
+    qvec = None
+    if profile.needs_embedding:
+        from openai import AzureOpenAI
+
+        with phase(tool, "token"):
+            aad_token = credential.get_token("https://cognitiveservices.azure.com/.default").token
+
+        with phase(tool, "embedding"):
+            aoai_client = AzureOpenAI(
+                azure_ad_token=aad_token,
+                azure_endpoint=AOAI_ENDPOINT,
+                api_version=AOAI_API_VERSION,
+                timeout=request_deadline.timeout(embedding_backend.policy.deadline_s),
+            )
+            # Closing the client drops its connections, aborting a request the user no longer waits for
+            with request_deadline.on_cancel("azure_openai", aoai_client.close):
+                qvec = embedding_backend.call(lambda: aoai_client.embeddings.create(
+                    model=AOAI_EMBEDDING_DEPLOYMENT,
+                    input=query
+                ).data[0].embedding)
+
+    with phase(tool, "connect"):
         client = SearchClient(
             endpoint=AZURE_SEARCH_ENDPOINT,
             index_name=SEARCH_INDEX_NAME,
             credential=credential,
         )
-        
-        span = trace.get_current_span()
-        span.set_attribute("search_index_query", query)
+
+    span = trace.get_current_span()
+    span.set_attribute("search_index_query", query)
+    span.set_attribute("search.retrieval_profile", profile.name)
+    # Results are paged lazily, so the HTTP round trip happens while iterating
+    def run_search():
         results = client.search(
-            search_text=query,
-            vector_queries=[
-                        VectorizedQuery(
-                            vector = qvec,
-                            k_nearest_neighbors=10,
-                            fields="content_vector"
-                        )
-            ],
-            search_fields=["content"],
-            top=10,
-            include_total_count=True,
-        )
-        retrieved_texts = [result.get("content", "") for result in results]
-        context_str = (
-            "\n".join(retrieved_texts)
-            if retrieved_texts
-            else "No relevant guidelines found."
+            **profile.search_options(query, qvec),
+            connection_timeout=request_deadline.timeout(search_backend.policy.deadline_s),
+            read_timeout=request_deadline.timeout(search_backend.policy.deadline_s),
         )
+        return [result.get("content", "") for result in results]
+
+    with phase(tool, "search"), request_deadline.on_cancel("azure_search", client.close):
+        # Semantic ranking is billed and rate-limited per query, so those are never hedged
+        return search_backend.call(run_search, hedge=not profile.semantic)
+
+
+@tracer.start_as_current_span("search_acc_guidelines")  # type: ignore
+@measure_tool
+@coalesce  # identical concurrent calls share one backend round trip
+def search_acc_guidelines(query: str) -> str:
+    """
+    Searches the Azure AI Search index 'acc-guidelines-index'
+    for relevant American College of Cardiology (ACC) guidelines.
+    """
+    
+    tool = "search_acc_guidelines"
+    try:
+        retrieved_texts = retrieve_guidelines(query, RETRIEVAL_PROFILE, tool)
+
+        with phase(tool, "serialize"):
+            context_str = (
+                "\n".join(retrieved_texts)
+                if retrieved_texts
+                else "No relevant guidelines found."
+            )
+        record_result(tool, context_str, rows=len(retrieved_texts))
         return context_str
 
+    except BackendUnavailable as e:
+        return e.to_result()
     except Exception as e:
         
         return f"Error {e}"
     
 @tracer.start_as_current_span("search_serpapi_web")  # type: ignore
+@measure_tool
+@coalesce
 def search_serpapi_web(query: str, num_results: int = 5) -> str:
     """
     Perform a Google search using SerpAPI and return summarized top results.
@@ -100,7 +226,11 @@ def search_serpapi_web(query: str, num_results: int = 5) -> str:
         str: A formatted string of search results.
     """
     
-    SERPAPI_API_KEY = key_vault.get_secret("serp-api-key").value
+    from serpapi import GoogleSearch
+
+    tool = "search_serpapi_web"
+    with phase(tool, "key_vault"):
+        SERPAPI_API_KEY = get_secrets(*SERPAPI_SECRETS)["serp-api-key"]
     if not SERPAPI_API_KEY:
         return "❌ SerpAPI key is not set. Please check your .env file."
 
@@ -116,54 +246,187 @@ def search_serpapi_web(query: str, num_results: int = 5) -> str:
         span = trace.get_current_span()
         span.set_attribute("requested_web_search", query)
         
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        with phase(tool, "request"):
+            search = GoogleSearch(params)
+            if SERPAPI_BACKEND:
+                search.BACKEND = SERPAPI_BACKEND
+            # The client makes a one-off requests.get, so a read timeout is what bounds an abandoned call
+            search.timeout = request_deadline.timeout(serpapi_backend.policy.deadline_s)
+            results = serpapi_backend.call(search.get_dict)
 
         if "error" in results:
             return f"❌ SerpAPI error: {results['error']}"
 
-        snippets = []
-        for idx, result in enumerate(results.get("organic_results", []), 1):
-            title = result.get("title", "No title")
-            snippet = result.get("snippet", "No snippet available.")
-            link = result.get("link", "No link")
-            snippets.append(f"{idx}. **{title}**\n{snippet}\n🔗 {link}")
+        with phase(tool, "serialize"):
+            snippets = []
+            for idx, result in enumerate(results.get("organic_results", []), 1):
+                title = result.get("title", "No title")
+                snippet = result.get("snippet", "No snippet available.")
+                link = result.get("link", "No link")
+                snippets.append(f"{idx}. **{title}**\n{snippet}\n🔗 {link}")
 
-        return "\n\n".join(snippets) if snippets else "No results found."
+            output = "\n\n".join(snippets) if snippets else "No results found."
+        record_result(tool, output, rows=len(snippets))
+        return output
     
 
+    except BackendUnavailable as e:
+        return e.to_result()
     except Exception as e:
         return f"❌ SerpAPI request failed: {str(e)}"
 
 
 @tracer.start_as_current_span("lookup_patient_data")  # type: ignore
-def lookup_patient_data(query: str) -> str:
+@measure_tool
+@coalesce
+def lookup_patient_data(query: str, parameters: Optional[List[str]] = None) -> str:
     """
-    Queries the 'PatientMedicalData' table in Azure SQL and returns the results as a string.
-    'query' should be a valid SQL statement.
+    Queries the 'PatientMedicalData' table in Azure SQL for counts and ad-hoc analysis and returns the results as a string.
+
+    Named patients, patient IDs and condition/medication lists have their own tools
+    (get_patient_by_name, get_patient_by_id, list_patient_cohort) with fixed, indexed queries.
+
+    :param query: A T-SQL SELECT statement. Use ? placeholders for values, e.g. WHERE LastName = ? AND HeartRate_bpm > ?
+    :param parameters: Values for the ? placeholders, in order.
     """
+    tool = "lookup_patient_data"
     try:
+        import pandas as pd
         
         span = trace.get_current_span()
         span.set_attribute("patient_data_query", query)
-        
-        server = key_vault.get_secret("azure-sql-server").value
-        database = key_vault.get_secret("azure-sql-database").value        # Replace with your database name
-        username = key_vault.get_secret("azure-sql-username").value        # Replace with your username
-        password = key_vault.get_secret("azure-sql-password").value        # Replace with your password
-        driver = '{ODBC Driver 18 for SQL Server}'
-        connection_string = f'DRIVER={driver};SERVER={server};DATABASE={database};UID={username};PWD={password}'
-        engine = pyodbc.connect(connection_string, timeout=30)
-        print("DONE!!!!!")
-        df = pd.read_sql(query, engine)
+
+        # Bound parameters let SQL Server reuse one plan per query shape instead of compiling per literal
+        sql, params = prepare(query, parameters)
+        span.set_attribute("patient_data_parameters", len(params))
+
+        columns, rows = query_sql(tool, sql, params)
+        df = pd.DataFrame.from_records(rows, columns=columns)
         if df.empty:
+            record_result(tool, "No rows found.", rows=0)
             return "No rows found."
-        return df.to_string(index=False)
+        with phase(tool, "serialize"):
+            output = df.to_string(index=False)
+        record_result(tool, output, rows=len(df))
+        return output
+    except BackendUnavailable as e:
+        return e.to_result()
     except Exception as e:
         return f"Database error: {str(e)}"
     
     
+@tracer.start_as_current_span("get_patient_by_name")  # type: ignore
+@measure_tool
+@coalesce
+def get_patient_by_name(last_name: str, first_name: Optional[str] = None) -> str:
+    """
+    Look up a patient's record by name; use this instead of lookup_patient_data for a named patient.
+
+    :param last_name: The patient's last name, e.g. Paul.
+    :param first_name: The patient's first name, e.g. Gloria. Leave out to list everyone with the last name.
+    """
+    tool = "get_patient_by_name"
+    last_name = " ".join(last_name.split())
+    first_name = " ".join((first_name or "").split()) or None
+    try:
+        key = patient_queries.name_key(first_name, last_name)
+        patient_ids = patient_queries.cache.get(key, "name")
+        rows = patient_queries.cached_profiles(patient_ids) if patient_ids is not None else None
+        trace.get_current_span().set_attribute("cache.hit", rows is not None)
+        if rows is None:
+            params = [last_name, first_name] if first_name else [last_name]
+            _, rows = query_sql(tool, patient_queries.by_name(first_name), params)
+            patient_queries.remember(rows, key)
+
+        if not rows:
+            output = f"No patient named {' '.join(filter(None, [first_name, last_name]))}."
+        elif len(rows) == 1:
+            output = patient_queries.format_profile(rows[0])
+        else:
+            shown = rows[:patient_queries.MAX_NAME_MATCHES]
+            more = "More than " if len(rows) > len(shown) else ""
+            output = (f"{more}{len(shown)} patients match; ask which one is meant, then use get_patient_by_id:\n"
+                      + patient_queries.format_matches(shown))
+        record_result(tool, output, rows=len(rows))
+        return output
+    except BackendUnavailable as e:
+        return e.to_result()
+    except Exception as e:
+        return f"Database error: {str(e)}"
+
+
+@tracer.start_as_current_span("get_patient_by_id")  # type: ignore
+@measure_tool
+@coalesce
+def get_patient_by_id(patient_id: int) -> str:
+    """
+    Look up a patient's record by PatientID.
+
+    :param patient_id: The PatientID from an earlier lookup.
+    """
+    tool = "get_patient_by_id"
+    try:
+        row = patient_queries.cache.get(("id", patient_id), "id")
+        trace.get_current_span().set_attribute("cache.hit", row is not None)
+        if row is None:
+            _, rows = query_sql(tool, patient_queries.by_id(), [int(patient_id)], max_rows=1)
+            patient_queries.remember(rows)
+            row = rows[0] if rows else None
+
+        output = patient_queries.format_profile(row) if row else f"No patient with ID {patient_id}."
+        record_result(tool, output, rows=1 if row else 0)
+        return output
+    except BackendUnavailable as e:
+        return e.to_result()
+    except Exception as e:
+        return f"Database error: {str(e)}"
+
+
+@tracer.start_as_current_span("list_patient_cohort")  # type: ignore
+@measure_tool
+@coalesce
+def list_patient_cohort(condition: Optional[str] = None, medication: Optional[str] = None, limit: int = 30) -> str:
+    """
+    List patients with a medical condition and/or on a medication, by name.
+
+    :param condition: One of Hypertension, Type 2 Diabetes, Asthma, Migraine, Anxiety, Depression, Arthritis, Hyperlipidemia.
+    :param medication: One of Lisinopril, Metformin, Albuterol, Ibuprofen, Sertraline, Acetaminophen, Aspirin, Atorvastatin.
+    :param limit: Most patients to list, up to 30.
+    """
+    tool = "list_patient_cohort"
+    try:
+        if not condition and not medication:
+            return "Give a condition, a medication or both; use lookup_patient_data for other filters."
+        try:
+            params = []
+            if condition:
+                params.append(patient_queries.canonical_condition(condition))
+            if medication:
+                params.append(patient_queries.canonical_medication(medication))
+        except ValueError as e:
+            return f"Invalid filter: {e}"
+        limit = max(1, min(int(limit), patient_queries.MAX_COHORT_ROWS))
+
+        import pandas as pd
+
+        columns, rows = query_sql(tool, patient_queries.cohort(condition, medication, limit), params,
+                                  max_rows=limit + 1)
+        if not rows:
+            output = "No patients match."
+        else:
+            output = pd.DataFrame.from_records(rows[:limit], columns=columns).to_string(index=False)
+            if len(rows) > limit:
+                output += f"\n\nFirst {limit} patients shown; use lookup_patient_data with COUNT(*) for the total."
+        record_result(tool, output, rows=min(len(rows), limit))
+        return output
+    except BackendUnavailable as e:
+        return e.to_result()
+    except Exception as e:
+        return f"Database error: {str(e)}"
+
+
 @tracer.start_as_current_span("generate_discharge_summary")  # type: ignore
+@measure_tool
 def generate_discharge_summary(patient_name: str, diagnosis: str, treatment: str, follow_up_instructions: str = "") -> dict:
     """
     Generate a discharge summary PDF for a patient.
@@ -178,6 +441,11 @@ def generate_discharge_summary(patient_name: str, diagnosis: str, treatment: str
         dict: Contains the local file path to the generated PDF.
     """
 
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.units import inch
+
     # Prepare output directory and file name
     
     span = trace.get_current_span()
@@ -192,52 +460,68 @@ def generate_discharge_summary(patient_name: str, diagnosis: str, treatment: str
     safe_name = patient_name.replace(" ", "_").lower()
     file_path = os.path.join(output_dir, f"{safe_name}_discharge_summary.pdf")
 
-    # Create PDF document
-    doc = SimpleDocTemplate(file_path, pagesize=A4)
-    elements = []
+    tool = "generate_discharge_summary"
+    with phase(tool, "layout"):
+        # Create PDF document
+        doc = SimpleDocTemplate(file_path, pagesize=A4)
+        elements = []
 
-    # Styles
-    styles = getSampleStyleSheet()
-    style_heading = styles['Heading1']
-    style_label = ParagraphStyle(name="Label", fontSize=12, fontName="Helvetica-Bold")
-    style_text = ParagraphStyle(name="Text", fontSize=12, fontName="Helvetica")
+        # Styles
+        styles = getSampleStyleSheet()
+        style_heading = styles['Heading1']
+        style_label = ParagraphStyle(name="Label", fontSize=12, fontName="Helvetica-Bold")
+        style_text = ParagraphStyle(name="Text", fontSize=12, fontName="Helvetica")
 
-    # Header
-    elements.append(Paragraph("Discharge Summary", style_heading))
-    elements.append(Spacer(1, 0.3 * inch))
+        # Header
+        elements.append(Paragraph("Discharge Summary", style_heading))
+        elements.append(Spacer(1, 0.3 * inch))
 
-    # Patient Name
-    elements.append(Paragraph("Patient Name:", style_label))
-    elements.append(Paragraph(patient_name, style_text))
-    elements.append(Spacer(1, 0.2 * inch))
+        # Patient Name
+        elements.append(Paragraph("Patient Name:", style_label))
+        elements.append(Paragraph(patient_name, style_text))
+        elements.append(Spacer(1, 0.2 * inch))
 
-    # Diagnosis
-    elements.append(Paragraph("Diagnosis:", style_label))
-    elements.append(Paragraph(diagnosis, style_text))
-    elements.append(Spacer(1, 0.2 * inch))
+        # Diagnosis
+        elements.append(Paragraph("Diagnosis:", style_label))
+        elements.append(Paragraph(diagnosis, style_text))
+        elements.append(Spacer(1, 0.2 * inch))
 
-    # Treatment
-    elements.append(Paragraph("Treatment:", style_label))
-    elements.append(Paragraph(treatment, style_text))
-    elements.append(Spacer(1, 0.2 * inch))
+        # Treatment
+        elements.append(Paragraph("Treatment:", style_label))
+        elements.append(Paragraph(treatment, style_text))
+        elements.append(Spacer(1, 0.2 * inch))
 
-    # Follow-up Instructions
-    elements.append(Paragraph("Follow-Up Instructions:", style_label))
-    elements.append(Paragraph(follow_up_instructions or "N/A", style_text))
-    elements.append(Spacer(1, 0.2 * inch))
+        # Follow-up Instructions
+        elements.append(Paragraph("Follow-Up Instructions:", style_label))
+        elements.append(Paragraph(follow_up_instructions or "N/A", style_text))
+        elements.append(Spacer(1, 0.2 * inch))
 
     # Build the PDF
     
-    doc.build(elements)
+    # Checked after every flowable, so a cancelled request stops the render and leaves no partial file
+    doc.setProgressCallBack(lambda kind, value: request_deadline.check())
+    with phase(tool, "render") as render_span:
+        try:
+            doc.build(elements)
+        except request_deadline.Cancelled:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        render_span.set_attribute("pdf.bytes", os.path.getsize(file_path))
     # Make the file available to download in Chainlit
     file_path = os.path.join(output_dir, f"{safe_name}_discharge_summary.pdf")
     
-    return f"Discharge summary generated and available for download. {file_path}"
+    output = f"Discharge summary generated and available for download. {file_path}"
+    record_result(tool, output)
+    return output
 
 
 user_functions: Set[Callable[..., Any]] = {
     search_acc_guidelines,
     search_serpapi_web,
     lookup_patient_data,
+    get_patient_by_name,
+    get_patient_by_id,
+    list_patient_cohort,
     generate_discharge_summary
 }
\ No newline at end of file
@@ -0,0 +1,102 @@
+import math
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+NONE, SCALAR, BINARY = "none", "scalar", "binary"
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+@dataclass
+class VectorIndexOptions:
+    """
+    How setup_index stores and searches text_vector. The defaults reproduce the
+    original index: full-precision float32 vectors, stored, default HNSW parameters.
+
+    Compression quantizes the vectors held in the HNSW graph (int8 for scalar, one
+    bit per dimension for binary). With `rescore` the service keeps the originals
+    on disk and re-ranks `oversampling` x k quantized candidates with them; without
+    it the originals are discarded. `truncation_dimension` additionally keeps only
+    the leading dimensions in the graph, which suits Matryoshka-trained models
+    (text-embedding-3-*) far better than ada-002.
+    """
+
+    compression: str = NONE
+    rescore: bool = True
+    oversampling: Optional[float] = None  # service default when None
+    truncation_dimension: Optional[int] = None
+    # A retrievable copy of each vector; search never needs it
+    stored: bool = True
+    hnsw_m: int = 4
+    hnsw_ef_construction: int = 400
+    hnsw_ef_search: int = 500
+
+    def __post_init__(self):
+        if self.compression not in (NONE, SCALAR, BINARY):
+            raise ValueError(f"compression must be one of none, scalar, binary, not {self.compression!r}")
+        if self.truncation_dimension and self.compression == NONE:
+            raise ValueError("truncation_dimension needs scalar or binary compression")
+        # The service's accepted ranges
+        if not 4 <= self.hnsw_m <= 10:
+            raise ValueError("hnsw_m must be between 4 and 10")
+        if not 100 <= self.hnsw_ef_construction <= 1000:
+            raise ValueError("hnsw_ef_construction must be between 100 and 1000")
+        if not 100 <= self.hnsw_ef_search <= 1000:
+            raise ValueError("hnsw_ef_search must be between 100 and 1000")
+
+    @classmethod
+    def from_env(cls) -> "VectorIndexOptions":
+        """Options from AZURE_SEARCH_VECTOR_* and AZURE_SEARCH_HNSW_*; unset variables keep the defaults."""
+        defaults = cls()
+        return cls(
+            compression=os.getenv("AZURE_SEARCH_VECTOR_COMPRESSION", defaults.compression),
+            rescore=os.getenv("AZURE_SEARCH_VECTOR_RESCORE", "true") == "true",
+            oversampling=_env_float("AZURE_SEARCH_VECTOR_OVERSAMPLING"),
+            truncation_dimension=_env_int("AZURE_SEARCH_VECTOR_DIMENSIONS"),
+            stored=os.getenv("AZURE_SEARCH_VECTOR_STORED", "true") == "true",
+            hnsw_m=_env_int("AZURE_SEARCH_HNSW_M") or defaults.hnsw_m,
+            hnsw_ef_construction=_env_int("AZURE_SEARCH_HNSW_EF_CONSTRUCTION") or defaults.hnsw_ef_construction,
+            hnsw_ef_search=_env_int("AZURE_SEARCH_HNSW_EF_SEARCH") or defaults.hnsw_ef_search,
+        )
+
+    def describe(self) -> str:
+        parts = [self.compression]
+        if self.compression != NONE:
+            parts.append(f"rescore x{self.oversampling or 'default'}" if self.rescore else "no rescore")
+        if self.truncation_dimension:
+            parts.append(f"{self.truncation_dimension}d")
+        if not self.stored:
+            parts.append("not stored")
+        parts.append(f"m={self.hnsw_m} efC={self.hnsw_ef_construction} efS={self.hnsw_ef_search}")
+        return ", ".join(parts)
+
+    def bytes_per_vector(self, dimensions: int) -> Dict[str, int]:
+        """
+        Approximate bytes per document for a `dimensions`-wide embedding: `memory` is
+        the vector held in the HNSW graph (plus its 2*m layer-0 links), `disk` the
+        copies kept on disk (retrievable copy, originals kept for rescoring).
+        """
+        graph_dimensions = self.truncation_dimension or dimensions
+        if self.compression == SCALAR:
+            quantized = graph_dimensions
+        elif self.compression == BINARY:
+            quantized = math.ceil(graph_dimensions / 8)
+        else:
+            quantized = graph_dimensions * 4
+        full = dimensions * 4
+        disk = quantized
+        if self.stored:
+            disk += full
+        if self.compression != NONE and self.rescore:
+            disk += full
+        return {"memory": quantized + 2 * self.hnsw_m * 4, "disk": disk}
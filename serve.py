@@ -0,0 +1,156 @@
+"""
+Run the Chainlit app in several worker processes on one port.
+
+Each worker binds its own SO_REUSEPORT socket, so the kernel spreads new
+connections across them, and every worker can serve any session: the
+session's agent thread lives in the shared session store (SESSION_STORE_URL),
+not in one process's memory.
+
+Nothing routes a connection back to the worker that saw the previous one,
+so with more than one worker the browser is told to use websockets only: a
+socket.io session that starts with HTTP long-polling and then upgrades
+makes several requests, which would land on different workers.
+
+    python serve.py                          # WEB_CONCURRENCY workers, default one per CPU of the quota
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger("serve")
+
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: its affinity, capped by the cgroup CPU quota (e.g. a container's `cpu: 1`)."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2: "<quota> <period>" or "max <period>"
+            limit, period = f.read().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f, open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as g:
+                limit, period = int(f.read()), int(g.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+DEFAULT_WORKERS = int(os.getenv("WEB_CONCURRENCY", "0")) or available_cpus()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(target: str, host: str, port: int, index: int, websocket_only: bool):
+    """One worker: load the app the way `chainlit run` does and serve it on a SO_REUSEPORT socket."""
+    import uvicorn
+    from chainlit.cli import assert_app, ensure_jwt_secret, load_module
+    from chainlit.config import config, init_config
+    from chainlit.markdown import init_markdown
+    from chainlit.server import app
+
+    os.environ["WORKER_INDEX"] = str(index)
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s worker-{index} %(message)s")
+
+    init_config(log=False)
+    config.run.host = host
+    config.run.port = port
+    config.run.root_path = os.environ.get("CHAINLIT_ROOT_PATH", "")
+    config.run.headless = True
+    config.run.module_name = target
+    if websocket_only:
+        # One TCP connection per session, so a session never spans two workers
+        config.project.transports = ["websocket"]
+    load_module(target)
+    ensure_jwt_secret()
+    assert_app()
+    init_markdown(config.root)
+
+    sock = bind_socket(host, port)
+    server = uvicorn.Server(uvicorn.Config(
+        app,
+        ws=os.environ.get("UVICORN_WS_PROTOCOL", "auto"),
+        log_level="error",
+        root_path=config.run.root_path,
+    ))
+    logger.info("worker %d serving %s on %s:%d", index, target, host, port)
+    # Plain asyncio, like `chainlit run`, rather than uvloop
+    asyncio.run(server.serve(sockets=[sock]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", nargs="?", default="main.py", help="Chainlit app module")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--host", default=os.getenv("CHAINLIT_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("CHAINLIT_PORT", "8000")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s serve %(message)s")
+    if args.workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        sys.exit("SO_REUSEPORT is not available on this platform; run with --workers 1")
+    # Fail fast (e.g. port in use) before starting any worker
+    bind_socket(args.host, args.port).close()
+
+    context = multiprocessing.get_context("spawn")
+    workers = {}
+    stopping = False
+
+    def start(index):
+        process = context.Process(target=run_worker, args=(args.target, args.host, args.port, index, args.workers > 1),
+                                  name=f"worker-{index}")
+        process.start()
+        workers[index] = process
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(args.workers):
+        start(index)
+    logger.info("started %d workers on %s:%d", args.workers, args.host, args.port)
+
+    # Restart workers that die; sessions they held continue on any worker via the session store
+    while not stopping:
+        time.sleep(1.0)
+        for index, process in list(workers.items()):
+            if not process.is_alive() and not stopping:
+                logger.warning("worker %d exited with %s, restarting", index, process.exitcode)
+                start(index)
+
+    for process in workers.values():
+        process.terminate()
+    for process in workers.values():
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+
+
+if __name__ == "__main__":
+    main()